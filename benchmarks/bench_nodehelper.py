@@ -0,0 +1,121 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Time the node lookups NodeHelper does when reading a material, on a synthetic node tree with
+# many nodes, comparing the indexed lookups against the previous linear scans.
+#
+#   python benchmarks/bench_nodehelper.py 1000
+#
+
+import os, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import makeskin
+import fakebpy
+bpy = fakebpy.install()
+
+from makeskin.nodehelper import NodeHelper
+
+class LinearNodeHelper(NodeHelper):
+    # The lookups as they were before the index, scanning the whole tree on every call
+
+    def findNodeByName(self, nodeName):
+        for node in self._nodetree.nodes:
+            if node.name == nodeName:
+                return node
+        return None
+
+    def findFirstNodeByType(self, typeName):
+        for node in self._nodetree.nodes:
+            if node.type == typeName:
+                return node
+        return None
+
+    def findFirstNodeByClass(self, typeClass):
+        for node in self._nodetree.nodes:
+            if isinstance(node, typeClass):
+                return node
+        return None
+
+    def findNodeLinkedToSocket(self, nodeLinkedTo, nameOfSocket):
+        if not nodeLinkedTo:
+            return None
+        sourceSideOfLink = None
+        for link in self._nodetree.links:
+            if link.to_node == nodeLinkedTo:
+                socketLinkedTo = link.to_socket
+                if socketLinkedTo.name == nameOfSocket:
+                    sourceSideOfLink = link.from_node
+        return sourceSideOfLink
+
+def createLargeTree(extraNodes):
+    obj = fakebpy.createObjectWithMaterial(bpy, "Benchmark")
+    helper = NodeHelper(obj)
+    helper.createDiffuseTextureNode()
+    helper.createBumpAndNormal()
+    helper.createRoughnessTextureNode()
+    helper.createDisplacementTextureNode()
+    tree = obj.data.materials[0].node_tree
+    previous = None
+    for i in range(extraNodes):
+        node = tree.nodes.new("ShaderNodeMixRGB")
+        if previous:
+            tree.links.new(previous.outputs["Color"], node.inputs["Color1"])
+        previous = node
+    return obj
+
+def queries(helper):
+    # About what _parseNodeMaterial and checkAllTexturesAreSaved ask for
+    helper.findDiffuseTextureNode()
+    helper.findNormalMapTextureNode()
+    helper.findBumpMapTextureNode()
+    helper.findTransmissionTextureNode()
+    helper.findRoughnessTextureNode()
+    helper.findMetallicTextureNode()
+    helper.findDisplacementTextureNode()
+    helper.findBumpMapIntensity()
+    helper.findNormalMapIntensity()
+    helper.findDisplacementMapIntensity()
+    helper.findNodeByName("diffuseIntensity")
+    helper.findFirstNodeByType("OUTPUT_MATERIAL")
+    for socketName in ["Base Color", "Normal", "Roughness", "Metallic", "Alpha", "Transmission"]:
+        helper.findNodeLinkedToPrincipled(socketName)
+
+def _best(function, repeats):
+    best = None
+    for i in range(repeats):
+        before = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - before
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def main(extraNodes=1000, rounds=200, repeats=5):
+    obj = createLargeTree(extraNodes)
+    linear = LinearNodeHelper(obj)
+    indexed = NodeHelper(obj)
+
+    for socketName in ["Base Color", "Normal", "Roughness", "Alpha"]:
+        if linear.findNodeLinkedToPrincipled(socketName) is not indexed.findNodeLinkedToPrincipled(socketName):
+            print("MISMATCH for link to " + socketName)
+    for name in ["diffuseTexture", "bumpmap", "normalmapTexture", "displacementmap", "nonexisting"]:
+        if linear.findNodeByName(name) is not indexed.findNodeByName(name):
+            print("MISMATCH for node " + name)
+
+    def run(helper):
+        for i in range(rounds):
+            queries(helper)
+
+    linearTime = _best(lambda: run(linear), repeats)
+    indexedTime = _best(lambda: run(indexed), repeats)
+    nodeCount = len(obj.data.materials[0].node_tree.nodes)
+
+    print("nodes:   %d" % nodeCount)
+    print("linear:  %.2f ms per material" % (1000.0 * linearTime / rounds))
+    print("indexed: %.3f ms per material" % (1000.0 * indexedTime / rounds))
+    print("speedup: %.1fx" % (linearTime / indexedTime))
+
+if __name__ == "__main__":
+    main(extraNodes=int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
@@ -0,0 +1,141 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Compare lines/second of the single-pass MHMAT parser in MHMatFile._parseFile against the
+# previous implementation, which re-matched every line once more per key type.
+#
+#   python benchmarks/bench_parser.py 2000
+#
+
+import os, re, sys, tempfile, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from makeskin.mhmatfile import MHMatFile
+from makeskin.mhmat_keys import MHMAT_KEYS, MHMAT_NAME_TO_KEY
+from makeskin.keytypes import *
+
+SAMPLE = """# This is a material file for MakeHuman
+name benchmark
+tag skin
+tag female
+description A synthetic material used for benchmarking
+license CC0
+author MakeSkin
+diffuseColor 0.8000 0.7000 0.6000
+specularColor 0.1000 0.1000 0.1000
+diffuseTexture textures/benchmark_diffuse.png
+normalmapTexture textures/benchmark_normal.png
+bumpmapTexture /tmp/benchmark_bump.png
+diffuseIntensity 0.9000
+normalmapIntensity 1.0000
+roughness 0.6500
+shininess 0.3500
+sssEnabled true
+transparent False
+backfaceCull 1
+viewPortColor 0.5 0.5 0.5
+shader shaders/glsl/litsphere
+shaderParam litsphereTexture litspheres/lit_standard_skin.png
+shaderConfig normal True
+"""
+
+def _legacyParseValue(keyObj, line):
+    # The per-key parsing as it was done before the single-pass parser
+    line = str(line).strip()
+    if not keyObj.lineMatchesKey(line):
+        return None
+    if isinstance(keyObj, MHMATColorKey):
+        match = re.search(r'^([a-zA-Z]+)\s+([\d.]+)\s+([\d.]+)\s+([\d.]+)$', line)
+        if match:
+            return [float(str(match.group(2)).strip()), float(str(match.group(3)).strip()), float(str(match.group(4)).strip())]
+        return None
+    if isinstance(keyObj, (MHMATStringShaderKey, MHMATBooleanShaderKey)):
+        match = re.search(r'^([a-zA-Z]+)\s+([^\s]+)\s+([^\s]+)$', line)
+        if not match:
+            return None
+        if isinstance(keyObj, MHMATStringShaderKey):
+            return [str(match.group(2)), str(match.group(3)).strip()]
+        value = str(match.group(3)).strip()
+        return value == "true" or value == "t" or value == "1"
+    match = re.search(r'^([a-zA-Z]+)\s+(.*)$', line)
+    if not match:
+        return None
+    value = str(match.group(2)).strip()
+    if isinstance(keyObj, MHMATFloatKey):
+        return float(value)
+    if isinstance(keyObj, MHMATBooleanKey):
+        value = value.lower()
+        if value != "":
+            value = value == "true" or value == "t" or value == "1"
+    return value
+
+def legacyParse(fileName):
+    settings = dict()
+    for keyObj in MHMAT_KEYS:
+        settings[keyObj.keyName] = keyObj.defaultValue
+    location = os.path.dirname(os.path.abspath(fileName))
+    with open(fileName, 'r', errors='ignore') as f:
+        for line in f:
+            parsedLine = line.strip()
+            if not parsedLine or parsedLine.startswith("#") or parsedLine.startswith("/"):
+                continue
+            match = re.search(r'^([a-zA-Z]+)\s+(.*)$', parsedLine)
+            if not match:
+                continue
+            key = match.group(1)
+            value = None
+            if key.lower() in MHMAT_NAME_TO_KEY:
+                keyObj = MHMAT_NAME_TO_KEY[key.lower()]
+                key = keyObj.keyName
+                value = _legacyParseValue(keyObj, parsedLine)
+                if isinstance(keyObj, MHMATFileKey) and not value.startswith("/"):
+                    value = location + "/" + value
+            if key == 'tag':
+                if settings[key]:
+                    settings[key] += ", " + value
+                else:
+                    settings[key] = value
+            elif key == 'shaderParam':
+                if value[0] == "litsphereTexture":
+                    match = re.search(r'^litspheres\/(.*)\.png$', value[1])
+                    if match:
+                        settings["litsphereTexture"] = match.group(1)
+            else:
+                settings[key] = value
+    return settings
+
+def _linesPerSecond(function, fileName, lineCount, repeats):
+    best = None
+    result = None
+    for i in range(repeats):
+        before = time.perf_counter()
+        result = function(fileName)
+        elapsed = time.perf_counter() - before
+        if best is None or elapsed < best:
+            best = elapsed
+    return (lineCount / best, result)
+
+def main(copies=2000, repeats=5):
+    content = SAMPLE * copies
+    lineCount = content.count("\n")
+    with tempfile.TemporaryDirectory() as tempDir:
+        fileName = os.path.join(tempDir, "benchmark.mhmat")
+        with open(fileName, "w") as f:
+            f.write(content)
+
+        (legacyRate, legacySettings) = _linesPerSecond(legacyParse, fileName, lineCount, repeats)
+        (currentRate, mhmat) = _linesPerSecond(lambda fn: MHMatFile(fileName=fn), fileName, lineCount, repeats)
+
+    for keyObj in MHMAT_KEYS:
+        key = keyObj.keyName
+        if legacySettings[key] != mhmat.settings[key]:
+            print("MISMATCH for " + key + ": " + str(legacySettings[key]) + " != " + str(mhmat.settings[key]))
+
+    print("lines:   %d" % lineCount)
+    print("legacy:  %.0f lines/s" % legacyRate)
+    print("current: %.0f lines/s" % currentRate)
+    print("speedup: %.2fx" % (currentRate / legacyRate))
+
+if __name__ == "__main__":
+    main(copies=int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
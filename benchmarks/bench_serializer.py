@@ -0,0 +1,118 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Compare re-serializing a corpus of materials with MHMatFile.serializedLines() against the
+# previous string concatenating __str__, and check that the output is byte identical.
+#
+#   python benchmarks/bench_serializer.py 5000
+#
+
+import io, os, random, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from makeskin.mhmatfile import MHMatFile
+from makeskin.mhmat_keys import MHMAT_KEYS, MHMAT_KEY_GROUPS, MHMAT_NAME_TO_KEY
+from makeskin.keytypes import *
+
+def legacySerialize(mhmat):
+    # __str__ as it was before the streaming serializer
+    mat = "# This is a material file for MakeHuman, produced by MakeSkin\n"
+
+    for keyGroup in MHMAT_KEY_GROUPS:
+        mat = mat + "\n// " + keyGroup + "\n\n"
+        for keyNameLower in MHMAT_NAME_TO_KEY.keys():
+            keyObj = MHMAT_NAME_TO_KEY[keyNameLower]
+            keyName = keyObj.keyName
+            if keyObj.keyGroup == keyGroup and not mhmat.settings[keyName] is None:
+                if keyName == "tag":
+                    for elem in mhmat.settings["tag"].split(","):
+                        mat = mat + "tag " + elem.strip() + "\n"
+                else:
+                    mat = mat + keyName + " " + keyObj.asString(mhmat.settings[keyName]) + "\n"
+
+    mat = mat + "\n"
+    mat = mat + "// Shader properties (only affects how things look in MakeHuman)\n\n"
+
+    if mhmat.litSphere:
+        mat = mat + "shader shaders/glsl/litsphere\n"
+        mat = mat + "shaderParam litsphereTexture litspheres/" + str(mhmat.litSphere) + ".png\n"
+    for key in mhmat.shaderConfig.keys():
+        mat = mat + "shaderConfig " + key + " " + str(mhmat.shaderConfig[key]) + "\n"
+
+    mat = mat + "\n"
+    mat = mat + "// The following settings would also have been valid, but do currently not have a value\n//\n"
+    for keyName in MHMAT_NAME_TO_KEY.keys():
+        keyObj = MHMAT_NAME_TO_KEY[keyName]
+        key = keyObj.keyName
+        if key not in mhmat.settings or mhmat.settings[key] is None:
+            mat = mat + "// " + key + "\n"
+
+    return mat
+
+def randomMaterial(rnd):
+    mhmat = MHMatFile()
+    for keyObj in MHMAT_KEYS:
+        if rnd.random() < 0.3:
+            continue
+        key = keyObj.keyName
+        if isinstance(keyObj, MHMATColorKey):
+            mhmat.settings[key] = [rnd.random(), rnd.random(), rnd.random()]
+        elif isinstance(keyObj, MHMATFloatKey):
+            mhmat.settings[key] = rnd.random()
+        elif isinstance(keyObj, MHMATBooleanKey):
+            mhmat.settings[key] = rnd.random() < 0.5
+        elif isinstance(keyObj, MHMATFileKey):
+            mhmat.settings[key] = "textures/" + key + "_%d.png" % rnd.randint(0, 1000)
+        elif isinstance(keyObj, MHMATStringKey):
+            mhmat.settings[key] = key + " %d" % rnd.randint(0, 1000)
+    mhmat.settings["tag"] = "skin, female,  young"
+    mhmat.settings["shaderParam"] = None
+    if rnd.random() < 0.5:
+        mhmat.litSphere = "lit_standard_skin"
+        mhmat.shaderConfig["normal"] = True
+    return mhmat
+
+def _best(function, repeats):
+    best = None
+    for i in range(repeats):
+        before = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - before
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def main(count=5000, repeats=5):
+    rnd = random.Random(4711)
+    corpus = [randomMaterial(rnd) for i in range(count)]
+
+    # Golden comparison: the output must be byte identical to the previous serializer
+    for mhmat in corpus:
+        golden = legacySerialize(mhmat)
+        if str(mhmat) != golden:
+            print("MISMATCH between legacy and current serialization:")
+            print(golden)
+            print(str(mhmat))
+            sys.exit(1)
+        stream = io.StringIO()
+        stream.writelines(mhmat.serializedLines())
+        if stream.getvalue() != golden:
+            print("MISMATCH between legacy and streamed serialization")
+            sys.exit(1)
+
+    legacy = _best(lambda: [legacySerialize(mhmat) for mhmat in corpus], repeats)
+    current = _best(lambda: [str(mhmat) for mhmat in corpus], repeats)
+    def streamed():
+        stream = io.StringIO()
+        for mhmat in corpus:
+            stream.writelines(mhmat.serializedLines())
+    streaming = _best(streamed, repeats)
+
+    print("materials: %d (output identical)" % count)
+    print("legacy:    %.0f materials/s" % (count / legacy))
+    print("join:      %.0f materials/s (%.2fx)" % (count / current, legacy / current))
+    print("streamed:  %.0f materials/s (%.2fx)" % (count / streaming, legacy / streaming))
+
+if __name__ == "__main__":
+    main(count=int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
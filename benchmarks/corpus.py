@@ -0,0 +1,146 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Synthetic MHMAT libraries for the benchmarks. Every material is generated from a seeded random
+# generator, so a corpus of a given size and seed is the same on every machine. Together the
+# materials use every key in MHMAT_KEYS and MHMAT_SHADER_KEYS, that is every key type in
+# keytypes.py, with tags on several lines, comments and blank lines mixed in. The textures they
+# refer to are small but valid PNG files, shared by many materials as in a real library.
+#
+#   python benchmarks/corpus.py /tmp/corpus 10000
+#
+
+import json, os, random, struct, sys, zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from makeskin.mhmat_keys import MHMAT_KEYS
+from makeskin.keytypes import *
+
+# Bump when the generated files change, existing corpora are then generated again
+CORPUS_VERSION = 2
+
+MANIFEST_NAME = ".corpus.json"
+
+# Materials per directory, and the number of distinct texture files
+FILES_PER_DIRECTORY = 500
+TEXTURE_COUNT = 64
+TEXTURE_SIZE = 16
+
+TAGS = ["female", "male", "young", "old", "skin", "clothes", "leather", "cotton", "hair", "eyes", "teeth", "shoes", "hat", "makeup", "tattoo", "scales"]
+LICENSES = ["CC0", "CC-BY", "AGPL"]
+LITSPHERES = ["lit_leather", "lit_standard_skin", "lit_african", "lit_asian", "lit_caucasian", "lit_hair"]
+SHADER_CONFIGS = ["ambientOcclusion", "normal", "bump", "displacement", "vertexColors", "spec"]
+
+def _pngChunk(chunkType, data):
+    chunk = chunkType + data
+    return struct.pack(">I", len(data)) + chunk + struct.pack(">I", zlib.crc32(chunk) & 0xffffffff)
+
+def writePng(path, width, height, seed):
+    """Write a valid RGBA PNG filled with a color derived from seed"""
+    rnd = random.Random(seed)
+    pixel = bytes([rnd.randrange(256), rnd.randrange(256), rnd.randrange(256), 255])
+    rows = b"".join([b"\x00" + pixel * width for y in range(height)])
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(_pngChunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)))
+        f.write(_pngChunk(b"IDAT", zlib.compress(rows)))
+        f.write(_pngChunk(b"IEND", b""))
+
+def _valueFor(keyObj, rnd, index, textureNames):
+    key = keyObj.keyName
+    if key == "tag":
+        return None
+    if key == "name":
+        return "material%06d" % index
+    if key == "uuid":
+        return "%08x-0000-4000-8000-%012x" % (rnd.getrandbits(32), index)
+    if key == "license":
+        return rnd.choice(LICENSES)
+    if key == "author":
+        return "author%d" % rnd.randrange(50)
+    if key == "litsphereTexture":
+        return rnd.choice(LITSPHERES)
+    if key == "blendMaterial":
+        return "material%06d.mat.blend/materials/material%06d" % (index, index)
+    if isinstance(keyObj, MHMATStringShaderKey):
+        return "litsphereTexture litspheres/" + rnd.choice(LITSPHERES) + ".png"
+    if isinstance(keyObj, MHMATFileKey):
+        # Relative to the material, as in the MakeHuman system assets
+        return "../textures/" + rnd.choice(textureNames)
+    if isinstance(keyObj, MHMATColorKey):
+        return "%.4f %.4f %.4f" % (rnd.random(), rnd.random(), rnd.random())
+    if isinstance(keyObj, MHMATFloatKey):
+        return "%.4f" % rnd.random()
+    if isinstance(keyObj, MHMATBooleanKey):
+        return rnd.choice(["True", "False", "true", "1", "0"])
+    return "synthetic %s %d" % (key, index)
+
+def materialText(index, rnd, textureNames):
+    """The content of synthetic material number index"""
+    lines = ["# This is a material file for MakeHuman", "# generated for benchmarking", ""]
+    for tag in rnd.sample(TAGS, rnd.randint(1, 4)):
+        lines.append("tag " + tag)
+    for keyObj in MHMAT_KEYS:
+        # Every material has the metadata, the rest is optional, and rare keys are rare
+        probability = 1.0 if keyObj.keyGroup == "Metadata" else 0.6
+        if keyObj.keyName in ["blendMaterial", "shaderParam"]:
+            probability = 0.05
+        if rnd.random() >= probability:
+            continue
+        value = _valueFor(keyObj, rnd, index, textureNames)
+        if value is not None:
+            lines.append(keyObj.keyName + " " + value)
+        if rnd.random() < 0.05:
+            lines.append("")
+    lines.append("")
+    lines.append("shader shaders/glsl/litsphere")
+    for config in rnd.sample(SHADER_CONFIGS, rnd.randint(0, 3)):
+        lines.append("shaderConfig " + config + " " + rnd.choice(["true", "false"]))
+    return "\n".join(lines) + "\n"
+
+def _readManifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def corpusFiles(directory, count):
+    """The paths of the materials of a corpus of count files in directory, in order"""
+    return [os.path.join(directory, "d%04d" % (index // FILES_PER_DIRECTORY), "material%06d.mhmat" % index) for index in range(count)]
+
+def generateCorpus(directory, count, seed=0):
+    """
+    Generate a corpus of count materials in directory, unless the same corpus is already there.
+    Returns the paths of the material files.
+    """
+    manifest = {"version": CORPUS_VERSION, "count": count, "seed": seed}
+    if _readManifest(directory) == manifest:
+        return corpusFiles(directory, count)
+
+    textureDir = os.path.join(directory, "textures")
+    os.makedirs(textureDir, exist_ok=True)
+    textureNames = []
+    for number in range(TEXTURE_COUNT):
+        textureName = "texture%03d.png" % number
+        writePng(os.path.join(textureDir, textureName), TEXTURE_SIZE, TEXTURE_SIZE, seed * TEXTURE_COUNT + number)
+        textureNames.append(textureName)
+
+    rnd = random.Random(seed)
+    paths = corpusFiles(directory, count)
+    for (index, path) in enumerate(paths):
+        if index % FILES_PER_DIRECTORY == 0:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(materialText(index, rnd, textureNames))
+
+    with open(os.path.join(directory, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f)
+    return paths
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("usage: corpus.py directory count [seed]")
+        sys.exit(2)
+    generateCorpus(sys.argv[1], int(sys.argv[2]), int(sys.argv[3]) if len(sys.argv) > 3 else 0)
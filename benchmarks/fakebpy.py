@@ -0,0 +1,459 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# A minimal in-memory stand-in for the parts of bpy used by the node code, so that NodeHelper
+# and MHMat can be timed on a machine without blender. It only models what MakeSkin touches:
+# node trees with nodes, sockets and links, dict-like bpy.data.images and materials, objects
+# and a scene with the MakeSkin properties, and bpy.props as plain descriptors with defaults.
+#
+# Import the makeskin package *before* calling install(). Without bpy the package only loads its
+# headless core, after which the blender modules (such as makeskin.nodehelper) can be imported
+# against the fake:
+#
+#   import makeskin
+#   import fakebpy
+#   fakebpy.install()
+#   fakebpy.registerProperties()
+#   from makeskin.material import MHMat
+#
+
+import copy, os, sys, types
+
+# bl_idname -> (node.type, input socket names, output socket names)
+NODE_TYPES = dict()
+NODE_TYPES["ShaderNodeBsdfPrincipled"] = ("BSDF_PRINCIPLED", ["Base Color", "Subsurface", "Subsurface Radius", "Subsurface Color", "Metallic", "Specular", "Specular Tint", "Roughness", "Anisotropic", "Anisotropic Rotation", "Sheen", "Sheen Tint", "Clearcoat", "Clearcoat Roughness", "IOR", "Transmission", "Transmission Roughness", "Emission", "Emission Strength", "Alpha", "Normal", "Clearcoat Normal", "Tangent"], ["BSDF"])
+NODE_TYPES["ShaderNodeOutputMaterial"] = ("OUTPUT_MATERIAL", ["Surface", "Volume", "Displacement"], [])
+NODE_TYPES["ShaderNodeTexImage"] = ("TEX_IMAGE", ["Vector"], ["Color", "Alpha"])
+NODE_TYPES["ShaderNodeNormalMap"] = ("NORMAL_MAP", ["Strength", "Color"], ["Normal"])
+NODE_TYPES["ShaderNodeBump"] = ("BUMP", ["Strength", "Distance", "Height", "Normal"], ["Normal"])
+NODE_TYPES["ShaderNodeDisplacement"] = ("DISPLACEMENT", ["Height", "Midlevel", "Scale", "Normal"], ["Displacement"])
+NODE_TYPES["ShaderNodeMixRGB"] = ("MIX_RGB", ["Fac", "Color1", "Color2"], ["Color"])
+NODE_TYPES["ShaderNodeValue"] = ("VALUE", [], ["Value"])
+NODE_TYPES["ShaderNodeAttribute"] = ("ATTRIBUTE", [], ["Color", "Vector", "Fac"])
+NODE_TYPES["ShaderNodeSeparateColor"] = ("SEPARATE_COLOR", ["Color"], ["Red", "Green", "Blue"])
+NODE_TYPES["ShaderNodeSeparateRGB"] = ("SEPRGB", ["Image"], ["R", "G", "B"])
+NODE_TYPES["NodeFrame"] = ("FRAME", [], [])
+
+def _defaultValue(socketName):
+    if socketName == "Emission":
+        return [0.0, 0.0, 0.0, 1.0]
+    if "Color" in socketName:
+        return [0.8, 0.8, 0.8, 1.0]
+    if socketName == "Roughness":
+        return 0.5
+    if socketName == "IOR":
+        return 1.45
+    if socketName in ["Alpha", "Strength", "Scale", "Fac"]:
+        return 1.0
+    return 0.0
+
+class Socket:
+
+    def __init__(self, node, name, isOutput):
+        self.node = node
+        self.name = name
+        self.is_output = isOutput
+        self.default_value = _defaultValue(name)
+
+class Sockets:
+    """Socket collection which, like bpy, can be indexed by name or by position"""
+
+    def __init__(self, node, names, isOutput):
+        self._sockets = [Socket(node, name, isOutput) for name in names]
+        self._byName = dict()
+        for socket in self._sockets:
+            if not socket.name in self._byName:
+                self._byName[socket.name] = socket
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return self._sockets[key]
+        return self._byName[key]
+
+    def __contains__(self, key):
+        return key in self._byName
+
+    def __iter__(self):
+        return iter(self._sockets)
+
+    def __len__(self):
+        return len(self._sockets)
+
+class Node:
+
+    bl_idname = None
+
+    def __init__(self, name):
+        (nodeType, inputNames, outputNames) = NODE_TYPES[self.bl_idname]
+        self.type = nodeType
+        self.name = name
+        self.label = ""
+        self.location = [0.0, 0.0]
+        self.parent = None
+        self.image = None
+        self.attribute_name = ""
+        self.inputs = Sockets(self, inputNames, False)
+        self.outputs = Sockets(self, outputNames, True)
+        self._properties = dict()
+
+    # Custom properties, as node["name"] in blender
+    def get(self, key, default=None):
+        return self._properties.get(key, default)
+
+    def __getitem__(self, key):
+        return self._properties[key]
+
+    def __setitem__(self, key, value):
+        self._properties[key] = value
+
+# One node class per bl_idname, so that isinstance checks against bpy.types work
+NODE_CLASSES = dict()
+for _idName in NODE_TYPES.keys():
+    NODE_CLASSES[_idName] = type(_idName, (Node,), {"bl_idname": _idName})
+
+class Nodes:
+
+    def __init__(self):
+        self._nodes = []
+        self._names = set()
+
+    def new(self, idName):
+        baseName = NODE_CLASSES[idName].__name__.replace("ShaderNode", "")
+        name = baseName
+        counter = 0
+        while name in self._names:
+            counter += 1
+            name = "%s.%03d" % (baseName, counter)
+        self._names.add(name)
+        node = NODE_CLASSES[idName](name)
+        self._nodes.append(node)
+        return node
+
+    def remove(self, node):
+        self._nodes.remove(node)
+        self._names.discard(node.name)
+
+    def get(self, name, default=None):
+        for node in self._nodes:
+            if node.name == name:
+                return node
+        return default
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return self._nodes[key]
+        node = self.get(key)
+        if node is None:
+            raise KeyError(key)
+        return node
+
+    def __iter__(self):
+        return iter(list(self._nodes))
+
+    def __len__(self):
+        return len(self._nodes)
+
+class Link:
+
+    def __init__(self, fromSocket, toSocket):
+        self.from_socket = fromSocket
+        self.from_node = fromSocket.node
+        self.to_socket = toSocket
+        self.to_node = toSocket.node
+
+class Links:
+
+    def __init__(self):
+        self._links = []
+
+    def new(self, fromSocket, toSocket):
+        # Like blender, an input socket only takes one link
+        self._links = [link for link in self._links if link.to_socket is not toSocket]
+        link = Link(fromSocket, toSocket)
+        self._links.append(link)
+        return link
+
+    def __iter__(self):
+        return iter(list(self._links))
+
+    def __len__(self):
+        return len(self._links)
+
+class NodeTree:
+
+    def __init__(self):
+        self.nodes = Nodes()
+        self.links = Links()
+
+    def copy(self):
+        """A deep copy of the nodes and links. Images are shared, as in blender."""
+        tree = NodeTree()
+        copies = dict()
+        for node in self.nodes:
+            nodeCopy = NODE_CLASSES[node.bl_idname](node.name)
+            nodeCopy.label = node.label
+            nodeCopy.location = list(node.location)
+            nodeCopy.image = node.image
+            nodeCopy.attribute_name = node.attribute_name
+            nodeCopy._properties = dict(node._properties)
+            for (socket, socketCopy) in zip(list(node.inputs) + list(node.outputs), list(nodeCopy.inputs) + list(nodeCopy.outputs)):
+                socketCopy.default_value = copy.copy(socket.default_value)
+            tree.nodes._nodes.append(nodeCopy)
+            tree.nodes._names.add(nodeCopy.name)
+            copies[node] = nodeCopy
+        for node in self.nodes:
+            if node.parent is not None:
+                copies[node].parent = copies[node.parent]
+        for link in self.links:
+            fromNode = copies[link.from_node]
+            toNode = copies[link.to_node]
+            fromSocket = fromNode.outputs[list(link.from_node.outputs).index(link.from_socket)]
+            toSocket = toNode.inputs[list(link.to_node.inputs).index(link.to_socket)]
+            tree.links._links.append(Link(fromSocket, toSocket))
+        return tree
+
+class Material:
+
+    def __init__(self, name):
+        self._name = name
+        # The bpy.data collection the material is in, which keeps names unique on rename
+        self._collection = None
+        self.use_nodes = False
+        self.blend_method = "OPAQUE"
+        self.diffuse_color = [0.8, 0.8, 0.8, 1.0]
+        self.node_tree = NodeTree()
+        output = self.node_tree.nodes.new("ShaderNodeOutputMaterial")
+        output.name = "Material Output"
+        principled = self.node_tree.nodes.new("ShaderNodeBsdfPrincipled")
+        principled.name = "Principled BSDF"
+        self.node_tree.links.new(principled.outputs["BSDF"], output.inputs["Surface"])
+
+    @property
+    def name(self):
+        return self._name
+
+    @name.setter
+    def name(self, name):
+        if self._collection is None:
+            self._name = name
+        else:
+            self._collection._rename(self, name)
+
+    def copy(self):
+        """Like ID.copy(): a new material with a copy of the node tree, named as blender does"""
+        material = Material(self._name)
+        material.use_nodes = self.use_nodes
+        material.blend_method = self.blend_method
+        material.diffuse_color = list(self.diffuse_color)
+        material.node_tree = self.node_tree.copy()
+        if self._collection is not None:
+            self._collection._adopt(material)
+        return material
+
+class ColorspaceSettings:
+
+    def __init__(self):
+        self.name = "sRGB"
+
+class Image:
+
+    def __init__(self, name, filepath):
+        self.name = name
+        self.filepath = filepath
+        self.filepath_raw = filepath
+        self.source = 'FILE' if filepath else 'GENERATED'
+        self.colorspace_settings = ColorspaceSettings()
+        self.has_data = False
+        self.is_float = False
+        self.size = [0, 0]
+        self._properties = dict()
+
+    # Custom properties, as image["name"] in blender
+    def get(self, key, default=None):
+        return self._properties.get(key, default)
+
+    def __getitem__(self, key):
+        return self._properties[key]
+
+    def __setitem__(self, key, value):
+        self._properties[key] = value
+
+class NamedCollection:
+    """A dict-like datablock collection, as bpy.data.images or bpy.data.materials"""
+
+    def __init__(self, factory):
+        self._items = dict()
+        self._factory = factory
+
+    def _uniqueName(self, name):
+        uniqueName = name
+        counter = 0
+        while uniqueName in self._items:
+            counter += 1
+            uniqueName = "%s.%03d" % (name, counter)
+        return uniqueName
+
+    def new(self, name):
+        name = self._uniqueName(name)
+        item = self._factory(name)
+        self._items[name] = item
+        if hasattr(item, "_collection"):
+            item._collection = self
+        return item
+
+    def _adopt(self, item):
+        item._name = self._uniqueName(item._name)
+        item._collection = self
+        self._items[item._name] = item
+
+    def _rename(self, item, name):
+        del self._items[item._name]
+        item._name = self._uniqueName(name)
+        self._items[item._name] = item
+
+    def get(self, name, default=None):
+        return self._items.get(name, default)
+
+    def __contains__(self, name):
+        return name in self._items
+
+    def __getitem__(self, name):
+        return self._items[name]
+
+    def __iter__(self):
+        return iter(list(self._items.values()))
+
+    def __len__(self):
+        return len(self._items)
+
+class Images(NamedCollection):
+
+    def __init__(self):
+        NamedCollection.__init__(self, lambda name: Image(name, ""))
+
+    def new(self, name, width=1, height=1, alpha=False, float_buffer=False):
+        image = NamedCollection.new(self, name)
+        image.size = [width, height]
+        return image
+
+    def load(self, filepath, check_existing=False):
+        name = self._uniqueName(os.path.basename(filepath))
+        image = Image(name, filepath)
+        self._items[name] = image
+        return image
+
+class Property:
+    """The stand-in for all bpy.props: a class attribute which reads as its default until set"""
+
+    _count = 0
+
+    def __init__(self, default=None, items=None, **kwargs):
+        if default is None and items:
+            default = items[0][0]
+        self.default = default
+        Property._count += 1
+        self._attribute = "_property%d" % Property._count
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        return instance.__dict__.get(self._attribute, self.default)
+
+    def __set__(self, instance, value):
+        instance.__dict__[self._attribute] = value
+
+def _propertyFunction(**defaults):
+    def create(**kwargs):
+        for (name, value) in defaults.items():
+            kwargs.setdefault(name, value)
+        return Property(**kwargs)
+    return create
+
+class Scene:
+
+    def __init__(self, name="Scene"):
+        self.name = name
+
+class MaterialSlot:
+
+    def __init__(self, material):
+        self.material = material
+        self.name = material.name
+
+class MeshData:
+
+    def __init__(self):
+        self.materials = []
+
+class Object:
+
+    def __init__(self, name):
+        self.name = name
+        self.type = "MESH"
+        self.data = MeshData()
+
+    @property
+    def material_slots(self):
+        return [MaterialSlot(material) for material in self.data.materials]
+
+def createModule():
+    bpy = types.ModuleType("bpy")
+    bpy.types = types.ModuleType("bpy.types")
+    for (idName, nodeClass) in NODE_CLASSES.items():
+        setattr(bpy.types, idName, nodeClass)
+    # Fresh classes for every module, so that properties registered on them do not leak
+    bpy.types.Object = type("Object", (Object,), {})
+    bpy.types.Scene = type("Scene", (Scene,), {})
+    bpy.types.Material = Material
+    bpy.props = types.ModuleType("bpy.props")
+    bpy.props.BoolProperty = _propertyFunction(default=False)
+    bpy.props.IntProperty = _propertyFunction(default=0)
+    bpy.props.FloatProperty = _propertyFunction(default=0.0)
+    bpy.props.StringProperty = _propertyFunction(default="")
+    bpy.props.EnumProperty = _propertyFunction()
+    bpy.props.CollectionProperty = _propertyFunction()
+    bpy.data = types.SimpleNamespace()
+    bpy.data.images = Images()
+    bpy.data.materials = NamedCollection(Material)
+    bpy.path = types.SimpleNamespace()
+    bpy.path.abspath = lambda path: os.path.abspath(path) if path else path
+    bpy.app = types.SimpleNamespace()
+    bpy.app.version = (3, 6, 0)
+    bpy.app.timers = types.SimpleNamespace()
+    bpy.app.timers.register = lambda function, first_interval=0.0: None
+    bpy.context = types.SimpleNamespace()
+    bpy.context.scene = bpy.types.Scene()
+    bpy.context.active_object = None
+    return bpy
+
+def install():
+    """Put a fake bpy in sys.modules and return it. If one is installed already, that one is returned."""
+    installed = sys.modules.get("bpy")
+    if installed is not None and getattr(installed, "isFake", False):
+        return installed
+    bpy = createModule()
+    bpy.isFake = True
+    sys.modules["bpy"] = bpy
+    sys.modules["bpy.types"] = bpy.types
+    sys.modules["bpy.props"] = bpy.props
+    return bpy
+
+def registerProperties():
+    """Add the MakeSkin object and scene properties to the installed fake, as the addon does on register"""
+    from makeskin.extraproperties import extraProperties
+    extraProperties()
+
+def reset(bpy):
+    """Forget all datablocks, as after loading a new blend file"""
+    bpy.data.images = Images()
+    bpy.data.materials = NamedCollection(Material)
+
+def createObject(bpy, name="Object"):
+    obj = bpy.types.Object(name)
+    bpy.context.active_object = obj
+    return obj
+
+def createObjectWithMaterial(bpy, name="Object"):
+    obj = createObject(bpy, name)
+    obj.data.materials.append(bpy.data.materials.new(name))
+    return obj
@@ -0,0 +1,237 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# The benchmark suite: times the parser, serializer, validation, library index, batch CLI and
+# the blender node code (against the fake bpy) on synthetic corpora of several sizes, and writes
+# the results as JSON. Given the results of an earlier run as baseline, every case which got
+# slower by more than the threshold is reported as a regression, and the exit status is 1.
+#
+#   python benchmarks/run_benchmarks.py --sizes 10,1000,100000 --output results.json
+#   python benchmarks/run_benchmarks.py --baseline results.json
+#
+# Corpora are generated once below --corpus-dir, one directory per size, and reused by later runs.
+# The node cases build a material per file, so they only run on the first --node-limit files.
+
+import argparse, json, os, platform, subprocess, sys, tempfile, time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+import makeskin
+import fakebpy
+bpy = fakebpy.install()
+fakebpy.registerProperties()
+
+from makeskin.mhmatfile import MHMatFile
+from makeskin.validation import validateMaterial
+from makeskin.libraryindex import LibraryIndex
+from makeskin.batch import processDirectory
+from makeskin.material import MHMat
+from makeskin.nodehelper import NodeHelper
+from makeskin.imageregistry import IMAGE_REGISTRY
+from makeskin.imageinfo import IMAGE_INFO_CACHE
+from corpus import generateCorpus
+from bench_nodehelper import queries
+
+RESULTS_VERSION = 1
+
+DEFAULT_SIZES = [10, 100, 1000]
+DEFAULT_NODE_LIMIT = 2000
+DEFAULT_THRESHOLD = 1.25
+
+# Cases faster than this are too noisy to be compared against a baseline
+MIN_COMPARED_SECONDS = 0.005
+
+def _best(function, repeats):
+    """Run function repeats times, returning (best time in seconds, result of the last run)"""
+    best = None
+    result = None
+    for i in range(repeats):
+        before = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - before
+        if best is None or elapsed < best:
+            best = elapsed
+    return (best, result)
+
+def _parsed(paths):
+    return [MHMatFile(fileName=path) for path in paths]
+
+def _quietly(function):
+    # The parser and the node code print about what they find, which is not what is timed here
+    def run():
+        with open(os.devnull, "w") as devnull:
+            stdout = sys.stdout
+            sys.stdout = devnull
+            try:
+                return function()
+            finally:
+                sys.stdout = stdout
+    return run
+
+def benchParse(corpusDir, paths, repeats):
+    return _best(_quietly(lambda: _parsed(paths)), repeats)[0]
+
+def benchSerialize(corpusDir, paths, repeats):
+    materials = _quietly(lambda: _parsed(paths))()
+    return _best(lambda: [str(mhmat) for mhmat in materials], repeats)[0]
+
+def benchValidate(corpusDir, paths, repeats):
+    materials = _quietly(lambda: _parsed(paths))()
+    def run():
+        # Without the header cache, so that every run reads the texture headers
+        IMAGE_INFO_CACHE.clear()
+        return [validateMaterial(mhmat) for mhmat in materials]
+    return _best(run, repeats)[0]
+
+def benchIndexBuild(corpusDir, paths, repeats):
+    def run():
+        with tempfile.TemporaryDirectory() as tempDir:
+            with LibraryIndex(corpusDir, indexFile=os.path.join(tempDir, "index.sqlite")) as index:
+                index.update()
+    return _best(_quietly(run), repeats)[0]
+
+def benchIndexUpdate(corpusDir, paths, repeats):
+    with tempfile.TemporaryDirectory() as tempDir:
+        with LibraryIndex(corpusDir, indexFile=os.path.join(tempDir, "index.sqlite")) as index:
+            _quietly(index.update)()
+            return _best(index.update, repeats)[0]
+
+def benchIndexSearch(corpusDir, paths, repeats):
+    with tempfile.TemporaryDirectory() as tempDir:
+        with LibraryIndex(corpusDir, indexFile=os.path.join(tempDir, "index.sqlite")) as index:
+            _quietly(index.update)()
+            return _best(lambda: index.search(tags=["female", "skin"], license="CC0", textures=["normalmap"]), repeats)[0]
+
+def benchBatch(corpusDir, paths, repeats):
+    return _best(_quietly(lambda: processDirectory(corpusDir)), repeats)[0]
+
+def _freshScene():
+    fakebpy.reset(bpy)
+    IMAGE_REGISTRY.clear()
+    return bpy.context.scene
+
+def _buildObjects(materials):
+    scn = _freshScene()
+    objects = []
+    for (number, mhmat) in enumerate(materials):
+        obj = fakebpy.createObject(bpy, "object%06d" % number)
+        mhmat.assignAsNodesMaterialForObj(scn, obj, True)
+        objects.append(obj)
+    return objects
+
+def benchAssign(corpusDir, paths, repeats):
+    # assignAsNodesMaterialForObj changes the settings it is given, so every run gets fresh copies
+    def run():
+        materials = [MHMat(fileName=path) for path in paths]
+        before = time.perf_counter()
+        _buildObjects(materials)
+        return time.perf_counter() - before
+    return min([_quietly(run)() for i in range(repeats)])
+
+def benchReadNodes(corpusDir, paths, repeats):
+    objects = _quietly(lambda: _buildObjects([MHMat(fileName=path) for path in paths]))()
+    return _best(_quietly(lambda: [MHMat(obj) for obj in objects]), repeats)[0]
+
+def benchNodeQueries(corpusDir, paths, repeats):
+    objects = _quietly(lambda: _buildObjects([MHMat(fileName=path) for path in paths]))()
+    def run():
+        for obj in objects:
+            queries(NodeHelper(obj))
+    return _best(run, repeats)[0]
+
+# name -> (function, uses the node code and is limited to --node-limit files)
+CASES = dict()
+CASES["parse"] = (benchParse, False)
+CASES["serialize"] = (benchSerialize, False)
+CASES["validate"] = (benchValidate, False)
+CASES["index build"] = (benchIndexBuild, False)
+CASES["index update"] = (benchIndexUpdate, False)
+CASES["index search"] = (benchIndexSearch, False)
+CASES["batch"] = (benchBatch, False)
+CASES["assign nodes"] = (benchAssign, True)
+CASES["read nodes"] = (benchReadNodes, True)
+CASES["node queries"] = (benchNodeQueries, True)
+
+def _gitRevision():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=BENCHMARK_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def runSuite(sizes, corpusDir, caseNames, repeats, nodeLimit):
+    results = []
+    for size in sizes:
+        before = time.perf_counter()
+        paths = generateCorpus(os.path.join(corpusDir, str(size)), size)
+        print("corpus of %d files ready in %.1f s" % (size, time.perf_counter() - before))
+        for name in caseNames:
+            (function, isNodeCase) = CASES[name]
+            files = paths[:nodeLimit] if isNodeCase else paths
+            seconds = function(os.path.join(corpusDir, str(size)), files, repeats)
+            result = {"case": name, "size": size, "files": len(files), "seconds": seconds, "filesPerSecond": len(files) / seconds if seconds > 0 else None}
+            results.append(result)
+            print("%-14s %7d files %10.4f s %12.0f files/s" % (name, len(files), seconds, result["filesPerSecond"] or 0))
+    return results
+
+def compareResults(results, baseline, threshold):
+    """Return the results which are slower than in baseline by more than threshold, with the ratio"""
+    baselineSeconds = dict()
+    for result in baseline["results"]:
+        baselineSeconds[(result["case"], result["size"])] = result["seconds"]
+    regressions = []
+    for result in results:
+        previous = baselineSeconds.get((result["case"], result["size"]))
+        if previous is None or max(previous, result["seconds"]) < MIN_COMPARED_SECONDS:
+            continue
+        ratio = result["seconds"] / previous
+        if ratio > threshold:
+            regressions.append((result, ratio))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="run_benchmarks.py", description="Time MakeSkin on synthetic material libraries")
+    parser.add_argument("--sizes", default=",".join([str(size) for size in DEFAULT_SIZES]), help="Comma separated corpus sizes in files (default: %(default)s)")
+    parser.add_argument("--cases", default=",".join(CASES.keys()), help="Comma separated cases to run (default: all, which are: %(default)s)")
+    parser.add_argument("--corpus-dir", default=os.path.join(tempfile.gettempdir(), "makeskin-benchmark-corpus"), help="Where the corpora are generated and kept (default: %(default)s)")
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per case, the fastest counts (default: %(default)s)")
+    parser.add_argument("--node-limit", type=int, default=DEFAULT_NODE_LIMIT, help="Most files the node cases are run on (default: %(default)s)")
+    parser.add_argument("--output", help="Write the results as JSON to this path")
+    parser.add_argument("--baseline", help="Results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Slowdown factor which counts as a regression (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    caseNames = [name.strip() for name in args.cases.split(",") if name.strip()]
+    for name in caseNames:
+        if not name in CASES:
+            parser.error("unknown case " + name)
+
+    results = runSuite(sizes, args.corpus_dir, caseNames, args.repeats, args.node_limit)
+
+    report = dict()
+    report["version"] = RESULTS_VERSION
+    report["date"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    report["revision"] = _gitRevision()
+    report["python"] = platform.python_version()
+    report["platform"] = platform.platform()
+    report["cpus"] = os.cpu_count()
+    report["repeats"] = args.repeats
+    report["results"] = results
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compareResults(results, baseline, args.threshold)
+        for (result, ratio) in regressions:
+            print("REGRESSION %s, %d files: %.2fx slower than the baseline" % (result["case"], result["size"], ratio))
+        if regressions:
+            return 1
+        print("no regressions against " + args.baseline)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
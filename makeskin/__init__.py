@@ -4,8 +4,6 @@
 #  Authors: Joel Palmius
 #           black-punkduck
 
-from .utils import blendMatLoad, setVersion
-
 bl_info = {
     "name": "MakeSkin",
     "author": "Joel Palmius",
@@ -16,27 +14,41 @@ bl_info = {
     'wiki_url': "http://www.makehumancommunity.org/",
     "category": "MakeHuman"}
 
-setVersion(bl_info["version"])
+# When imported outside blender (batch tools, CI), only the bpy-free MHMAT core
+# (mhmatfile, mhmat_keys, keytypes) is available.
+try:
+    import bpy
+except ImportError:
+    bpy = None
 
-from bpy.utils import register_class, unregister_class
-from .extraproperties import extraProperties
-from .makeskin import MHS_PT_MakeSkinPanel
-from .operators import *
-from .material import MHMat
+from .mhmatfile import MHMatFile
 
 MAKESKIN_VERSION = bl_info["version"]
 
 MAKESKIN_CLASSES = []
-MAKESKIN_CLASSES.extend(OPERATOR_CLASSES)
-MAKESKIN_CLASSES.append(MHS_PT_MakeSkinPanel)
 
 __all__ = [
     "MAKESKIN_CLASSES",
     "MAKESKIN_VERSION",
-    "MHMat",
-    "blendMatLoad"
+    "MHMatFile"
 ]
 
+if bpy is not None:
+    from .utils import blendMatLoad, setVersion
+
+    setVersion(bl_info["version"])
+
+    from bpy.utils import register_class, unregister_class
+    from .extraproperties import extraProperties
+    from .makeskin import MHS_PT_MakeSkinPanel
+    from .operators import *
+    from .material import MHMat
+
+    MAKESKIN_CLASSES.extend(OPERATOR_CLASSES)
+    MAKESKIN_CLASSES.append(MHS_PT_MakeSkinPanel)
+
+    __all__.extend(["MHMat", "blendMatLoad"])
+
 def register():
     extraProperties()
     for cls in MAKESKIN_CLASSES:
@@ -50,4 +62,3 @@ def unregister():
 if __name__ == "__main__":
     register()
     print("MakeSkin loaded")
-
@@ -0,0 +1,180 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Crash and concurrency safe file writing. Files are written under a temporary name in the same
+# directory, flushed to disk and then renamed over the destination, so a reader (MakeHuman, or
+# another exporter) sees either the old or the new file, never a truncated one. Writers of the
+# same material can also serialize on an advisory lock. This module is bpy-free.
+
+import os, stat, time, uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+# Seconds to wait for the lock of a material before giving up
+LOCK_TIMEOUT = 60.0
+LOCK_POLL_INTERVAL = 0.1
+
+# Hidden directory next to the locked files, skipped by everything scanning material libraries
+LOCK_DIR_NAME = ".makeskin_locks"
+
+def _shareModeOf(directory):
+    # Whoever may write the directory may also take the locks in it, whatever their umask
+    try:
+        return stat.S_IMODE(os.stat(directory).st_mode)
+    except OSError:
+        return None
+
+def _chmod(path, mode):
+    try:
+        os.chmod(path, mode)
+    except OSError:
+        # Not ours, the creator already set it
+        pass
+
+def tempPathFor(path):
+    """A unique hidden name next to path, on the same file system so that it can be renamed over it"""
+    (directory, fileName) = os.path.split(os.path.abspath(path))
+    return os.path.join(directory, "." + fileName + ".tmp-" + uuid.uuid4().hex[:12])
+
+def isTempPath(fileName):
+    return fileName.startswith(".") and ".tmp-" in fileName
+
+def fsyncPath(path):
+    with open(path, 'rb') as f:
+        os.fsync(f.fileno())
+
+def _fsyncDirectory(directory):
+    # Makes the rename itself durable. Directories cannot be opened on windows, where the rename
+    # is durable once it returns anyway.
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def replaceFile(tempPath, path, sync=True):
+    """Move a completely written tempPath over path. With sync, the content is on disk before the rename."""
+    if sync:
+        fsyncPath(tempPath)
+    os.replace(tempPath, path)
+    if sync:
+        _fsyncDirectory(os.path.dirname(os.path.abspath(path)))
+
+@contextmanager
+def atomicWriter(path, mode='w'):
+    """Open a temporary file to write path with. It replaces path when the block ends without an exception, and is removed otherwise."""
+    tempPath = tempPathFor(path)
+    try:
+        with open(tempPath, mode) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tempPath, path)
+        _fsyncDirectory(os.path.dirname(os.path.abspath(path)))
+    finally:
+        if os.path.lexists(tempPath):
+            os.unlink(tempPath)
+
+@contextmanager
+def atomicPath(path):
+    """For writers which need a file name rather than a file object: yields a temporary path which replaces path when the block ends without an exception."""
+    tempPath = tempPathFor(path)
+    (dummy, ext) = os.path.splitext(path)
+    # Keep the extension, some writers (blender) decide the format by it
+    tempPath += ext
+    try:
+        yield tempPath
+        replaceFile(tempPath, path)
+    finally:
+        if os.path.lexists(tempPath):
+            os.unlink(tempPath)
+
+class FileLock:
+    """
+    Advisory lock for writing path, held on name.lock in a hidden .makeskin_locks directory next
+    to it. Keeping the lock with the data is what lets exporters on several machines writing to
+    the same network share exclude each other, as long as the share supports record locks across
+    clients (NFS with lockd or v4, SMB); on shares which do not, only writers on the same machine
+    are kept out. The directory and lock files get the permissions of the directory holding the
+    material, so that everyone who may write the material may take its lock. Only cooperating
+    writers are kept out, readers are protected by the atomic replace instead. The lock file is
+    left in place when released, deleting it would race with the next writer opening it. Like all
+    POSIX record locks, this separates processes, not threads of one process.
+    """
+
+    def __init__(self, path, timeout=LOCK_TIMEOUT):
+        (directory, fileName) = os.path.split(os.path.abspath(path))
+        self.path = path
+        self.lockDir = os.path.join(directory, LOCK_DIR_NAME)
+        self.lockPath = os.path.join(self.lockDir, fileName + ".lock")
+        self.timeout = timeout
+        self._fd = None
+
+    def _tryLock(self):
+        if fcntl is not None:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        elif msvcrt is not None:
+            msvcrt.locking(self._fd, msvcrt.LK_NBLCK, 1)
+
+    def _openLockFile(self):
+        mode = _shareModeOf(os.path.dirname(self.lockDir))
+        if not os.path.isdir(self.lockDir):
+            try:
+                os.mkdir(self.lockDir)
+                if mode is not None:
+                    _chmod(self.lockDir, mode)
+            except FileExistsError:
+                pass
+        try:
+            fd = os.open(self.lockPath, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o666)
+        except FileExistsError:
+            return os.open(self.lockPath, os.O_RDWR)
+        if mode is not None:
+            _chmod(self.lockPath, mode & 0o666)
+        return fd
+
+    def acquire(self):
+        self._fd = self._openLockFile()
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                self._tryLock()
+                return
+            except OSError:
+                if time.monotonic() >= deadline:
+                    os.close(self._fd)
+                    self._fd = None
+                    raise TimeoutError("Could not lock " + self.lockPath + " for " + self.path + " within %.0f seconds, another export of the same material is running" % self.timeout)
+                time.sleep(LOCK_POLL_INTERVAL)
+
+    def release(self):
+        if self._fd is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+            elif msvcrt is not None:
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.release()
@@ -0,0 +1,216 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Command line batch processing of MHMAT files, without blender. Walks a directory tree,
+# parses every .mhmat file with MHMatFile and validates it or writes it out again. The files
+# are spread over a process pool with one worker per core.
+#
+#   python -m makeskin.batch /path/to/library
+#   python -m makeskin.batch /path/to/library --output /path/to/normalized --textures NORMALIZE
+#   python -m makeskin.batch /path/to/library --output /path/to/export --textures STORE --gc
+#   python -m makeskin.batch /path/to/library --output /path/to/normalized --trace trace.json
+#
+
+import argparse, io, json, os, sys, traceback
+from contextlib import redirect_stdout
+from multiprocessing import Pool
+from .mhmatfile import MHMatFile
+from .validation import validateMaterial
+from .texturecopy import TextureCopyStats
+from .texturestore import TextureStore, DEFAULT_STORE_DIR
+from .atomicwrite import FileLock
+from .instrumentation import INSTRUMENTATION, TRACE_FORMATS
+
+# Same choices as the "Paths" option of the write panel (extraproperties._textures)
+TEXTURE_HANDLING = ["NORMALIZE", "COPY", "LINK", "STORE"]
+
+# Progress messages printed by MHMatFile.copyTextures(), these are not warnings
+_TEXTURE_COPY_MESSAGES = ("copied from ", "linked from ", "Destination is unchanged", "Source and destination is same file", "Texture copy: ", "Stored ", "Texture store: ")
+
+def findMaterialFiles(rootDir):
+    """Return the absolute paths of all .mhmat files below rootDir, sorted"""
+    found = []
+    for (dirPath, dirNames, fileNames) in os.walk(rootDir):
+        dirNames.sort()
+        for fileName in sorted(fileNames):
+            if fileName.lower().endswith(".mhmat"):
+                found.append(os.path.abspath(os.path.join(dirPath, fileName)))
+    return found
+
+def processMaterialFile(job):
+    """
+    Parse, validate and optionally re-emit one material. job is a tuple of
+    (fileName, outputFileName, textureHandling, allowHardlink, storeDir), where outputFileName may be
+    None for validation only, and storeDir is the texture store for the STORE handling. Returns a
+    result dict which is safe to send between processes.
+    """
+    (fileName, outputFileName, textureHandling, allowHardlink, storeDir) = job
+    with INSTRUMENTATION.span("material", file=fileName):
+        result = _processMaterialFile(fileName, outputFileName, textureHandling, allowHardlink, storeDir)
+    if INSTRUMENTATION.enabled:
+        # Handed to the parent process with the result, see processDirectory
+        result["trace"] = INSTRUMENTATION.drain()
+    return result
+
+def _processMaterialFile(fileName, outputFileName, textureHandling, allowHardlink, storeDir):
+    result = dict()
+    result["file"] = fileName
+    result["output"] = outputFileName
+    result["status"] = "ok"
+    result["warnings"] = []
+    result["error"] = None
+    result["bytesCopied"] = 0
+    result["bytesSkipped"] = 0
+    result["validation"] = None
+
+    # The parser reports problems such as invalid keys by printing them, collect
+    # those per file instead of interleaving them on stdout
+    messages = io.StringIO()
+    try:
+        with redirect_stdout(messages):
+            mhmat = MHMatFile(fileName=fileName)
+            validation = validateMaterial(mhmat)
+            if outputFileName and validation.ok:
+                os.makedirs(os.path.dirname(outputFileName), exist_ok=True)
+                stats = TextureCopyStats()
+                with FileLock(outputFileName):
+                    if textureHandling == "NORMALIZE":
+                        stats = mhmat.copyTextures(outputFileName, allowHardlink=allowHardlink)
+                    if textureHandling == "COPY":
+                        stats = mhmat.copyTextures(outputFileName, normalize=False, allowHardlink=allowHardlink)
+                    if textureHandling == "STORE":
+                        # One thread per file, the files themselves are already spread over processes
+                        stats = mhmat.storeTextures(outputFileName, TextureStore(storeDir), workers=1)
+                    # The blend material is read relative to the material, so it always goes
+                    # along, whatever happens to the textures
+                    copied = mhmat.copyBlendMaterial(outputFileName, allowHardlink=allowHardlink)
+                    if copied:
+                        stats.add(*copied)
+                    mhmat.writeFile(outputFileName)
+                result["bytesCopied"] = stats.bytesCopied
+                result["bytesSkipped"] = stats.bytesSkipped
+            else:
+                # A material which did not validate is not written out
+                result["output"] = None
+                str(mhmat)
+        result["validation"] = validation.asDict()
+        for issue in validation.errors:
+            result["status"] = "error"
+            result["error"] = str(issue) if result["error"] is None else result["error"] + "; " + str(issue)
+        result["warnings"].extend([str(issue) for issue in validation.warnings])
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = "".join(traceback.format_exception_only(type(e), e)).strip()
+
+    for line in messages.getvalue().splitlines():
+        line = line.strip()
+        # Texture copying is chatty, only keep what the parser complained about
+        if line and not line.startswith(_TEXTURE_COPY_MESSAGES):
+            result["warnings"].append(line)
+
+    if result["status"] == "ok" and result["warnings"]:
+        result["status"] = "warning"
+    return result
+
+def _startInstrumentation(origin):
+    INSTRUMENTATION.reset(origin)
+    INSTRUMENTATION.enabled = True
+
+def processDirectory(inputDir, outputDir=None, textureHandling="NORMALIZE", workers=None, allowHardlink=False, storeDir=None, instrument=False):
+    """
+    Process all materials below inputDir, returning a list of result dicts in file order. With
+    instrument, the spans and counters of all workers are collected in INSTRUMENTATION.
+    """
+    jobs = []
+    inputDir = os.path.abspath(inputDir)
+    if outputDir and not storeDir:
+        storeDir = os.path.join(os.path.abspath(outputDir), DEFAULT_STORE_DIR)
+    for fileName in findMaterialFiles(inputDir):
+        outputFileName = None
+        if outputDir:
+            outputFileName = os.path.join(os.path.abspath(outputDir), os.path.relpath(fileName, inputDir))
+        jobs.append((fileName, outputFileName, textureHandling, allowHardlink, storeDir))
+
+    if not jobs:
+        return []
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if instrument:
+        _startInstrumentation(None)
+    try:
+        if workers < 2:
+            results = [processMaterialFile(job) for job in jobs]
+        else:
+            chunkSize = max(1, min(64, len(jobs) // (workers * 4)))
+            initializer = _startInstrumentation if instrument else None
+            with Pool(processes=workers, initializer=initializer, initargs=(INSTRUMENTATION.origin,)) as pool:
+                results = list(pool.imap(processMaterialFile, jobs, chunksize=chunkSize))
+    finally:
+        INSTRUMENTATION.enabled = False
+
+    for result in results:
+        if "trace" in result:
+            INSTRUMENTATION.merge(*result.pop("trace"))
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m makeskin.batch", description="Validate or normalize a directory tree of MHMAT files")
+    parser.add_argument("input", help="Directory to search for .mhmat files")
+    parser.add_argument("--output", help="Write the parsed materials to this directory, using the same structure as the input. If not given, only validate.")
+    parser.add_argument("--textures", choices=TEXTURE_HANDLING, default="NORMALIZE", help="How to handle texture files when writing output (default: NORMALIZE)")
+    parser.add_argument("--store", help="Texture store directory for --textures STORE (default: " + DEFAULT_STORE_DIR + " in the output directory)")
+    parser.add_argument("--gc", action="store_true", help="After writing, remove the textures in the store which no material in the output directory refers to")
+    parser.add_argument("--hardlink", action="store_true", help="Hard link textures instead of copying them when input and output are on the same file system. Textures put into a store are always copied")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: one per core)")
+    parser.add_argument("--report", help="Write a JSON report with the result for every file to this path")
+    parser.add_argument("--quiet", action="store_true", help="Only print files with warnings or errors")
+    parser.add_argument("--trace", help="Record timings of every step and write them to this path")
+    parser.add_argument("--trace-format", choices=TRACE_FORMATS, default="CHROME", help="Format of the --trace file (default: CHROME, for chrome://tracing or ui.perfetto.dev)")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.input):
+        parser.error(args.input + " is not a directory")
+
+    if args.gc and not args.output:
+        parser.error("--gc needs --output")
+
+    results = processDirectory(args.input, args.output, args.textures, args.workers, args.hardlink, args.store, instrument=bool(args.trace))
+
+    counts = {"ok": 0, "warning": 0, "error": 0}
+    for result in results:
+        counts[result["status"]] += 1
+        if result["status"] == "error":
+            print("ERROR   " + result["file"] + ": " + result["error"])
+        elif result["status"] == "warning":
+            print("WARNING " + result["file"])
+        elif not args.quiet:
+            print("OK      " + result["file"])
+        for warning in result["warnings"]:
+            print("        " + warning)
+
+    print("%d files: %d ok, %d with warnings, %d with errors" % (len(results), counts["ok"], counts["warning"], counts["error"]))
+    if args.output:
+        bytesCopied = sum(result["bytesCopied"] for result in results)
+        bytesSkipped = sum(result["bytesSkipped"] for result in results)
+        print("textures: %.1f MB copied, %.1f MB skipped" % (bytesCopied / 1048576.0, bytesSkipped / 1048576.0))
+
+    if args.gc:
+        # Only safe if every material using the store is in the output directory
+        store = TextureStore(args.store or os.path.join(args.output, DEFAULT_STORE_DIR))
+        (removed, freed) = store.collectGarbage(findMaterialFiles(args.output))
+        print("texture store: %d unreferenced textures removed, %.1f MB freed" % (removed, freed / 1048576.0))
+
+    if args.trace:
+        INSTRUMENTATION.writeTrace(args.trace, args.trace_format)
+        print("timings: " + INSTRUMENTATION.summary())
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if counts["error"] > 0:
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
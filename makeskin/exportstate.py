@@ -0,0 +1,67 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Remembers what the last export of each material wrote, so that saving a material again only
+# redoes the work whose inputs changed. For every output (the .mhmat file, the blend material,
+# every normalized texture) a fingerprint of the inputs is kept together with the size and mtime
+# of the output file as it was written. The step can be skipped when both still match, which
+# also catches outputs that were changed or deleted behind our back. The state only lives for
+# the session. This module is bpy-free.
+
+import hashlib, os, threading
+
+def fileSignature(path):
+    """(mtime, size) of path, or None if it does not exist"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+def textDigest(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class ExportState:
+    """The fingerprints of the outputs of one exported material, by output name"""
+
+    def __init__(self):
+        self._outputs = dict()
+
+    def isUnchanged(self, name, inputs, outputPath):
+        """True if output name was last written from the same inputs, and its file is still as written"""
+        entry = self._outputs.get(name)
+        if entry is None:
+            return False
+        (lastInputs, lastPath, lastSignature) = entry
+        return lastInputs == inputs and lastPath == outputPath and lastSignature is not None and fileSignature(outputPath) == lastSignature
+
+    def remember(self, name, inputs, outputPath):
+        """Record that output name was just written to outputPath from inputs"""
+        self._outputs[name] = (inputs, outputPath, fileSignature(outputPath))
+
+    def forget(self, name=None):
+        if name is None:
+            self._outputs = dict()
+        else:
+            self._outputs.pop(name, None)
+
+class ExportStates:
+    """ExportState per exported .mhmat file"""
+
+    def __init__(self):
+        self._states = dict()
+        self._lock = threading.Lock()
+
+    def get(self, mhmatFilenameAbsolute):
+        key = os.path.normcase(os.path.abspath(mhmatFilenameAbsolute))
+        with self._lock:
+            if not key in self._states:
+                self._states[key] = ExportState()
+            return self._states[key]
+
+    def clear(self):
+        with self._lock:
+            self._states = dict()
+
+# The state used by MHMat.writeMHmat
+EXPORT_STATES = ExportStates()
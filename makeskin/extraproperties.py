@@ -18,8 +18,33 @@ _textures = []
 _textures.append(("NORMALIZE", "Normalize", "Copy to a name based on MHMAT filename", 1))
 _textures.append(("COPY", "Copy", "Copy without rename", 2))
 _textures.append(("LINK", "Link", "Link to original location, with absolute pathname", 3))
+_textures.append(("STORE", "Shared store", "Copy into a texture store shared between materials, where each distinct texture is only stored once", 4))
 _texturesDescription = "How do we handle texture file names and paths? Unless you know what you are doing, you will want to use normalize. This will copy all images to an appropriate location with an appropriate filename, valid for uploading to the asset repository."
 
+_textureSizes = []
+_textureSizes.append(("0", "Unlimited", "Keep textures at their size", 1))
+_textureSizes.append(("1024", "1024", "Scale textures down until they are at most 1024 pixels wide and high", 2))
+_textureSizes.append(("2048", "2048", "Scale textures down until they are at most 2048 pixels wide and high", 3))
+_textureSizes.append(("4096", "4096", "Scale textures down until they are at most 4096 pixels wide and high", 4))
+_textureSizesDescription = "When normalizing, textures larger than this are scaled down by halving their size until they fit. This is only used when paths are normalized."
+
+_textureFormats = []
+_textureFormats.append(("KEEP", "Keep", "Keep the file format of each texture", 1))
+_textureFormats.append(("PNG", "PNG", "Convert textures to PNG", 2))
+_textureFormats.append(("JPEG", "JPEG", "Convert textures to JPEG, which is smaller but lossy and has no alpha", 3))
+_textureFormatsDescription = "File format of the normalized textures. This is only used when paths are normalized."
+
+_proxySizes = []
+_proxySizes.append(("512", "512", "Proxies at most 512 pixels wide or high", 1))
+_proxySizes.append(("1024", "1024", "Proxies at most 1024 pixels wide or high", 2))
+_proxySizes.append(("2048", "2048", "Proxies at most 2048 pixels wide or high", 3))
+_proxySizesDescription = "Maximum size of the proxy textures used in the viewport."
+
+_traceFormats = []
+_traceFormats.append(("CHROME", "Chrome trace", "Trace event format, which can be opened in chrome://tracing or ui.perfetto.dev", 1))
+_traceFormats.append(("JSON", "JSON", "Totals per span and counter, followed by every span", 2))
+_traceFormatsDescription = "File format of the timings written after each import or write."
+
 _litspheres = []
 _litspheres.append(("lit_leather", "leather", "Leather litsphere. This is appropriate for all clothes, not only leather.", 1))
 _litspheres.append(("lit_standard_skin", "standard skin", "Standard skin litsphere. This is appropriate for all skins.", 2))
@@ -54,6 +79,16 @@ def extraProperties():
 
     bpy.types.Scene.MhMsOverwrite = BoolProperty(name="Overwrite existing material", description="Overwrite existing material(s) on object", default=False)
     bpy.types.Scene.MhMsNodeVis = BoolProperty(name="Extended node visualization", description="Creates special nodes to visualize MakeHuman properties", default=False)
+    bpy.types.Scene.MhMsDeferImages = BoolProperty(name="Deferred image loading", description="When importing, do not read texture files right away. They are loaded in the background, or when first displayed", default=False)
+    bpy.types.Scene.MhMsUseTemplates = BoolProperty(name="Reuse node setups", description="Copy the node setup of new materials from a hidden template built once per combination of texture maps, instead of building every setup node by node", default=True)
+    bpy.types.Scene.MhMsProxyTextures = BoolProperty(name="Proxy textures", description="When importing, use downscaled copies of the textures in the node setup. Written materials still refer to the full resolution textures", default=False)
+    bpy.types.Scene.MhMsProxySize = bpy.props.EnumProperty(items=_proxySizes, name="Proxy size", description=_proxySizesDescription, default="1024")
+    bpy.types.Scene.MhMsProxyCacheDir = StringProperty(name="Proxy cache", description="Directory where proxy textures are stored. If empty, a directory in the system temp location is used", default="", subtype='DIR_PATH')
+    bpy.types.Scene.MhMsTextureStoreDir = StringProperty(name="Texture store", description="Directory of the shared texture store used by the \"Shared store\" paths option. If empty, a textures directory next to the material file is used", default="", subtype='DIR_PATH')
+    bpy.types.Scene.MhMsCopyWorkers = IntProperty(name="Texture copy threads", description="How many texture files are copied at the same time when writing a material", default=4, min=1, max=32)
+    bpy.types.Scene.MhMsInstrument = BoolProperty(name="Record timings", description="Time the steps of importing and writing materials, and count the bytes and images they read and write. A summary is shown in the operator report", default=False)
+    bpy.types.Scene.MhMsTraceFile = StringProperty(name="Timings file", description="If set, the recorded timings of each import or write are saved to this file", default="", subtype='FILE_PATH')
+    bpy.types.Scene.MhMsTraceFormat = bpy.props.EnumProperty(items=_traceFormats, name="Timings format", description=_traceFormatsDescription, default="CHROME")
 
     # Metadata keys
     bpy.types.Object.MhMsName = StringProperty(name="Name", description="The name of this material. This name is used for exports e.g. with mhx2.", default="material")
@@ -73,10 +108,16 @@ def extraProperties():
     bpy.types.Object.MhMsTransparent = BoolProperty(name="Transparent", description="Use transparent, when you expect that your object will be in front of another transparent object. Using the alpha-channel, MakeHuman is internally only able to render one transparent layer. Use this and switch backface culling off, when you create transparent hair.", default=False)
     bpy.types.Object.MhMsDepthless = BoolProperty(name="Depthless", description="If the material is to be rendered as having no depth. It is unlikely you want this.", default=False)
     bpy.types.Object.MhMsSSSEnable = BoolProperty(name="SSS Enable", description="If the material is to be rendered with sub surface scattering.", default=False)
-    bpy.types.Object.MhMsAutoBlend = BoolProperty(name="Auto blend skin", description="Autoadjust lit sphere and diffuse color to match skin tone", default=False)
+    bpy.types.Object.MhMsAutoBlend = BoolProperty(name="Auto blend skin", description="Autoadjust lit sphere and diffuse color to match skin tone. When writing, the skin tone is measured from the diffuse texture, and its average color, lightness histogram and the best matching skin litsphere are written to the file", default=False)
     bpy.types.Object.MhMsUseLit = BoolProperty(name="Use Litsphere", description="Use the litsphere shader when rendering material in MakeHuman. This does not have any effect on materials outside MakeHuman", default=True)
     bpy.types.Object.MhMsWriteBlendMaterial = BoolProperty(name="Write Blend material", description="Stores the second material on the active object in a blend file", default=False)
 
     # Options
     bpy.types.Object.MhMsLitsphere = bpy.props.EnumProperty(items=_litspheres, name="Litsphere", description=_litsphereDescription, default="lit_leather")
     bpy.types.Object.MhMsTextures = bpy.props.EnumProperty(items=_textures, name="Textures", description=_texturesDescription, default="NORMALIZE")
+    bpy.types.Object.MhMsTextureMaxSize = bpy.props.EnumProperty(items=_textureSizes, name="Texture size", description=_textureSizesDescription, default="0")
+    bpy.types.Object.MhMsTextureFormat = bpy.props.EnumProperty(items=_textureFormats, name="Texture format", description=_textureFormatsDescription, default="KEEP")
+    bpy.types.Object.MhMsGenerateNormal = BoolProperty(name="Normal map from bump", description="When writing a material which has a bump map but no normal map, generate the normal map from the bump map", default=False)
+    bpy.types.Object.MhMsGenerateRoughness = BoolProperty(name="Roughness map from specular", description="When writing a material which has a specular map but no roughness map, generate the roughness map by inverting the specular map", default=False)
+    bpy.types.Object.MhMsNormalStrength = FloatProperty(name="Normal strength", description="How steep the normals generated from the bump map are", default=4.0, min=0.1, max=50.0)
+    bpy.types.Object.MhMsPackMaps = BoolProperty(name="Pack maps", description="When normalizing, pack the ambient occlusion, roughness and metallic maps into the red, green and blue channels of one texture", default=False)
@@ -0,0 +1,249 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Reads size, channel count and bit depth of image files from their headers only, without decoding
+# any pixels. Results are cached by path, mtime and size, so asking again about an unchanged file
+# costs one stat. This module is bpy-free.
+
+import os, struct, threading
+from collections import OrderedDict
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+EXR_SIGNATURE = b'\x76\x2f\x31\x01'
+
+# PNG color type -> channels
+_PNG_CHANNELS = {0: 1, 2: 3, 3: 3, 4: 2, 6: 4}
+
+# JPEG start of frame markers (all except DHT, JPG and DAC in the C0..CF range)
+_JPEG_SOF_MARKERS = set([0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF])
+
+# EXR pixel type -> bits per channel
+_EXR_BITS = {0: 32, 1: 16, 2: 32}
+
+# The canonical file extension of each format
+FORMAT_EXTENSIONS = {"PNG": ".png", "JPEG": ".jpg", "TGA": ".tga", "EXR": ".exr"}
+
+class ImageInfo:
+
+    def __init__(self, format, width, height, channels, bitDepth):
+        self.format = format
+        self.width = width
+        self.height = height
+        self.channels = channels
+        self.bitDepth = bitDepth
+
+    @property
+    def hasAlpha(self):
+        return self.channels in [2, 4]
+
+    @property
+    def isFloat(self):
+        return self.format == "EXR"
+
+    @property
+    def colorspaceHint(self):
+        """Float images hold linear values, everything else is assumed to be sRGB encoded"""
+        return "Linear" if self.isFloat else "sRGB"
+
+    @property
+    def extension(self):
+        return FORMAT_EXTENSIONS[self.format]
+
+    def matchesExtension(self, ext):
+        """True if a file name ending in ext would be read as this format"""
+        return _READERS.get(ext.lower()) is _READERS[self.extension]
+
+    def __str__(self):
+        return "%s %dx%d, %d channels, %d bit" % (self.format, self.width, self.height, self.channels, self.bitDepth)
+
+def _readPng(f):
+    header = f.read(33)
+    if len(header) < 33 or header[:8] != PNG_SIGNATURE or header[12:16] != b'IHDR':
+        return None
+    (width, height, bitDepth, colorType) = struct.unpack('>IIBB', header[16:26])
+    channels = _PNG_CHANNELS.get(colorType)
+    if channels is None:
+        return None
+    if colorType == 3:
+        # Palette images have 8 bit per channel after expansion, whatever the index size
+        bitDepth = 8
+        # A tRNS chunk gives a palette image an alpha channel
+        while True:
+            chunkHeader = f.read(8)
+            if len(chunkHeader) < 8:
+                break
+            (length, chunkType) = struct.unpack('>I4s', chunkHeader)
+            if chunkType == b'tRNS':
+                channels = 4
+                break
+            if chunkType == b'IDAT' or chunkType == b'IEND':
+                break
+            f.seek(length + 4, os.SEEK_CUR)
+    return ImageInfo("PNG", width, height, channels, bitDepth)
+
+def _readJpeg(f):
+    if f.read(2) != b'\xff\xd8':
+        return None
+    while True:
+        byte = f.read(1)
+        while byte and byte != b'\xff':
+            byte = f.read(1)
+        while byte == b'\xff':
+            byte = f.read(1)
+        if not byte:
+            return None
+        marker = byte[0]
+        if marker == 0xD9 or marker == 0xDA:
+            # End of image or start of scan before any frame header
+            return None
+        if 0xD0 <= marker <= 0xD7 or marker == 0x01:
+            continue
+        lengthBytes = f.read(2)
+        if len(lengthBytes) < 2:
+            return None
+        (length,) = struct.unpack('>H', lengthBytes)
+        if marker in _JPEG_SOF_MARKERS:
+            frame = f.read(6)
+            if len(frame) < 6:
+                return None
+            (precision, height, width, components) = struct.unpack('>BHHB', frame)
+            return ImageInfo("JPEG", width, height, components, precision)
+        f.seek(length - 2, os.SEEK_CUR)
+
+def _readTga(f):
+    header = f.read(18)
+    if len(header) < 18:
+        return None
+    (idLength, colorMapType, imageType) = struct.unpack('<BBB', header[:3])
+    (width, height, pixelDepth, descriptor) = struct.unpack('<HHBB', header[12:18])
+    if imageType not in [1, 2, 3, 9, 10, 11] or width == 0 or height == 0:
+        return None
+    alphaBits = descriptor & 0x0F
+    if imageType in [3, 11]:
+        channels = 2 if alphaBits else 1
+        return ImageInfo("TGA", width, height, channels, 8)
+    if imageType in [1, 9]:
+        return ImageInfo("TGA", width, height, 4 if alphaBits else 3, 8)
+    if pixelDepth == 32:
+        return ImageInfo("TGA", width, height, 4, 8)
+    if pixelDepth == 16:
+        return ImageInfo("TGA", width, height, 4 if alphaBits else 3, 5)
+    return ImageInfo("TGA", width, height, 3, 8)
+
+def _readExr(f):
+    start = f.read(8)
+    if len(start) < 8 or start[:4] != EXR_SIGNATURE:
+        return None
+    channels = None
+    bitDepth = 0
+    dataWindow = None
+    # The header is a list of (name, type, size, value) attributes, ended by an empty name
+    while channels is None or dataWindow is None:
+        name = _readCString(f)
+        if not name:
+            break
+        attributeType = _readCString(f)
+        sizeBytes = f.read(4)
+        if attributeType is None or len(sizeBytes) < 4:
+            return None
+        (size,) = struct.unpack('<i', sizeBytes)
+        if name == b'channels' and attributeType == b'chlist':
+            value = f.read(size)
+            channels = 0
+            position = 0
+            # name, pixel type, pLinear, 3 reserved bytes, x and y sampling; ended by an empty name
+            while position < len(value) and value[position] != 0:
+                position = value.index(b'\x00', position) + 1
+                (pixelType,) = struct.unpack('<i', value[position:position + 4])
+                bitDepth = max(bitDepth, _EXR_BITS.get(pixelType, 0))
+                channels += 1
+                position += 16
+        elif name == b'dataWindow' and attributeType == b'box2i':
+            (xMin, yMin, xMax, yMax) = struct.unpack('<iiii', f.read(16))
+            dataWindow = (xMax - xMin + 1, yMax - yMin + 1)
+        else:
+            f.seek(size, os.SEEK_CUR)
+    if channels is None or dataWindow is None:
+        return None
+    return ImageInfo("EXR", dataWindow[0], dataWindow[1], channels, bitDepth)
+
+def _readCString(f, maxLength=256):
+    chars = []
+    while len(chars) < maxLength:
+        char = f.read(1)
+        if not char:
+            return None
+        if char == b'\x00':
+            return b''.join(chars)
+        chars.append(char)
+    return None
+
+_READERS = dict()
+_READERS[".png"] = _readPng
+_READERS[".jpg"] = _readJpeg
+_READERS[".jpeg"] = _readJpeg
+_READERS[".tga"] = _readTga
+_READERS[".exr"] = _readExr
+
+def readImageInfo(path):
+    """Return an ImageInfo for the file, or None if it is not an image this module understands"""
+    (dummy, ext) = os.path.splitext(path)
+    reader = _READERS.get(ext.lower())
+    with open(path, 'rb') as f:
+        if reader is not None:
+            info = reader(f)
+            if info is not None:
+                return info
+        # The extension might be lying, try the formats with a signature
+        f.seek(0)
+        start = f.read(8)
+        if start == PNG_SIGNATURE:
+            f.seek(0)
+            return _readPng(f)
+        if start[:2] == b'\xff\xd8':
+            f.seek(0)
+            return _readJpeg(f)
+        if start[:4] == EXR_SIGNATURE:
+            f.seek(0)
+            return _readExr(f)
+    return None
+
+class ImageInfoCache:
+    """
+    Remembers the ImageInfo of files for as long as their mtime and size are unchanged. Safe to
+    use from several threads.
+    """
+
+    def __init__(self, maxEntries=4096):
+        self.maxEntries = maxEntries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._entries = OrderedDict()
+
+    def get(self, path):
+        """Return the ImageInfo of path, or None if the format is not understood. Raises OSError if the file cannot be stat'ed or read."""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == signature:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        info = readImageInfo(path)
+        with self._lock:
+            self._entries[path] = (signature, info)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.maxEntries:
+                self._entries.popitem(last=False)
+        return info
+
+# The cache shared by node creation, validation and texture copying
+IMAGE_INFO_CACHE = ImageInfoCache()
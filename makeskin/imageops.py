@@ -0,0 +1,181 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Vectorized operations on pixel buffers. Pixels are numpy arrays of shape (height, width, channels)
+# with float values in 0..1, which is what blender's image.pixels gives when reshaped. This module
+# does not use bpy, but needs numpy (which is always bundled with blender).
+
+import tempfile
+import numpy as np
+
+# Pixel buffers larger than this are backed by a temporary file instead of memory. An 8K float RGBA
+# image is a gigabyte, and a few of them at once would otherwise exhaust the RAM of a normal desktop.
+MEMMAP_THRESHOLD = 256 * 1024 * 1024
+
+# Rows per tile for the tiled operations below. 256 rows of an 8K image are 8 MB per float plane.
+TILE_ROWS = 256
+
+def allocatePixels(height, width, channels, memmapAbove=MEMMAP_THRESHOLD):
+    """A float32 buffer of shape (height, width, channels), memory-mapped onto a temporary file if large"""
+    shape = (height, width, channels)
+    if height * width * channels * 4 <= memmapAbove:
+        return np.empty(shape, dtype=np.float32)
+    # The temporary file is already unlinked, the mapping keeps it alive until the buffer is freed
+    return np.memmap(tempfile.TemporaryFile(), dtype=np.float32, mode='w+', shape=shape)
+
+def fitSize(width, height, maxSize):
+    """Return (width, height) scaled down to fit within maxSize, keeping the aspect ratio"""
+    if width <= maxSize and height <= maxSize:
+        return (width, height)
+    scale = float(maxSize) / max(width, height)
+    return (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+
+def powerOfTwoFactor(width, height, maxSize):
+    """The smallest power of two to divide width and height by so that both fit within maxSize"""
+    factor = 1
+    while maxSize and (width // factor > maxSize or height // factor > maxSize):
+        factor *= 2
+    return factor
+
+def boxDownsample(pixels, factor):
+    """Average factor x factor blocks. Rows and columns which do not fill a whole block are dropped."""
+    if factor <= 1:
+        return pixels
+    (height, width, channels) = pixels.shape
+    newHeight = max(1, height // factor)
+    newWidth = max(1, width // factor)
+    cropped = pixels[:newHeight * factor, :newWidth * factor]
+    return cropped.reshape(newHeight, factor, newWidth, factor, channels).mean(axis=(1, 3), dtype=np.float32)
+
+def _lanczosWeights(sourceSize, targetSize, lobes=3):
+    # Dense (targetSize, sourceSize) resampling matrix with normalized rows
+    scale = float(sourceSize) / targetSize
+    stretch = max(scale, 1.0)
+    centers = (np.arange(targetSize, dtype=np.float64) + 0.5) * scale - 0.5
+    distance = (np.arange(sourceSize, dtype=np.float64)[np.newaxis, :] - centers[:, np.newaxis]) / stretch
+    weights = np.sinc(distance) * np.sinc(distance / lobes)
+    weights[np.abs(distance) >= lobes] = 0.0
+    weights /= weights.sum(axis=1, keepdims=True)
+    return weights.astype(np.float32)
+
+def lanczosResize(pixels, width, height, lobes=3):
+    """Resample to width x height with a separable lanczos filter"""
+    (sourceHeight, sourceWidth, channels) = pixels.shape
+    result = pixels
+    if sourceHeight != height:
+        rowWeights = _lanczosWeights(sourceHeight, height, lobes)
+        result = np.tensordot(rowWeights, result, axes=([1], [0]))
+    if sourceWidth != width:
+        columnWeights = _lanczosWeights(sourceWidth, width, lobes)
+        result = np.tensordot(result, columnWeights, axes=([1], [1])).transpose(0, 2, 1)
+    return np.clip(result, 0.0, None).astype(np.float32, copy=False)
+
+def resize(pixels, width, height, method="lanczos"):
+    """
+    Resize to width x height. Large reductions are first done with a box filter, down to at most
+    twice the target size, which keeps the lanczos matrices small. method is "box" or "lanczos".
+    """
+    (sourceHeight, sourceWidth, channels) = pixels.shape
+    if (sourceWidth, sourceHeight) == (width, height):
+        return pixels
+    factor = min(sourceWidth // max(1, width), sourceHeight // max(1, height))
+    if method != "box":
+        factor = factor // 2
+    if factor > 1:
+        pixels = boxDownsample(pixels, factor)
+    if pixels.shape[0] == height and pixels.shape[1] == width:
+        return pixels
+    return lanczosResize(pixels, width, height)
+
+def toRGBA(pixels, tileRows=TILE_ROWS):
+    """
+    Expand greyscale, grey+alpha or RGB pixels to RGBA, which is what blender images take. The
+    result comes from allocatePixels and is filled a band of rows at a time, so that expanding a
+    large memory-mapped image does not need a full copy of it in memory.
+    """
+    (height, width, channels) = pixels.shape
+    if channels == 4:
+        return pixels
+    rgba = allocatePixels(height, width, 4)
+    for top in range(0, height, tileRows):
+        bottom = min(height, top + tileRows)
+        tile = rgba[top:bottom]
+        if channels < 3:
+            tile[:, :, :3] = pixels[top:bottom, :, 0:1]
+        else:
+            tile[:, :, :3] = pixels[top:bottom, :, :3]
+        if channels == 2:
+            tile[:, :, 3] = pixels[top:bottom, :, 1]
+        else:
+            tile[:, :, 3] = 1.0
+    return rgba
+
+def packChannels(planes, width, height, defaults):
+    """
+    Build an RGB image from single channel planes. planes and defaults are lists with one entry per
+    output channel; a plane is a (height, width) array or None, in which case the channel is filled
+    with the default. Planes of another size are resized to width x height first.
+    """
+    packed = np.empty((height, width, len(planes)), dtype=np.float32)
+    for (channel, plane) in enumerate(planes):
+        if plane is None:
+            packed[:, :, channel] = defaults[channel]
+            continue
+        if plane.shape != (height, width):
+            plane = resize(plane[:, :, np.newaxis], width, height)[:, :, 0]
+        packed[:, :, channel] = plane
+    return packed
+
+# Rec. 709 luma weights, for turning color into grey
+LUMA = np.array([0.2126, 0.7152, 0.0722], dtype=np.float32)
+
+def toGrey(pixels):
+    """A (height, width) plane from pixels: the luma of RGB(A), or the first channel of grey images"""
+    if pixels.shape[2] >= 3:
+        return pixels[:, :, :3] @ LUMA
+    return np.asarray(pixels[:, :, 0], dtype=np.float32)
+
+def normalMapFromHeight(pixels, strength=4.0, out=None, tileRows=TILE_ROWS):
+    """
+    Derive a tangent space normal map (RGB, 0.5 0.5 1 is flat) from a height map with Sobel
+    gradients. Rows are in blender order, bottom first, so green points up as blender expects.
+    The image is processed a band of rows at a time, reading one extra row above and below, so
+    only a band's worth of temporary arrays exists at any time. out, if given, receives the
+    result and can be a memory-mapped buffer (see allocatePixels).
+    """
+    (height, width, channels) = pixels.shape
+    if out is None:
+        out = allocatePixels(height, width, 3)
+    for top in range(0, height, tileRows):
+        bottom = min(height, top + tileRows)
+        # One row of context on each side, repeated at the image border
+        band = toGrey(pixels[max(0, top - 1):min(height, bottom + 1)])
+        padTop = 1 if top == 0 else 0
+        padBottom = 1 if bottom == height else 0
+        band = np.pad(band, ((padTop, padBottom), (1, 1)), mode='edge')
+
+        gx = (band[:-2, 2:] + 2.0 * band[1:-1, 2:] + band[2:, 2:]) - (band[:-2, :-2] + 2.0 * band[1:-1, :-2] + band[2:, :-2])
+        gy = (band[2:, :-2] + 2.0 * band[2:, 1:-1] + band[2:, 2:]) - (band[:-2, :-2] + 2.0 * band[:-2, 1:-1] + band[:-2, 2:])
+        # The Sobel kernels weigh 8 samples, and each side is a difference over two pixels
+        nx = gx * (-strength / 8.0)
+        ny = gy * (-strength / 8.0)
+        length = np.sqrt(nx * nx + ny * ny + 1.0)
+        tile = out[top:bottom]
+        tile[:, :, 0] = nx / length * 0.5 + 0.5
+        tile[:, :, 1] = ny / length * 0.5 + 0.5
+        tile[:, :, 2] = 1.0 / length * 0.5 + 0.5
+    return out
+
+def roughnessFromSpecular(pixels, low=0.15, high=0.95, out=None, tileRows=TILE_ROWS):
+    """
+    Derive a roughness map from a specular map: shiny is smooth, so the specular intensity is
+    inverted and remapped to low..high. Processed a band of rows at a time like normalMapFromHeight.
+    """
+    (height, width, channels) = pixels.shape
+    if out is None:
+        out = allocatePixels(height, width, 1)
+    for top in range(0, height, tileRows):
+        bottom = min(height, top + tileRows)
+        specular = np.clip(toGrey(pixels[top:bottom]), 0.0, 1.0)
+        out[top:bottom, :, 0] = high - specular * (high - low)
+    return out
@@ -0,0 +1,146 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Keeps track of which image datablock belongs to which texture file, so that a file is only
+# loaded once per session no matter how many materials use it. Images are keyed by normalized
+# absolute path, and optionally also by content hash so that identical copies of a file in
+# different folders share a datablock too.
+#
+# Images can also be created deferred: the datablock only points at the file, and blender
+# decodes it the first time the viewport or render needs the pixels. Deferred images are
+# queued for a background preloader, which reads the files into the OS cache on a thread and
+# then lets blender decode them one at a time from a timer on the main thread.
+
+import bpy
+import os, threading
+from .texturecopy import fileHash, prefetchFiles
+from .instrumentation import INSTRUMENTATION
+
+# Seconds between two images decoded by the preloader, leaves the UI responsive in between
+PRELOAD_INTERVAL = 0.05
+
+def normalizePath(path):
+    return os.path.normcase(os.path.realpath(os.path.abspath(path)))
+
+class ImageRegistry:
+
+    def __init__(self, useContentHash=False):
+        self.useContentHash = useContentHash
+        self.hits = 0
+        self.misses = 0
+        self._byPath = dict()
+        self._byHash = dict()
+        self._pending = []
+        self._preloading = False
+        # normalized path -> image, for all of bpy.data.images when they were last scanned
+        self._loaded = dict()
+        self._scannedCount = -1
+
+    def clear(self):
+        self._byPath = dict()
+        self._byHash = dict()
+        self._pending = []
+        self._loaded = dict()
+        self._scannedCount = -1
+
+    def _stillValid(self, image, key):
+        # The datablock might have been removed, or a new blend file loaded, since we saw it
+        try:
+            return bpy.data.images.get(image.name) == image and normalizePath(bpy.path.abspath(image.filepath)) == key
+        except ReferenceError:
+            return False
+
+    def _findLoaded(self, key):
+        # An image loaded by someone else (blender itself, another addon...) is reused too.
+        # Scanning all images on every miss would make a mass import quadratic, so they are only
+        # scanned again when images were added or removed by someone else since the last scan.
+        if len(bpy.data.images) != self._scannedCount:
+            self._loaded = dict()
+            for image in bpy.data.images:
+                if image.filepath:
+                    self._loaded.setdefault(normalizePath(bpy.path.abspath(image.filepath)), image)
+            self._scannedCount = len(bpy.data.images)
+        image = self._loaded.get(key)
+        if image is not None and self._stillValid(image, key):
+            return image
+        return None
+
+    def _createDeferred(self, imagePathAbsolute):
+        # A file image which has not been loaded yet: blender reads the file when the image
+        # buffer is first needed
+        image = bpy.data.images.new(os.path.basename(imagePathAbsolute), width=1, height=1)
+        image.source = 'FILE'
+        image.filepath = imagePathAbsolute
+        self._pending.append(image.name)
+        return image
+
+    def getImage(self, imagePathAbsolute, deferred=False):
+        key = normalizePath(imagePathAbsolute)
+
+        image = self._byPath.get(key)
+        if image is not None and self._stillValid(image, key):
+            self.hits += 1
+            INSTRUMENTATION.count("images reused")
+            return image
+
+        image = self._findLoaded(key)
+        if image is not None:
+            self.hits += 1
+            INSTRUMENTATION.count("images reused")
+            self._byPath[key] = image
+            return image
+
+        contentHash = None
+        if self.useContentHash and os.path.isfile(key):
+            contentHash = fileHash(key)
+            (hashKey, image) = self._byHash.get(contentHash, (None, None))
+            if image is not None and self._stillValid(image, hashKey):
+                self.hits += 1
+                INSTRUMENTATION.count("images reused")
+                self._byPath[key] = image
+                return image
+
+        self.misses += 1
+        if deferred:
+            image = self._createDeferred(imagePathAbsolute)
+            INSTRUMENTATION.count("images deferred")
+        else:
+            with INSTRUMENTATION.span("load image", file=imagePathAbsolute):
+                image = bpy.data.images.load(imagePathAbsolute, check_existing=True)
+            INSTRUMENTATION.count("images loaded")
+        self._byPath[key] = image
+        # Our own image, no reason to scan again
+        self._loaded[key] = image
+        self._scannedCount = len(bpy.data.images)
+        if contentHash:
+            self._byHash[contentHash] = (key, image)
+        return image
+
+    def startPreloading(self):
+        """Start decoding the deferred images in the background, if not already doing so"""
+        if not self._pending or self._preloading:
+            return
+        paths = []
+        for name in self._pending:
+            image = bpy.data.images.get(name)
+            if image is not None:
+                paths.append(bpy.path.abspath(image.filepath))
+        threading.Thread(target=prefetchFiles, args=(paths,), daemon=True).start()
+        self._preloading = True
+        bpy.app.timers.register(self._preloadStep, first_interval=PRELOAD_INTERVAL)
+
+    def _preloadStep(self):
+        # bpy must only be touched on the main thread, so decoding happens here, one image per call
+        while self._pending:
+            image = bpy.data.images.get(self._pending.pop(0))
+            if image is not None and not image.has_data:
+                # Asking for the size makes blender load the image buffer
+                with INSTRUMENTATION.span("decode image", file=image.filepath):
+                    image.size[0]
+                INSTRUMENTATION.count("images decoded")
+                return PRELOAD_INTERVAL
+        self._preloading = False
+        return None
+
+# The registry used when creating texture nodes
+IMAGE_REGISTRY = ImageRegistry()
@@ -0,0 +1,98 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# The reading half of the chunked import operator. A worker thread parses the MHMAT files
+# (through the material cache, so a file imported onto several objects is parsed once) and
+# reads the textures they refer to into the OS cache. The main thread picks up the materials
+# with takeReady() as they come in, and only has the blender side left to do. This module is
+# bpy-free.
+#
+#   queue = ImportQueue(fileNames)
+#   queue.start()
+#   while not queue.done():
+#       for (index, fileName, mhmat, error) in queue.takeReady():
+#           ...
+#
+
+import threading, traceback
+from .keytypes import MHMATFileKey
+from .mhmat_keys import MHMAT_KEYS
+from .mhmatfile import MHMatFile
+from .materialcache import MATERIAL_CACHE
+from .texturecopy import prefetchFiles
+from .instrumentation import INSTRUMENTATION
+
+def textureFiles(mhmat):
+    """The absolute paths of the texture files a parsed material refers to"""
+    paths = []
+    for keyObj in MHMAT_KEYS:
+        key = keyObj.keyName
+        if isinstance(keyObj, MHMATFileKey) and not keyObj.blendMaterial and key != "litsphereTexture" and mhmat.settings.get(key):
+            paths.append(mhmat.settings[key])
+    return paths
+
+class ImportQueue:
+
+    # The reads are recorded as spans in instrumentation, if that is enabled
+    #
+    def __init__(self, fileNames, materialClass=MHMatFile, cache=MATERIAL_CACHE, prefetch=True, instrumentation=INSTRUMENTATION):
+        self.fileNames = list(fileNames)
+        self.instrumentation = instrumentation
+        self.materialClass = materialClass
+        self.cache = cache
+        self.prefetch = prefetch
+        self._ready = []
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self._finished = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Read the files on a worker thread"""
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def run(self):
+        """Read the files on the calling thread, start() runs this on the worker"""
+        prefetched = set()
+        try:
+            for (index, fileName) in enumerate(self.fileNames):
+                if self._cancelled.is_set():
+                    break
+                try:
+                    with self.instrumentation.span("read material", file=fileName):
+                        mhmat = self.cache.load(fileName, self.materialClass)
+                        if self.prefetch:
+                            paths = [path for path in textureFiles(mhmat) if not path in prefetched]
+                            prefetched.update(paths)
+                            prefetchFiles(paths)
+                    entry = (index, fileName, mhmat, None)
+                except Exception as e:
+                    entry = (index, fileName, None, "".join(traceback.format_exception_only(type(e), e)).strip())
+                with self._lock:
+                    self._ready.append(entry)
+        finally:
+            self._finished.set()
+
+    def cancel(self):
+        """Stop reading after the current file. Materials already read can still be taken."""
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def takeReady(self):
+        """
+        Return the materials read since the last call as (index in fileNames, fileName, material
+        or None, error or None) tuples, in file order. Never blocks.
+        """
+        with self._lock:
+            ready = self._ready
+            self._ready = []
+        return ready
+
+    def done(self):
+        """True once the worker has stopped and everything it read has been taken"""
+        with self._lock:
+            return self._finished.is_set() and not self._ready
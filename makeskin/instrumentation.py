@@ -0,0 +1,245 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Timing spans and counters for the hot paths of importing and writing materials: parsing,
+# building and reading node trees, loading and decoding images, copying textures and writing
+# files. Recording is off by default, and then a span is a shared object whose enter and exit do
+# nothing, so the instrumented code pays one attribute lookup. When on, every span is recorded
+# with its thread and nesting depth, and can be exported as JSON or as a Chrome trace (open it in
+# chrome://tracing or https://ui.perfetto.dev). This module is bpy-free.
+#
+#   with INSTRUMENTATION.run("import material", tracePath="/tmp/import.json"):
+#       with INSTRUMENTATION.span("parse", file=fileName):
+#           ...
+#       INSTRUMENTATION.count("bytes copied", size)
+#   print(INSTRUMENTATION.summary())
+#
+
+import functools, json, os, threading, time
+from contextlib import contextmanager
+
+TRACE_FORMATS = ["CHROME", "JSON"]
+
+# Spans named in the one line summary, the longest first
+SUMMARY_SPANS = 4
+
+class _NullSpan:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class _Span:
+
+    def __init__(self, instrumentation, name, args):
+        self._instrumentation = instrumentation
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        stack = self._instrumentation._stack()
+        self.depth = len(stack)
+        self.childTime = 0
+        stack.append(self)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        duration = time.perf_counter_ns() - self.start
+        stack = self._instrumentation._stack()
+        stack.pop()
+        if stack:
+            stack[-1].childTime += duration
+        self._instrumentation._record(self, duration)
+        return False
+
+class Instrumentation:
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self, origin=None):
+        """
+        Forget everything recorded. Span times are relative to origin, a time.perf_counter_ns(),
+        which defaults to now. Processes of a batch run pass the origin of the parent, so that
+        their spans line up in one trace.
+        """
+        with self._lock:
+            self._events = []
+            self._counters = dict()
+            self._origin = time.perf_counter_ns() if origin is None else origin
+
+    @property
+    def origin(self):
+        return self._origin
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = []
+            self._local.stack = stack
+        return stack
+
+    def _record(self, span, duration):
+        event = dict()
+        event["name"] = span.name
+        event["start"] = (span.start - self._origin) / 1000.0
+        event["duration"] = duration / 1000.0
+        event["self"] = (duration - span.childTime) / 1000.0
+        event["depth"] = span.depth
+        event["pid"] = os.getpid()
+        event["tid"] = threading.get_ident()
+        if span.args:
+            event["args"] = span.args
+        with self._lock:
+            self._events.append(event)
+
+    def span(self, name, **args):
+        """A context manager timing the block as a span called name. args are shown in the trace."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, args)
+
+    def count(self, name, amount=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    @property
+    def events(self):
+        """The recorded spans, in the order they ended. Times are in microseconds since the last reset."""
+        with self._lock:
+            return list(self._events)
+
+    @property
+    def counters(self):
+        with self._lock:
+            return dict(self._counters)
+
+    def merge(self, events, counters):
+        """Add spans and counters recorded elsewhere, such as by a batch worker process"""
+        with self._lock:
+            self._events.extend(events)
+            for name in counters.keys():
+                self._counters[name] = self._counters.get(name, 0) + counters[name]
+
+    def drain(self):
+        """Return (events, counters) recorded so far and forget them"""
+        with self._lock:
+            recorded = (self._events, self._counters)
+            self._events = []
+            self._counters = dict()
+        return recorded
+
+    def totals(self):
+        """name -> (number of spans, total time, self time), times in milliseconds"""
+        totals = dict()
+        for event in self.events:
+            (number, total, selfTime) = totals.get(event["name"], (0, 0.0, 0.0))
+            totals[event["name"]] = (number + 1, total + event["duration"] / 1000.0, selfTime + event["self"] / 1000.0)
+        return totals
+
+    def summary(self):
+        """One line naming the slowest spans and the counters, for operator reports"""
+        totals = self.totals()
+        names = sorted(totals.keys(), key=lambda name: totals[name][1], reverse=True)
+        parts = []
+        for name in names[:SUMMARY_SPANS]:
+            (number, total, selfTime) = totals[name]
+            parts.append("%s %.1f ms" % (name, total) + (" (%dx)" % number if number > 1 else ""))
+        counters = self.counters
+        for name in sorted(counters.keys()):
+            value = counters[name]
+            if name.startswith("bytes"):
+                parts.append("%s %.1f MB" % (name, value / 1048576.0))
+            else:
+                parts.append("%s %d" % (name, value))
+        return ", ".join(parts)
+
+    def asDict(self):
+        totals = self.totals()
+        spans = dict()
+        for name in totals.keys():
+            (number, total, selfTime) = totals[name]
+            spans[name] = {"count": number, "totalMs": total, "selfMs": selfTime}
+        return {"spans": spans, "counters": self.counters, "events": self.events}
+
+    def chromeTrace(self):
+        """The recorded spans and counters in the Chrome trace event format"""
+        traceEvents = []
+        lastEnd = 0.0
+        for event in self.events:
+            traceEvent = {"name": event["name"], "ph": "X", "ts": event["start"], "dur": event["duration"], "pid": event["pid"], "tid": event["tid"]}
+            if "args" in event:
+                traceEvent["args"] = event["args"]
+            traceEvents.append(traceEvent)
+            lastEnd = max(lastEnd, event["start"] + event["duration"])
+        counters = self.counters
+        if counters:
+            traceEvents.append({"name": "counters", "ph": "C", "ts": lastEnd, "pid": os.getpid(), "args": counters})
+        return {"traceEvents": traceEvents, "displayTimeUnit": "ms"}
+
+    def writeTrace(self, path, traceFormat="CHROME"):
+        data = self.chromeTrace() if traceFormat == "CHROME" else self.asDict()
+        with open(path, "w") as f:
+            json.dump(data, f, indent=1, default=str)
+
+    @contextmanager
+    def run(self, name, enabled=True, tracePath=None, traceFormat="CHROME", **args):
+        """
+        Record one operator run: forget what was recorded before, record the block as span name,
+        stop recording at the end and write the trace to tracePath if given. The recording stays
+        available for summary() until the next run. With enabled False, nothing is recorded.
+        """
+        if not enabled:
+            yield self
+            return
+        self.reset()
+        self.enabled = True
+        try:
+            with self.span(name, **args):
+                yield self
+        finally:
+            self.enabled = False
+            if tracePath:
+                self.writeTrace(tracePath, traceFormat)
+
+    @contextmanager
+    def recording(self, into, name, **args):
+        """
+        Record the block as span name, and move everything recorded into the Instrumentation into.
+        For operators working in steps, such as modal ones: recording is only on while a step runs,
+        so that operators run in between neither add to nor reset their recording.
+        """
+        self.reset(origin=into.origin)
+        self.enabled = True
+        try:
+            with self.span(name, **args):
+                yield self
+        finally:
+            self.enabled = False
+            (events, counters) = self.drain()
+            into.merge(events, counters)
+
+def instrumented(name):
+    """Decorator recording every call of a function as a span called name"""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not INSTRUMENTATION.enabled:
+                return function(*args, **kwargs)
+            with INSTRUMENTATION.span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+# The instrumentation used by all of makeskin
+INSTRUMENTATION = Instrumentation()
@@ -3,6 +3,21 @@
 
 import re, os
 
+# A MHMAT line is a key followed by whitespace and a value. The line is split once with this
+# regex, after which the value is handed to the parseValue() of the matching key type.
+#
+KEY_VALUE_LINE = re.compile(r'^([a-zA-Z]+)\s+(.*)$')
+
+_COLOR_VALUE = re.compile(r'^([\d.]+)\s+([\d.]+)\s+([\d.]+)$')
+_SHADER_VALUE = re.compile(r'^([^\s]+)\s+([^\s]+)$')
+
+def splitLine(inputLine):
+    """Split a stripped line into (key, value), or return (None, None) if it is not a key/value line"""
+    match = KEY_VALUE_LINE.match(inputLine)
+    if not match:
+        return (None, None)
+    return (match.group(1), match.group(2).strip())
+
 class MHMATKey:
 
     def __init__(self, keyName, defaultValue=None, keyGroup="Various"):
@@ -17,8 +32,17 @@ class MHMATKey:
         line = str(inputLine).lower()
         return line.startswith(self.keyNameLower)
 
+    def parseValue(self, value):
+        raise ValueError('parseValue() should be overridden by specific key classes')
+
     def parse(self, inputLine):
-        raise ValueError('parse() should be overridden by specific key classes')
+        line = str(inputLine).strip()
+        value = None
+        if self.lineMatchesKey(line):
+            (key, rawValue) = splitLine(line)
+            if rawValue is not None:
+                value = self.parseValue(rawValue)
+        return self.keyName, value
 
     def asString(self, value):
         return str(value)
@@ -31,14 +55,8 @@ class MHMATStringKey(MHMATKey):
     def __init__(self, keyName, defaultValue=None, keyGroup="Various"):
         MHMATKey.__init__(self, keyName=keyName, defaultValue=defaultValue, keyGroup=keyGroup)
 
-    def parse(self, inputLine):
-        line = str(inputLine).strip()
-        value = None
-        if self.lineMatchesKey(line):
-            match = re.search(r'^([a-zA-Z]+)\s+(.*)$', line)
-            if match:
-                value = str(match.group(2)).strip()
-        return self.keyName, value
+    def parseValue(self, value):
+        return value
 
 # parse filenames like diffuseTexture, normalmapTexture ...
 # 
@@ -54,13 +72,9 @@ class MHMATFileKey(MHMATKey):
         MHMATKey.__init__(self, keyName=keyName, defaultValue=defaultValue, keyGroup=keyGroup)
         self.blendMaterial = blendMaterial
 
-    def parseFile(self, inputLine, location):
-        line = str(inputLine).strip()
-        value = None
-        if self.lineMatchesKey(line):
-            match = re.search(r'^([a-zA-Z]+)\s+(.*)$', line)
-            if match:
-                value = str(match.group(2)).strip()
+    def parseValue(self, value, location=None):
+        if location is None:
+            return value
         if not self.blendMaterial:
             if not value.startswith("/"):
                 value = location + "/" + value
@@ -68,7 +82,14 @@ class MHMATFileKey(MHMATKey):
             # TODO: handle case where location is absolute. We cannot use basename since the path
             # TODO: continues into the structure of the file
             value = location + "/" + value
-        return self.keyName, value
+        return value
+
+    def parseFile(self, inputLine, location):
+        line = str(inputLine).strip()
+        value = None
+        if self.lineMatchesKey(line):
+            (key, value) = splitLine(line)
+        return self.keyName, self.parseValue(value, location)
 
 
 class MHMATFloatKey(MHMATKey):
@@ -76,15 +97,8 @@ class MHMATFloatKey(MHMATKey):
     def __init__(self, keyName, defaultValue=None, keyGroup="Various"):
         MHMATKey.__init__(self, keyName=keyName, defaultValue=defaultValue, keyGroup=keyGroup)
 
-    def parse(self, inputLine):
-        line = str(inputLine).strip()
-        value = None
-        if self.lineMatchesKey(line):
-            match = re.search(r'^([a-zA-Z]+)\s+(.*)$', line)
-            if match:
-                value = str(match.group(2)).strip()
-                value = float(value)
-        return self.keyName, value
+    def parseValue(self, value):
+        return float(value)
 
     def asString(self, value):
         return "%.4f" % value
@@ -95,16 +109,11 @@ class MHMATBooleanKey(MHMATKey):
     def __init__(self, keyName, defaultValue=None, keyGroup="Various"):
         MHMATKey.__init__(self, keyName=keyName, defaultValue=defaultValue, keyGroup=keyGroup)
 
-    def parse(self, inputLine):
-        line = str(inputLine).strip()
-        value = None
-        if self.lineMatchesKey(line):
-            match = re.search(r'^([a-zA-Z]+)\s+(.*)$', line)
-            if match:
-                value = str(match.group(2)).strip().lower()
-                if value != "":
-                    value = value == "true" or value == "t" or value == "1"
-        return self.keyName, value
+    def parseValue(self, value):
+        value = value.lower()
+        if value != "":
+            value = value == "true" or value == "t" or value == "1"
+        return value
 
 
 class MHMATColorKey(MHMATKey):
@@ -112,17 +121,14 @@ class MHMATColorKey(MHMATKey):
     def __init__(self, keyName, defaultValue=None, keyGroup="Various"):
         MHMATKey.__init__(self, keyName=keyName, defaultValue=defaultValue, keyGroup=keyGroup)
 
-    def parse(self, inputLine):
-        line = str(inputLine).strip()
-        value = None
-        if self.lineMatchesKey(line):
-            match = re.search(r'^([a-zA-Z]+)\s+([\d.]+)\s+([\d.]+)\s+([\d.]+)$', line)
-            if match:
-                red = float(str(match.group(2)).strip())
-                green = float(str(match.group(3)).strip())
-                blue = float(str(match.group(4)).strip())
-                value = [red, green, blue]
-        return self.keyName, value
+    def parseValue(self, value):
+        match = _COLOR_VALUE.match(value)
+        if not match:
+            return None
+        red = float(match.group(1))
+        green = float(match.group(2))
+        blue = float(match.group(3))
+        return [red, green, blue]
 
     def asString(self, value):
         return "%.4f %.4f %.4f" % (value[0], value[1], value[2])
@@ -133,29 +139,22 @@ class MHMATStringShaderKey(MHMATKey):
     def __init__(self, keyName, defaultValue=None, keyGroup="Shader"):
         MHMATKey.__init__(self, keyName=keyName, defaultValue=defaultValue, keyGroup=keyGroup)
 
-    def parse(self, inputLine):
-        line = str(inputLine).strip()
-        value = None
-        if self.lineMatchesKey(line):
-            match = re.search(r'^([a-zA-Z]+)\s+([^\s]+)\s+([^\s]+)$', line)
-            if match:
-                subkey = str(match.group(2))
-                ivalue = str(match.group(3)).strip()
-                value = [subkey, ivalue]
-        return self.keyName, value
+    def parseValue(self, value):
+        match = _SHADER_VALUE.match(value)
+        if not match:
+            return None
+        return [match.group(1), match.group(2)]
 
 class MHMATBooleanShaderKey(MHMATKey):
 
     def __init__(self, keyName, defaultValue=None, keyGroup="Shader"):
         MHMATKey.__init__(self, keyName=keyName, defaultValue=defaultValue, keyGroup=keyGroup)
 
-    def parse(self, inputLine):
-        line = str(inputLine).strip()
-        value = None
-        if self.lineMatchesKey(line):
-            match = re.search(r'^([a-zA-Z]+)\s+([^\s]+)\s+([^\s]+)$', line)
-            if match:
-                value = str(match.group(3)).strip()
-                if value != "":
-                    value = value == "true" or value == "t" or value == "1"
-        return self.keyName, value
+    def parseValue(self, value):
+        match = _SHADER_VALUE.match(value)
+        if not match:
+            return None
+        value = match.group(2)
+        if value != "":
+            value = value == "true" or value == "t" or value == "1"
+        return value
@@ -0,0 +1,315 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# A searchable index of a material library, kept as an SQLite file in the library root. It holds
+# the metadata (tag, name, description, license, author, uuid) and the texture keys of every
+# .mhmat file below the root. Updating it only parses the files whose size or mtime changed since
+# the last update, and tags are kept in a table of their own (an inverted index from tag to
+# material), so queries do not touch the material files at all. This module is bpy-free.
+#
+#   python -m makeskin.libraryindex /path/to/library --tag female --license CC0 --texture normalmap
+#
+
+import argparse, os, sqlite3, sys, time
+from .keytypes import MHMATFileKey, splitLine
+from .mhmat_keys import MHMAT_KEYS
+
+INDEX_FILE_NAME = ".makeskin_index.sqlite"
+
+# Bump when the tables change, an index of another version is rebuilt from scratch
+SCHEMA_VERSION = 1
+
+# Keys which are indexed, lower case as in MHMAT_NAME_TO_KEY. Tags are handled separately.
+METADATA_KEYS = ["name", "description", "license", "author", "uuid"]
+TEXTURE_KEYS = [key.keyNameLower for key in MHMAT_KEYS if isinstance(key, MHMATFileKey) and key.keyGroup == "Texture"]
+
+_SCHEMA = """
+CREATE TABLE materials (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    mtime INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    name TEXT,
+    description TEXT,
+    license TEXT,
+    author TEXT,
+    uuid TEXT,
+    tags TEXT
+);
+CREATE INDEX materials_name ON materials (name COLLATE NOCASE);
+CREATE INDEX materials_license ON materials (license COLLATE NOCASE);
+CREATE INDEX materials_uuid ON materials (uuid);
+CREATE TABLE tags (
+    tag TEXT NOT NULL,
+    material INTEGER NOT NULL REFERENCES materials (id) ON DELETE CASCADE,
+    PRIMARY KEY (tag, material)
+) WITHOUT ROWID;
+CREATE INDEX tags_material ON tags (material);
+CREATE TABLE textures (
+    material INTEGER NOT NULL REFERENCES materials (id) ON DELETE CASCADE,
+    key TEXT NOT NULL,
+    path TEXT NOT NULL,
+    PRIMARY KEY (material, key)
+) WITHOUT ROWID;
+CREATE INDEX textures_key ON textures (key, material);
+"""
+
+def parseIndexEntry(fileName):
+    """
+    Read what the index keeps of one .mhmat file: (metadata dict, list of tags, dict of texture
+    key to path as written in the file). Tags are lower case. This is much cheaper than MHMatFile,
+    only the indexed keys are looked at and nothing is checked.
+    """
+    metadata = dict()
+    tags = []
+    textures = dict()
+    with open(fileName, 'r', errors='ignore') as f:
+        for line in f:
+            (key, value) = splitLine(line.strip())
+            if not key or not value:
+                continue
+            key = key.lower()
+            if key == "tag":
+                # Tags may be on several lines, and several on one line separated by commas
+                for tag in value.split(","):
+                    tag = tag.strip().lower()
+                    if tag and not tag in tags:
+                        tags.append(tag)
+            elif key in METADATA_KEYS:
+                metadata[key] = value
+            elif key in TEXTURE_KEYS:
+                textures[key] = value
+    return (metadata, tags, textures)
+
+def _scanMaterialFiles(rootDir, relDir=""):
+    # os.scandir rather than findMaterialFiles, the stat results come with the directory listing
+    # on windows and are needed anyway. Hidden directories (texture stores, caches) are skipped.
+    try:
+        entries = sorted(os.scandir(os.path.join(rootDir, relDir)), key=lambda entry: entry.name)
+    except OSError:
+        return
+    for entry in entries:
+        if entry.name.startswith("."):
+            continue
+        relPath = relDir + "/" + entry.name if relDir else entry.name
+        if entry.is_dir(follow_symlinks=False):
+            yield from _scanMaterialFiles(rootDir, relPath)
+        elif entry.name.lower().endswith(".mhmat"):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            yield (relPath, stat.st_mtime_ns, stat.st_size)
+
+class LibraryEntry:
+    """One material found by LibraryIndex.search()"""
+
+    def __init__(self, path, name, description, license, author, uuid, tags):
+        self.path = path
+        self.name = name
+        self.description = description
+        self.license = license
+        self.author = author
+        self.uuid = uuid
+        self.tags = tags
+
+    def asDict(self):
+        return {"path": self.path, "name": self.name, "description": self.description, "license": self.license, "author": self.author, "uuid": self.uuid, "tags": self.tags}
+
+    def __str__(self):
+        return self.path + " (" + (self.name or "unnamed") + ", " + (self.license or "no license") + ")"
+
+class LibraryIndex:
+    """
+    The index of the materials below rootDir. Paths are stored relative to the root, so the
+    library can be moved together with its index. Call update() to bring it up to date with the
+    files, search() only looks at what was indexed.
+    """
+
+    def __init__(self, rootDir, indexFile=None):
+        self.rootDir = os.path.abspath(rootDir)
+        self.indexFile = indexFile or os.path.join(self.rootDir, INDEX_FILE_NAME)
+        self._connection = None
+
+    def _connect(self):
+        if self._connection is not None:
+            return self._connection
+        connection = sqlite3.connect(self.indexFile, timeout=30.0)
+        connection.execute("PRAGMA foreign_keys = ON")
+        (version,) = connection.execute("PRAGMA user_version").fetchone()
+        if version != SCHEMA_VERSION:
+            with connection:
+                for (table,) in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall():
+                    connection.execute("DROP TABLE IF EXISTS " + table)
+                connection.executescript(_SCHEMA)
+                connection.execute("PRAGMA user_version = %d" % SCHEMA_VERSION)
+        self._connection = connection
+        return connection
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+    def update(self, progress=None):
+        """
+        Bring the index up to date with the .mhmat files below the root: new and changed files are
+        parsed, entries of deleted files removed. Files whose size and mtime are as indexed are not
+        opened. All changes are one transaction, readers see either the old or the new index.
+        progress, if given, is called with (number of files parsed, number to parse).
+        Returns a dict with the number of files added, updated, removed and unchanged.
+        """
+        connection = self._connect()
+        known = dict()
+        for (materialId, path, mtime, size) in connection.execute("SELECT id, path, mtime, size FROM materials"):
+            known[path] = (materialId, mtime, size)
+
+        changed = []
+        unchanged = 0
+        for (relPath, mtime, size) in _scanMaterialFiles(self.rootDir):
+            entry = known.pop(relPath, None)
+            if entry is not None and entry[1] == mtime and entry[2] == size:
+                unchanged += 1
+            else:
+                changed.append((relPath, mtime, size, entry[0] if entry is not None else None))
+
+        counts = {"added": 0, "updated": 0, "removed": len(known), "unchanged": unchanged, "failed": 0}
+        with connection:
+            # Cascades to the tags and textures of the removed materials
+            connection.executemany("DELETE FROM materials WHERE id = ?", [(entry[0],) for entry in known.values()])
+            for (number, (relPath, mtime, size, materialId)) in enumerate(changed):
+                if progress is not None:
+                    progress(number, len(changed))
+                try:
+                    (metadata, tags, textures) = parseIndexEntry(os.path.join(self.rootDir, relPath))
+                except OSError as e:
+                    # Deleted or unreadable since the scan, it is picked up by the next update
+                    print("Could not index " + relPath + ": " + str(e))
+                    if materialId is not None:
+                        connection.execute("DELETE FROM materials WHERE id = ?", (materialId,))
+                    counts["failed"] += 1
+                    continue
+                values = (mtime, size) + tuple(metadata.get(key) for key in METADATA_KEYS) + (", ".join(tags),)
+                if materialId is None:
+                    cursor = connection.execute("INSERT INTO materials (mtime, size, name, description, license, author, uuid, tags, path) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", values + (relPath,))
+                    materialId = cursor.lastrowid
+                    counts["added"] += 1
+                else:
+                    connection.execute("UPDATE materials SET mtime = ?, size = ?, name = ?, description = ?, license = ?, author = ?, uuid = ?, tags = ? WHERE id = ?", values + (materialId,))
+                    connection.execute("DELETE FROM tags WHERE material = ?", (materialId,))
+                    connection.execute("DELETE FROM textures WHERE material = ?", (materialId,))
+                    counts["updated"] += 1
+                connection.executemany("INSERT INTO tags (tag, material) VALUES (?, ?)", [(tag, materialId) for tag in tags])
+                connection.executemany("INSERT INTO textures (material, key, path) VALUES (?, ?, ?)", [(materialId, key, path) for (key, path) in textures.items()])
+        if changed:
+            connection.execute("ANALYZE")
+        return counts
+
+    def search(self, tags=(), license=None, name=None, author=None, textures=(), text=None, limit=None):
+        """
+        Return a LibraryEntry for every indexed material which has all of the given tags and texture
+        keys (such as "normalmap" or "normalmapTexture"), and whose license and author are the
+        given ones. name and text match parts of the name, respectively of the name, description
+        or tags. All comparisons ignore case. Results are sorted by path.
+        """
+        conditions = []
+        parameters = []
+        tags = [tag.strip().lower() for tag in tags if tag.strip()]
+        if tags:
+            # Answered from the inverted index: the materials which have as many of the tags as asked for
+            conditions.append("m.id IN (SELECT material FROM tags WHERE tag IN (" + ", ".join(["?"] * len(tags)) + ") GROUP BY material HAVING COUNT(*) = ?)")
+            parameters.extend(tags)
+            parameters.append(len(set(tags)))
+        for key in textures:
+            key = key.lower()
+            if not key.endswith("texture"):
+                key += "texture"
+            if not key in TEXTURE_KEYS:
+                raise ValueError("Not a texture key: " + key)
+            conditions.append("EXISTS (SELECT 1 FROM textures t WHERE t.key = ? AND t.material = m.id)")
+            parameters.append(key)
+        if license:
+            conditions.append("m.license = ? COLLATE NOCASE")
+            parameters.append(license)
+        if author:
+            conditions.append("m.author = ? COLLATE NOCASE")
+            parameters.append(author)
+        if name:
+            conditions.append("m.name LIKE ?")
+            parameters.append("%" + name + "%")
+        if text:
+            conditions.append("(m.name LIKE ? OR m.description LIKE ? OR m.tags LIKE ?)")
+            parameters.extend(["%" + text + "%"] * 3)
+
+        query = "SELECT m.path, m.name, m.description, m.license, m.author, m.uuid, m.tags FROM materials m"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY m.path"
+        if limit:
+            query += " LIMIT %d" % limit
+
+        entries = []
+        for (path, name, description, license, author, uuid, tagList) in self._connect().execute(query, parameters):
+            entries.append(LibraryEntry(os.path.join(self.rootDir, path), name, description, license, author, uuid, [tag for tag in (tagList or "").split(", ") if tag]))
+        return entries
+
+    def textures(self, path):
+        """The indexed texture keys and paths (as written in the file) of the material at path"""
+        relPath = os.path.relpath(os.path.abspath(path), self.rootDir).replace(os.sep, "/")
+        rows = self._connect().execute("SELECT t.key, t.path FROM textures t JOIN materials m ON m.id = t.material WHERE m.path = ?", (relPath,))
+        return dict(rows.fetchall())
+
+    def tagCounts(self):
+        """All tags in the library with the number of materials having them, most used first"""
+        return self._connect().execute("SELECT tag, COUNT(*) FROM tags GROUP BY tag ORDER BY COUNT(*) DESC, tag").fetchall()
+
+    def __len__(self):
+        (count,) = self._connect().execute("SELECT COUNT(*) FROM materials").fetchone()
+        return count
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m makeskin.libraryindex", description="Update and search the index of a MHMAT library")
+    parser.add_argument("library", help="Root directory of the library, where the index is kept")
+    parser.add_argument("--tag", action="append", default=[], help="Only materials with this tag, can be given several times")
+    parser.add_argument("--license", help="Only materials with this license")
+    parser.add_argument("--author", help="Only materials by this author")
+    parser.add_argument("--name", help="Only materials whose name contains this")
+    parser.add_argument("--text", help="Only materials whose name, description or tags contain this")
+    parser.add_argument("--texture", action="append", default=[], help="Only materials with this texture (diffuse, normalmap, ...), can be given several times")
+    parser.add_argument("--limit", type=int, default=None, help="Return at most this many materials")
+    parser.add_argument("--no-update", action="store_true", help="Search the index as it is, without looking for changed files first")
+    parser.add_argument("--tags", action="store_true", help="List the tags in the library instead of searching")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.library):
+        parser.error(args.library + " is not a directory")
+
+    with LibraryIndex(args.library) as index:
+        if not args.no_update:
+            before = time.monotonic()
+            counts = index.update()
+            print("index: %d added, %d updated, %d removed, %d unchanged in %.2f s" % (counts["added"], counts["updated"], counts["removed"], counts["unchanged"], time.monotonic() - before), file=sys.stderr)
+
+        if args.tags:
+            for (tag, count) in index.tagCounts():
+                print("%6d %s" % (count, tag))
+            return 0
+
+        before = time.monotonic()
+        try:
+            entries = index.search(args.tag, args.license, args.name, args.author, args.texture, args.text, args.limit)
+        except ValueError as e:
+            parser.error(str(e))
+        for entry in entries:
+            print(entry.path)
+        print("%d materials found in %.1f ms" % (len(entries), (time.monotonic() - before) * 1000.0), file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -32,6 +32,11 @@ class MHS_PT_MakeSkinPanel(bpy.types.Panel):
         col = commonSettingsBox.column()
         col.prop(scn, 'MhMsOverwrite', text="Replace object materials")
         col.prop(scn, 'MhMsNodeVis', text="Extended node visualisation")
+        col.prop(scn, 'MhMsCopyWorkers', text="Texture copy threads")
+        col.prop(scn, 'MhMsInstrument', text="Record timings")
+        if scn.MhMsInstrument:
+            col.prop(scn, 'MhMsTraceFile', text="File")
+            col.prop(scn, 'MhMsTraceFormat', text="Format")
 
         createBox = layout.box()
         if obj is None or obj.type != "MESH":
@@ -49,6 +54,14 @@ class MHS_PT_MakeSkinPanel(bpy.types.Panel):
 
             importBox = layout.box()
             importBox.label(text="Import material", icon="MESH_DATA")
+            importBox.prop(scn, 'MhMsDeferImages', text="Deferred image loading")
+            importBox.prop(scn, 'MhMsUseTemplates', text="Reuse node setups")
+            importBox.prop(scn, 'MhMsProxyTextures', text="Proxy textures")
+            if scn.MhMsProxyTextures:
+                row = importBox.row()
+                row.label(text="Proxy size")
+                row.prop(scn, 'MhMsProxySize', text="")
+                importBox.prop(scn, 'MhMsProxyCacheDir', text="Cache")
             importBox.operator("makeskin.import_material", text="Import material")
 
             writeBox = layout.box()
@@ -77,11 +90,23 @@ class MHS_PT_MakeSkinPanel(bpy.types.Panel):
             writeBox.prop(obj, 'MhMsDepthless', text='Depthless')
             writeBox.prop(obj, 'MhMsSSSEnable', text='Enable SSS')
             writeBox.prop(obj, 'MhMsAutoBlend', text='Auto blend')
+            writeBox.prop(obj, 'MhMsGenerateNormal', text='Generate normal map from bump')
+            if obj.MhMsGenerateNormal:
+                writeBox.prop(obj, 'MhMsNormalStrength', text='Strength')
+            writeBox.prop(obj, 'MhMsGenerateRoughness', text='Generate roughness map from specular')
             writeBox.prop(obj, 'MhMsTextures', text='Paths')
+            if obj.MhMsTextures == "NORMALIZE":
+                writeBox.prop(obj, 'MhMsTextureMaxSize', text='Max size')
+                writeBox.prop(obj, 'MhMsTextureFormat', text='Format')
+                writeBox.prop(obj, 'MhMsPackMaps', text='Pack AO/roughness/metallic')
+            if obj.MhMsTextures == "STORE":
+                writeBox.prop(scn, 'MhMsTextureStoreDir', text='Store')
+                writeBox.operator("makeskin.collect_texture_garbage", text="Remove unused stored textures")
             writeBox.prop(obj, 'MhMsUseLit', text='Use litsphere')
             writeBox.prop(obj, 'MhMsLitsphere', text='Litsphere texture')
 
             writeBox.prop(obj, 'MhMsWriteBlendMaterial', text='Save Blender material')
 
             writeBox.operator("makeskin.write_material", text="Save material")
+            writeBox.operator("makeskin.write_all_materials", text="Save all materials of selected")
 
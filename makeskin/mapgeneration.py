@@ -0,0 +1,71 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Generates maps a material is missing from the ones it has: a normal map from the bump map, and
+# a roughness map from the specular map. The generated files are written next to the material
+# file and registered in its settings, after which they are handled like any other texture. The
+# kernels are in imageops, decoding and encoding is done by blender (see pixelio).
+
+import os
+from .imageops import allocatePixels, normalMapFromHeight, roughnessFromSpecular
+from .pixelio import loadPixels, savePixels
+from .mhmatfile import normalizedTextureName
+from .atomicwrite import atomicPath
+from .exportstate import fileSignature
+from .instrumentation import instrumented
+
+DEFAULT_NORMAL_STRENGTH = 4.0
+
+class MapGenerator:
+
+    def __init__(self, normalFromBump=False, roughnessFromSpecular=False, normalStrength=DEFAULT_NORMAL_STRENGTH):
+        self.normalFromBump = normalFromBump
+        self.roughnessFromSpecular = roughnessFromSpecular
+        self.normalStrength = normalStrength
+
+    @property
+    def enabled(self):
+        return self.normalFromBump or self.roughnessFromSpecular
+
+    @instrumented("generate maps")
+    def generate(self, mhmat, mhmatFilenameAbsolute, state=None):
+        """
+        Generate the enabled maps which mhmat lacks and has a source for, and point its settings at
+        the generated files. Returns the keys which were generated. With an ExportState, maps whose
+        source and options are unchanged since the last export are not generated again.
+        """
+        generated = []
+        settings = mhmat.settings
+        if self.normalFromBump and settings.get("bumpmapTexture") and not settings.get("normalmapTexture"):
+            self._generateMap(mhmat, mhmatFilenameAbsolute, "normalmapTexture", "bumpmapTexture", state)
+            generated.append("normalmapTexture")
+        if self.roughnessFromSpecular and settings.get("specularmapTexture") and not settings.get("roughnessmapTexture"):
+            self._generateMap(mhmat, mhmatFilenameAbsolute, "roughnessmapTexture", "specularmapTexture", state)
+            generated.append("roughnessmapTexture")
+        return generated
+
+    def _generateMap(self, mhmat, mhmatFilenameAbsolute, key, sourceKey, state):
+        matLoc = os.path.dirname(mhmatFilenameAbsolute)
+        (matBase, matExt) = os.path.splitext(os.path.basename(mhmatFilenameAbsolute))
+        sourcePath = os.path.abspath(mhmat.settings[sourceKey])
+        # PNG whatever the source is: normals need more than JPEG, and the data is not float
+        destLoc = os.path.join(matLoc, normalizedTextureName(matBase, key, ".png"))
+
+        inputs = (sourcePath, fileSignature(sourcePath), self.normalStrength if key == "normalmapTexture" else None)
+        if state is not None and state.isUnchanged("generated " + key, inputs, destLoc):
+            print("Generated " + key + " is unchanged, skipping " + destLoc)
+        else:
+            (pixels, isFloat) = loadPixels(sourcePath)
+            (height, width, channels) = pixels.shape
+            if key == "normalmapTexture":
+                result = normalMapFromHeight(pixels, self.normalStrength, out=allocatePixels(height, width, 3))
+            else:
+                result = roughnessFromSpecular(pixels, out=allocatePixels(height, width, 1))
+            with atomicPath(destLoc) as tempLoc:
+                savePixels(result, tempLoc, 'PNG')
+            print("generated " + key + " " + destLoc + " from " + sourcePath)
+            if state is not None:
+                state.remember("generated " + key, inputs, destLoc)
+
+        # Absolute, so that copying or storing the textures picks it up like any other texture
+        mhmat.settings[key] = destLoc
@@ -3,29 +3,37 @@
 
 import bpy
 import bpy.types
-import re, os, random
-from .utils import createEmptyMaterial, blendMatSave
+import os, random, hashlib, uuid
+from .utils import createEmptyMaterial, blendMatSave, hasMaterial
 from .extraproperties import _licenses, _litspheres
-from .nodehelper import NodeHelper
-from .mhmat_keys import MHMAT_KEYS, MHMAT_SHADER_KEYS, MHMAT_KEY_GROUPS, MHMAT_NAME_TO_KEY
-from .keytypes import *
-import shutil
-
-DEBUG = False
-
-class MHMat:
-
-    def __init__(self, obj = None, fileName = None):
+from .nodehelper import NodeHelper, TEXTURE_NODE_COLORSPACES
+from .materialtemplates import MATERIAL_TEMPLATES, NodeFeatures, buildNodeSetup
+from .proxies import PROXY_CACHE
+from .validation import ValidationReport, validateMaterial, ERROR
+from .mhmatfile import MHMatFile, TEXTURE_COPY_WORKERS
+from .texturenormalize import TextureNormalizer
+from .texturestore import TextureStore, DEFAULT_STORE_DIR
+from .atomicwrite import FileLock
+from .exportstate import EXPORT_STATES, textDigest, fileSignature
+from .pixelio import loadPixels
+from .skintone import skinToneStats
+from .mapgeneration import MapGenerator
+from .instrumentation import INSTRUMENTATION, instrumented
+
+# The blender side of the MHMAT model. Parsing and writing of the file format lives in
+# MHMatFile, this class adds reading from and building blender node materials.
+
+class MHMat(MHMatFile):
+
+    # When constructing from an object, material selects which of its materials to read (the
+    # first one if not given). imagePathCache is passed on to NodeHelper.
+    #
+    def __init__(self, obj = None, fileName = None, material = None, imagePathCache = None):
 
         if obj and fileName:
             raise ValueError("You cannot construct from both file and object at the same time")
 
-        self.settings = dict()
-        self.shaderConfig = dict()
-
-        for keyObj in MHMAT_KEYS:
-            self.settings[keyObj.keyName] = keyObj.defaultValue
-            if DEBUG: print (keyObj.keyName)
+        MHMatFile.__init__(self)
 
         # Internal variables for parsing object material
         self._nodes = None
@@ -34,17 +42,25 @@ class MHMat:
 
         self.diffuseTexture = None
         self.nodehelper = None
-        self.litSphere = None
+
+        # Set by writeMHmat when the last export already wrote the same file or blend material
+        self.fileUnchanged = False
+        self.blendMaterialUnchanged = False
+
+        # SkinToneStats of the diffuse texture, computed by writeMHmat for autoBlendSkin materials
+        self.skinTone = None
 
         if not obj is None:
             if len(obj.data.materials) > 0:
-                # Only take first material into account
-                self._blenderMaterial = obj.data.materials[0]
+                # Unless told otherwise, only take first material into account
+                if material is None:
+                    material = obj.data.materials[0]
+                self._blenderMaterial = material
 
                 if not hasattr(self._blenderMaterial, "node_tree") or not hasattr(self._blenderMaterial.node_tree, "nodes"):
                     raise ValueError("Only cycles/eevee materials are supported")
                 else:
-                    self.nodehelper = NodeHelper(obj)
+                    self.nodehelper = NodeHelper(obj, material=material, imagePathCache=imagePathCache)
                     self._parseNodeMaterial()
             else:
                 raise ValueError("Object does not have any material")
@@ -52,38 +68,36 @@ class MHMat:
         if not fileName is None:
             self._parseFile(fileName)
 
-    # test for all texture nodes and add an error text to be displayed on blender
+    # check all texture nodes, and every texture file the material refers to, in one pass.
+    # Returns a ValidationReport with all problems found.
     #
-    def checkAllTexturesAreSaved(self):
+    def validateTextures(self):
+        report = ValidationReport()
 
         nh = self.nodehelper
+        if nh:
+            textureNodes = []
+            textureNodes.append(("diffuseTexture", nh.findDiffuseTextureNode, nh.findDiffuseTextureFilePath))
+            textureNodes.append(("normalmapTexture", nh.findNormalMapTextureNode, nh.findNormalMapTextureFilePath))
+            textureNodes.append(("bumpmapTexture", nh.findBumpMapTextureNode, nh.findBumpMapTextureFilePath))
+            textureNodes.append(("transmissionmapTexture", nh.findTransmissionTextureNode, nh.findTransmissionTextureFilePath))
+            textureNodes.append(("roughnessmapTexture", nh.findRoughnessTextureNode, nh.findRoughnessTextureFilePath))
+            textureNodes.append(("metallicmapTexture", nh.findMetallicTextureNode, nh.findMetallicTextureFilePath))
+            textureNodes.append(("displacementmapTexture", nh.findDisplacementTextureNode, nh.findDisplacementTextureFilePath))
+            for (key, findNode, findFilePath) in textureNodes:
+                if findNode():
+                    (name, err) = findFilePath()
+                    if err:
+                        report.add(ERROR, key, None, err)
+
+        return validateMaterial(self, report)
+
+    # kept for existing callers, returns all errors as text or an empty string
+    #
+    def checkAllTexturesAreSaved(self):
+        return "; ".join([str(issue) for issue in self.validateTextures().errors])
 
-        tn = nh.findDiffuseTextureNode()
-        if tn:
-            (name, err) = nh.findDiffuseTextureFilePath()
-            if (err):
-                return "Diffuse image: " + err
-
-        tn = nh.findNormalMapTextureNode()
-        if tn:
-            (name, err) = nh.findNormalMapTextureFilePath()
-            if (err):
-                return "Normal map: " + err
-
-        tn = nh.findBumpMapTextureNode()
-        if tn:
-            (name, err) = nh.findBumpMapTextureFilePath()
-            if (err):
-                return "Bump map: " + err
-
-        tn = nh.findTransmissionTextureNode()
-        if tn:
-            (name, err) = nh.findTransmissionTextureFilePath()
-            if (err):
-                return "Transmission map: " + err
-
-        return ""
-
+    @instrumented("read nodes")
     def _parseNodeMaterial(self):
 
         sett = self.settings
@@ -146,7 +160,7 @@ class MHMat:
         sett["diffuseColor"] = [diffuseColor[0], diffuseColor[1], diffuseColor[2]]
 
         sett["emissiveColor"] = None
-        col = nh.getPrincipledSocketDefaultValue(27)
+        col = nh.getPrincipledSocketDefaultValue('Emission')
         if col:
             if col[0] < 0.01 and col[1] < 0.01 and col[2] < 0.01:
                 pass # emission is black
@@ -163,40 +177,11 @@ class MHMat:
         sett["ior"] = nh.getPrincipledSocketDefaultValue('IOR')
 
 
-    def copyTextures(self, mhmatFilenameAbsolute, normalize=True, adjustSettings=True):
-        matBaseName = os.path.basename(mhmatFilenameAbsolute)
-        matLoc = os.path.dirname(mhmatFilenameAbsolute)
-        (matBase, matExt) = os.path.splitext(matBaseName)
-
-        for keyObj in MHMAT_KEYS:
-            if isinstance(keyObj, MHMATFileKey) and keyObj.keyName in self.settings and keyObj.keyName != "litsphereTexture":
-                key = keyObj.keyName
-                if DEBUG: print(key)
-                origLoc = self.settings[key]
-                if DEBUG: print(origLoc)
-                if origLoc:
-                    (dummy, texExt) = os.path.splitext(origLoc)
-                    if not normalize:
-                        baseName = os.path.basename(origLoc)
-                    else:
-                        suffix = re.sub(r'Texture','',key)
-                        suffix = re.sub(r'map','',suffix)
-                        baseName = matBase + '_' + suffix + texExt
-                    destLoc = os.path.join(matLoc, baseName)
-                    origLoc = os.path.abspath(origLoc)
-                    destLoc = os.path.abspath(destLoc)
-                    if origLoc != destLoc:
-                        print ("copy from " + origLoc  + " to " + destLoc)
-                        shutil.copyfile(origLoc, destLoc)
-                    else:
-                        print("Source and destination is same file, skipping texture copy for this entry")
-                    if adjustSettings:
-                        self.settings[key] = baseName
-
     #
     # create a node-setup for a new or loaded material
     # take information from scene and objects
     #
+    @instrumented("build nodes")
     def assignAsNodesMaterialForObj(self, scn, obj, mode_load=False):
         if obj is None or scn is None:
             return
@@ -247,8 +232,29 @@ class MHMat:
             # for the case that MHMAT file did not specify a name
             name = "makeSkinMaterial." + str(random.randint(10000,99999))
 
-        mat = createEmptyMaterial(obj,name)
-        self.nodehelper = NodeHelper(obj)
+        features = NodeFeatures(
+            diffuse=bool(self.settings["diffuseTexture"] or diffusePH),
+            transmission=bool(self.settings["transmissionmapTexture"] or transpPH),
+            metallic=bool(self.settings["metallicmapTexture"] or metallicPH),
+            metallicChannel=self.packedMapChannel("metallicmapTexture"),
+            roughness=bool(self.settings["roughnessmapTexture"] or roughnessPH),
+            roughnessChannel=self.packedMapChannel("roughnessmapTexture"),
+            displacement=bool(self.settings["displacementmapTexture"] or displacePH),
+            bump=bool(self.settings["bumpmapTexture"] or bumpPH),
+            normal=bool(self.settings["normalmapTexture"] or normalPH))
+
+        # The texture nodes are copied from a template for these features, or built from scratch
+        useTemplate = scn.MhMsUseTemplates
+        if useTemplate:
+            mat = MATERIAL_TEMPLATES.createMaterial(obj, name, features)
+        else:
+            mat = createEmptyMaterial(obj,name)
+        self.nodehelper = NodeHelper(obj, material=mat)
+        if mode_load and scn.MhMsDeferImages:
+            self.nodehelper.deferImageLoading = True
+        if mode_load and scn.MhMsProxyTextures:
+            PROXY_CACHE.cacheDir = bpy.path.abspath(scn.MhMsProxyCacheDir) if scn.MhMsProxyCacheDir else None
+            self.nodehelper.proxySize = int(scn.MhMsProxySize)
 
         # --- set the values in the menu (needed after import)
         #
@@ -284,20 +290,13 @@ class MHMat:
                 self.nodehelper.createDummyNode(nodename, self.settings[nodename], frame)
 
 
-        if self.settings["diffuseTexture"] or diffusePH:
-            self.nodehelper.createDiffuseTextureNode(self.settings["diffuseTexture"])
-
-        if self.settings["transmissionmapTexture"] or transpPH:
-            self.nodehelper.createTransmissionTextureNode(self.settings["transmissionmapTexture"])
+        if not useTemplate:
+            buildNodeSetup(self.nodehelper, features)
 
-        if self.settings["metallicmapTexture"] or metallicPH:
-            self.nodehelper.createMetallicTextureNode(self.settings["metallicmapTexture"])
-
-        if self.settings["roughnessmapTexture"] or roughnessPH:
-            self.nodehelper.createRoughnessTextureNode(self.settings["roughnessmapTexture"])
-
-        if self.settings["displacementmapTexture"] or displacePH:
-            self.nodehelper.createDisplacementTextureNode(self.settings["displacementmapTexture"])
+        for key in TEXTURE_NODE_COLORSPACES.keys():
+            if self.settings[key]:
+                textureNode = self.nodehelper.findNodeByName(key)
+                self.nodehelper.setTextureImage(textureNode, self.settings[key], TEXTURE_NODE_COLORSPACES[key])
 
         if self.settings["diffuseColor"] is not None:
             col = self.settings["diffuseColor"]
@@ -338,29 +337,21 @@ class MHMat:
         if self.settings["ior"] is not None:
             self.nodehelper.setPrincipledSocketDefaultValue("IOR", self.settings["ior"])
         
-        bump = bumpPH
-        if self.settings["bumpmapTexture"]:
-            bump = True
-
-        normal = normalPH
-        if self.settings["normalmapTexture"]:
-            normal = True
-
-        if bump and normal:
-            self.nodehelper.createBumpAndNormal(bumpImagePathAbsolute=self.settings["bumpmapTexture"], normalImagePathAbsolute=self.settings["normalmapTexture"])
-        else:
-            if bump:
-                self.nodehelper.createOnlyBump(bumpImagePathAbsolute=self.settings["bumpmapTexture"])
-            if normal:
-                self.nodehelper.createOnlyNormal(normalImagePathAbsolute=self.settings["normalmapTexture"])
-
         return mat
 
-    def writeMHmat(self, obj, fnAbsolute):
+    def writeMHmat(self, obj, fnAbsolute, workers=TEXTURE_COPY_WORKERS, progress=None, name=None):
+        # Exports of the same material, from several blender instances or batch jobs, take turns
+        with INSTRUMENTATION.span("write material", file=fnAbsolute), FileLock(fnAbsolute):
+            return self._writeMHmatLocked(obj, fnAbsolute, workers, progress, name)
+
+    def _writeMHmatLocked(self, obj, fnAbsolute, workers, progress, name):
 
         errtext = None
+        state = EXPORT_STATES.get(fnAbsolute)
 
-        if obj.MhMsName:
+        if name:
+            self.settings['name'] = name
+        elif obj.MhMsName:
             self.settings['name'] = obj.MhMsName
 
         if obj.MhMsTag:
@@ -388,13 +379,34 @@ class MHMat:
         self.settings['autoBlendSkin'] = obj.MhMsAutoBlend
         self.settings['writeBlendMaterial'] = obj.MhMsWriteBlendMaterial
 
+        # Measured before the textures are copied and renamed, while the path is still absolute
+        self.skinTone = None
+        if self.settings['autoBlendSkin'] and self.settings['diffuseTexture']:
+            self.skinTone = skinToneOfTexture(os.path.abspath(self.settings['diffuseTexture']))
+            if self.skinTone:
+                print("Skin tone: " + str(self.skinTone))
+                self.settings.update(self.skinTone.asSettings())
+
+        # Generated maps are registered in the settings, and then copied like all other textures
+        generator = MapGenerator(obj.MhMsGenerateNormal, obj.MhMsGenerateRoughness, obj.MhMsNormalStrength)
+        if generator.enabled:
+            generator.generate(self, fnAbsolute, state)
+
         handling = "NORMALIZE"
         if obj.MhMsTextures:
             handling = obj.MhMsTextures
         if handling == "NORMALIZE":
-            self.copyTextures(fnAbsolute)
+            normalizer = TextureNormalizer(int(obj.MhMsTextureMaxSize), obj.MhMsTextureFormat, obj.MhMsPackMaps)
+            written = []
+            if normalizer.enabled:
+                written = normalizer.normalize(self, fnAbsolute, state)
+            self.textureCopyStats = self.copyTextures(fnAbsolute, workers=workers, progress=progress, skipKeys=written)
         if handling == "COPY":
-            self.copyTextures(fnAbsolute,normalize=False)
+            self.textureCopyStats = self.copyTextures(fnAbsolute,normalize=False, workers=workers, progress=progress)
+        if handling == "STORE":
+            scn = bpy.context.scene
+            storeDir = bpy.path.abspath(scn.MhMsTextureStoreDir) if scn.MhMsTextureStoreDir else os.path.join(os.path.dirname(fnAbsolute), DEFAULT_STORE_DIR)
+            self.textureCopyStats = self.storeTextures(fnAbsolute, TextureStore(storeDir), workers=workers, progress=progress)
         # If handling is LINK, then paths are already correct
 
         if self.settings["normalmapTexture"]:
@@ -414,100 +426,154 @@ class MHMat:
                 from pathlib import Path
                 path = Path(fnAbsolute).with_suffix('.mat.blend')
                 self.settings["blendMaterial"] = path.name+'/materials/'+matName
-                blendMatSave(path)
+                fingerprint = materialFingerprint(obj.material_slots[1].material)
+                if state.isUnchanged("blendMaterial", fingerprint, str(path)):
+                    self.blendMaterialUnchanged = True
+                    print("Blend material is unchanged, skipping " + str(path))
+                else:
+                    blendMatSave(path, obj.material_slots[1].material)
+                    state.remember("blendMaterial", fingerprint, str(path))
             else:
                 errtext = "Save blender material was skipped, because object does not have a second material."
 
-
-        with open(fnAbsolute,'w') as f:
-            f.write(str(self))
+        digest = textDigest(str(self))
+        if state.isUnchanged("mhmat", digest, fnAbsolute):
+            self.fileUnchanged = True
+            print("Material file is unchanged, skipping " + fnAbsolute)
+        else:
+            self.writeFile(fnAbsolute)
+            state.remember("mhmat", digest, fnAbsolute)
 
         return (errtext)
 
-
-    def _parseFile(self, fileName):
-
-        full = os.path.abspath(fileName)
-        location = os.path.dirname(full)
-        with open(fileName, 'r', errors='ignore') as f:
-            line = f.readline()
-            while line:
-                parsedLine = line.strip()
-                if parsedLine and not parsedLine.startswith("#") and not parsedLine.startswith("/"):
-                    match = re.search(r'^([a-zA-Z]+)\s+(.*)$', parsedLine)
-                    if match:
-                        key = match.group(1)
-                        keyLower = key.lower()
-                        value = None
-
-                        if keyLower in MHMAT_NAME_TO_KEY:
-                            keyObj = MHMAT_NAME_TO_KEY[keyLower]
-                            keyCorrectCase = keyObj.keyName
-                            if key != keyCorrectCase:
-                                print("Autofixing case: " + key + " -> " + keyCorrectCase)
-                                key = keyCorrectCase
-                            if isinstance(keyObj, MHMATFileKey):
-                                (usedKey, value) = keyObj.parseFile(parsedLine, location)
-                            else:
-                                (usedKey, value) = keyObj.parse(parsedLine)
-                        else:
-                            if key not in ["shader", "shaderConfig"]: print("Not a valid key: " + key)
-                        #
-                        # handle multiple occurences of tag (create a comma-separated entry)
-                        #
-                        if key == 'tag':
-                            if self.settings[key]:
-                                self.settings[key] += ", " + value
-                            else:
-                                self.settings[key] = value
-                        elif key == 'shaderParam':
-                            if value[0] == "litsphereTexture":
-                                match = re.search(r'^litspheres\/(.*)\.png$', value[1])
-                                if match:
-                                    self.settings["litsphereTexture"] = match.group(1)
-                                    if DEBUG: print (self.settings["litsphereTexture"])
-                        else:
-                            self.settings[key] = value
-                    else:
-                        if parsedLine.startswith("shader"):
-                            # TODO: check for shaderConfig, shader 
-                            pass
-                        else:
-                            print("no match")
-                            print(parsedLine)
-                line = f.readline()
-        if DEBUG: print(self)
-
-    def __str__(self):
-        mat = "# This is a material file for MakeHuman, produced by MakeSkin\n"
-
-        for keyGroup in MHMAT_KEY_GROUPS:
-            mat = mat + "\n// " + keyGroup + "\n\n"
-            for keyNameLower in MHMAT_NAME_TO_KEY.keys():
-                keyObj = MHMAT_NAME_TO_KEY[keyNameLower]
-                keyName = keyObj.keyName
-                if keyObj.keyGroup == keyGroup and not self.settings[keyName] is None:
-                    if keyName == "tag":
-                        for elem in self.settings["tag"].split(","):
-                            mat = mat + "tag " + elem.strip() + "\n"
-                    else:
-                        mat = mat + keyName + " " + keyObj.asString(self.settings[keyName]) + "\n"
-
-        mat = mat + "\n"
-        mat = mat + "// Shader properties (only affects how things look in MakeHuman)\n\n"
-
-        if self.litSphere:
-            mat = mat + "shader shaders/glsl/litsphere\n"
-            mat = mat + "shaderParam litsphereTexture litspheres/" + str(self.litSphere) + ".png\n"
-        for key in self.shaderConfig.keys():
-            mat = mat + "shaderConfig " + key + " " + str(self.shaderConfig[key]) + "\n"
-
-        mat = mat + "\n"
-        mat = mat + "// The following settings would also have been valid, but do currently not have a value\n//\n"
-        for keyName in MHMAT_NAME_TO_KEY.keys():
-            keyObj = MHMAT_NAME_TO_KEY[keyName]
-            key = keyObj.keyName
-            if key not in self.settings or self.settings[key] is None:
-                mat = mat + "// " + key + "\n"
-
-        return mat
+# Skin tone statistics are only computed from a downscaled copy of the texture
+SKIN_TONE_SAMPLE_SIZE = 512
+
+# (path, mtime, size) -> SkinToneStats, so that saving again does not decode the texture again
+_skinToneCache = dict()
+
+@instrumented("skin tone")
+def skinToneOfTexture(path):
+    key = (path, fileSignature(path))
+    if not key in _skinToneCache:
+        (pixels, isFloat) = loadPixels(path, maxSize=SKIN_TONE_SAMPLE_SIZE)
+        _skinToneCache[key] = skinToneStats(pixels, isLinear=isFloat)
+    return _skinToneCache[key]
+
+# the plain values (numbers, strings, enums...) of a blender struct, in a stable order
+#
+def _rnaValues(struct):
+    values = []
+    for prop in struct.bl_rna.properties:
+        if prop.type in ('BOOLEAN', 'INT', 'FLOAT', 'STRING', 'ENUM') and prop.identifier != "rna_type":
+            value = getattr(struct, prop.identifier, None)
+            if hasattr(value, "__len__") and not isinstance(value, str):
+                value = tuple(value)
+            values.append((prop.identifier, value))
+    return values
+
+# How deep materialFingerprint follows the structs owned by a node, a curve mapping is node ->
+# mapping -> curves -> points
+_MAX_STRUCT_DEPTH = 4
+
+# Node properties materialFingerprint handles itself, or which only lead back into the node tree
+_NODE_POINTERS_HANDLED = ("rna_type", "inputs", "outputs", "internal_links", "parent", "image", "node_tree")
+
+class _UnknownData(Exception):
+    pass
+
+# the values of the structs owned by struct, such as the color ramp of a ColorRamp node or the
+# curve mapping of an RGB Curves node, followed through their pointers and collections. Data
+# blocks are only handled by materialFingerprint, for any other one _UnknownData is raised.
+#
+def _ownedValues(struct, skipped=("rna_type",), depth=0):
+    values = []
+    for prop in struct.bl_rna.properties:
+        if prop.identifier in skipped or prop.type not in ('POINTER', 'COLLECTION'):
+            continue
+        if prop.type == 'POINTER':
+            items = [getattr(struct, prop.identifier, None)]
+        else:
+            items = list(getattr(struct, prop.identifier, ()))
+        itemValues = []
+        for item in items:
+            if item is None:
+                itemValues.append(None)
+                continue
+            if isinstance(item, bpy.types.ID) or depth >= _MAX_STRUCT_DEPTH:
+                raise _UnknownData(prop.identifier)
+            itemValues.append((_rnaValues(item), _ownedValues(item, depth=depth + 1)))
+        values.append((prop.identifier, itemValues))
+    return values
+
+def _socketValues(sockets):
+    values = []
+    for socket in sockets:
+        if hasattr(socket, "default_value"):
+            value = socket.default_value
+            if hasattr(value, "__len__"):
+                value = tuple(value)
+            values.append((socket.identifier, value))
+    return values
+
+def _digestNodeTree(digest, tree, seen):
+    for node in sorted(tree.nodes, key=lambda node: node.name):
+        digest.update(repr((node.bl_idname, node.parent.name if node.parent else None, _rnaValues(node))).encode("utf-8"))
+        digest.update(repr(_ownedValues(node, skipped=_NODE_POINTERS_HANDLED)).encode("utf-8"))
+        # Value and RGB nodes keep their value in the output socket
+        digest.update(repr((_socketValues(node.inputs), _socketValues(node.outputs))).encode("utf-8"))
+        image = getattr(node, "image", None)
+        if image is not None:
+            digest.update(repr((image.name, image.filepath, image.is_dirty)).encode("utf-8"))
+        group = getattr(node, "node_tree", None)
+        if group is not None:
+            # Node groups are saved along with the material
+            digest.update(repr(("group", group.name)).encode("utf-8"))
+            if group.name not in seen:
+                seen.add(group.name)
+                _digestNodeTree(digest, group, seen)
+    links = [(link.from_node.name, link.from_socket.identifier, link.to_node.name, link.to_socket.identifier) for link in tree.links]
+    digest.update(repr(sorted(links)).encode("utf-8"))
+
+# A digest of everything in a material which ends up in a saved blend material: the material
+# settings, every node with its settings, socket values, owned data (color ramps, curves) and
+# image, node groups, and the links between them. Equal fingerprints mean the material does not
+# need to be saved again. A node pointing at data this does not know how to compare, such as an
+# object or a text, gets a fingerprint which never matches, so such a material is always saved.
+#
+def materialFingerprint(material):
+    digest = hashlib.sha256()
+    digest.update(repr(_rnaValues(material)).encode("utf-8"))
+    if material.node_tree:
+        try:
+            _digestNodeTree(digest, material.node_tree, set())
+        except _UnknownData:
+            return "changed-" + uuid.uuid4().hex
+    return digest.hexdigest()
+
+# Read all node materials of the given objects in one go. A material used by several objects, or in
+# several slots, is only read once. If an object writes its second material as a blend material,
+# only its first material is read, same as for the single material export. Image paths are resolved
+# once for all materials. Returns a list of (obj, material, mhmat, error), where mhmat is None
+# and error is set if the material could not be read.
+#
+def extractMaterials(objects):
+    imagePathCache = dict()
+    seen = set()
+    result = []
+    for obj in objects:
+        if obj is None or obj.type != "MESH" or not hasMaterial(obj):
+            continue
+        materials = [slot.material for slot in obj.material_slots]
+        if getattr(obj, "MhMsWriteBlendMaterial", False):
+            materials = materials[:1]
+        for material in materials:
+            if material is None or material.name in seen:
+                continue
+            seen.add(material.name)
+            try:
+                mhmat = MHMat(obj, material=material, imagePathCache=imagePathCache)
+                result.append((obj, material, mhmat, None))
+            except ValueError as e:
+                result.append((obj, material, None, str(e)))
+    return result
@@ -0,0 +1,84 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# A cache of parsed MHMAT files, so that importing the same library material onto many objects
+# only reads and parses the file once. Entries are keyed by absolute path and are thrown away
+# when the file's mtime or size changes. This module is bpy-free.
+
+import os, threading
+from collections import OrderedDict
+from .mhmatfile import MHMatFile
+
+DEFAULT_MAX_ENTRIES = 64
+
+def _copyValue(value):
+    # Settings values are strings, numbers, booleans or (color) lists
+    if isinstance(value, list):
+        return list(value)
+    return value
+
+class MHMatCache:
+
+    def __init__(self, maxEntries=DEFAULT_MAX_ENTRIES):
+        self.maxEntries = maxEntries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def setMaxEntries(self, maxEntries):
+        with self._lock:
+            self.maxEntries = maxEntries
+            self._evict()
+
+    def _evict(self):
+        while len(self._entries) > max(0, self.maxEntries):
+            self._entries.popitem(last=False)
+
+    def invalidate(self, fileName=None):
+        """Forget the given file, or everything if fileName is None"""
+        with self._lock:
+            if fileName is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(os.path.abspath(fileName), None)
+
+    def _parsed(self, fileName):
+        path = os.path.abspath(fileName)
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == signature:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry[1]
+        # Parse outside the lock, so that other files can be served meanwhile
+        parsed = MHMatFile(fileName=path)
+        with self._lock:
+            self.misses += 1
+            self._entries[path] = (signature, parsed)
+            self._entries.move_to_end(path)
+            self._evict()
+        return parsed
+
+    def load(self, fileName, materialClass=MHMatFile):
+        """
+        Return a new materialClass instance (MHMatFile or a subclass, such as MHMat) with the
+        content of fileName. The cached entry is never handed out itself, the returned material
+        has its own copy of the settings and can be changed freely.
+        """
+        parsed = self._parsed(fileName)
+        mhmat = materialClass()
+        for key in parsed.settings.keys():
+            mhmat.settings[key] = _copyValue(parsed.settings[key])
+        for key in parsed.shaderConfig.keys():
+            mhmat.shaderConfig[key] = _copyValue(parsed.shaderConfig[key])
+        mhmat.litSphere = parsed.litSphere
+        return mhmat
+
+    def __len__(self):
+        return len(self._entries)
+
+# The cache shared by the import operators
+MATERIAL_CACHE = MHMatCache()
@@ -0,0 +1,78 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Imported materials with the same features (which texture nodes they have, and how these are
+# linked) have the same node setup, only their images and values differ. Building the setup node
+# by node costs dozens of RNA calls per material, so instead one template material is built per
+# combination of features, the first time it is needed in a session, and every import copies it
+# in one go. The templates are hidden materials without users, which blender drops when the
+# file is saved, after which they are simply built again.
+
+import bpy
+from collections import namedtuple
+from .nodehelper import NodeHelper
+from .utils import newNodeMaterial
+from .instrumentation import INSTRUMENTATION
+
+# Templates are called this, followed by a number. The leading dot hides them in most of the UI.
+TEMPLATE_PREFIX = ".makeskin_template"
+
+# The texture nodes of a material. The channels are for packed maps, see MHMatFile.packedMapChannel
+NodeFeatures = namedtuple("NodeFeatures", ["diffuse", "transmission", "metallic", "metallicChannel", "roughness", "roughnessChannel", "displacement", "bump", "normal"])
+
+def buildNodeSetup(nodehelper, features):
+    """Create and link the texture nodes for features in the material of nodehelper, without images"""
+    if features.diffuse:
+        nodehelper.createDiffuseTextureNode()
+    if features.transmission:
+        nodehelper.createTransmissionTextureNode()
+    if features.metallic:
+        nodehelper.createMetallicTextureNode(channel=features.metallicChannel)
+    if features.roughness:
+        nodehelper.createRoughnessTextureNode(channel=features.roughnessChannel)
+    if features.displacement:
+        nodehelper.createDisplacementTextureNode()
+    if features.bump and features.normal:
+        nodehelper.createBumpAndNormal()
+    elif features.bump:
+        nodehelper.createOnlyBump()
+    elif features.normal:
+        nodehelper.createOnlyNormal()
+
+class MaterialTemplates:
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        # NodeFeatures -> name of the template material
+        self._names = dict()
+
+    def clear(self):
+        self._names = dict()
+
+    def _template(self, obj, features):
+        name = self._names.get(features)
+        template = bpy.data.materials.get(name) if name else None
+        if template is not None:
+            self.hits += 1
+            return template
+        # Never built, or gone with the file it was in
+        self.misses += 1
+        with INSTRUMENTATION.span("build template"):
+            template = newNodeMaterial(TEMPLATE_PREFIX)
+            buildNodeSetup(NodeHelper(obj, material=template), features)
+        self._names[features] = template.name
+        return template
+
+    def createMaterial(self, obj, name, features):
+        """Add a new material called name to obj, with the node setup for features copied from its template"""
+        template = self._template(obj, features)
+        with INSTRUMENTATION.span("copy template"):
+            mat = template.copy()
+        INSTRUMENTATION.count("templates copied")
+        mat.name = name
+        obj.data.materials.append(mat)
+        return mat
+
+# The templates used by MHMat.assignAsNodesMaterialForObj
+MATERIAL_TEMPLATES = MaterialTemplates()
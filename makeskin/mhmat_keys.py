@@ -76,11 +76,23 @@ MHMAT_KEYS.append(MHMATBooleanKey("castShadows", True, 'Various'))
 MHMAT_KEYS.append(MHMATBooleanKey("receiveShadows", True, 'Various'))
 MHMAT_KEYS.append(MHMATBooleanKey("autoBlendSkin", None, 'Various'))
 
+# Measured from the diffuse texture when writing autoBlendSkin materials, see skintone.py
+MHMAT_KEYS.append(MHMATColorKey("skinToneColor", None, 'Various'))
+MHMAT_KEYS.append(MHMATFloatKey("skinToneLightness", None, 'Various'))
+MHMAT_KEYS.append(MHMATStringKey("skinToneHistogram", None, 'Various'))
+MHMAT_KEYS.append(MHMATFloatKey("skinToneCoverage", None, 'Various'))
+MHMAT_KEYS.append(MHMATStringKey("skinToneLitsphere", None, 'Various'))
+
 MHMAT_NAME_TO_KEY = {}
 for keyObj in MHMAT_KEYS:
     keyname = keyObj.keyNameLower
     MHMAT_NAME_TO_KEY[keyname] = keyObj
 
+# The keys of each group, in the order they are written to file
+MHMAT_GROUP_TO_KEYS = {}
+for keyGroup in MHMAT_KEY_GROUPS:
+    MHMAT_GROUP_TO_KEYS[keyGroup] = [keyObj for keyObj in MHMAT_NAME_TO_KEY.values() if keyObj.keyGroup == keyGroup]
+
 # SHADERS
 
 MHMAT_SHADER_KEYS = []
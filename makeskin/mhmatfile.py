@@ -0,0 +1,300 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# The bpy-free part of the MHMAT model: parsing, serializing and texture copying.
+# Everything in here must be usable outside blender, so do not import bpy or
+# anything that imports bpy (utils, nodehelper, extraproperties...) in this module.
+
+import re, os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .mhmat_keys import MHMAT_KEYS, MHMAT_SHADER_KEYS, MHMAT_KEY_GROUPS, MHMAT_NAME_TO_KEY, MHMAT_GROUP_TO_KEYS
+from .keytypes import *
+from .texturecopy import TextureCopyStats, copyTextureFile, SKIPPED
+from .imageinfo import IMAGE_INFO_CACHE
+from .atomicwrite import atomicWriter
+from .instrumentation import INSTRUMENTATION, instrumented
+
+DEBUG = False
+
+# Texture copying is I/O bound, so a few threads copying at the same time is faster than one
+TEXTURE_COPY_WORKERS = 4
+
+_LITSPHERE_PATH = re.compile(r'^litspheres\/(.*)\.png$')
+
+# When these keys all point at the same file, it is a packed map with one map per channel
+PACKED_MAP_CHANNELS = {"aomapTexture": 0, "roughnessmapTexture": 1, "metallicmapTexture": 2}
+
+def normalizedTextureName(matBase, key, ext):
+    """The file name a texture of the given key gets when normalized, e.g. mymat_diffuse.png"""
+    suffix = re.sub(r'Texture','',key)
+    suffix = re.sub(r'map','',suffix)
+    return matBase + '_' + suffix + ext
+
+class MHMatFile:
+
+    def __init__(self, fileName = None):
+
+        self.settings = dict()
+        self.shaderConfig = dict()
+
+        for keyObj in MHMAT_KEYS:
+            self.settings[keyObj.keyName] = keyObj.defaultValue
+            if DEBUG: print (keyObj.keyName)
+
+        self.litSphere = None
+        self.textureCopyStats = None
+
+        if not fileName is None:
+            with INSTRUMENTATION.span("parse", file=fileName):
+                self._parseFile(fileName)
+
+    # copy all textures next to the mhmat file. With normalize, the copies are named after the
+    # material, with the extension of the format their header says they are. With incremental,
+    # destinations which already have the same content are not rewritten. The copies run in a pool
+    # of worker threads, and the settings are only changed to the new names once all copies
+    # succeeded. progress, if given, is called as progress(done, total) from the calling thread.
+    # Keys in skipKeys are left alone, for textures which were already written elsewhere (see
+    # texturenormalize). Returns a TextureCopyStats.
+    #
+    @instrumented("copy textures")
+    def copyTextures(self, mhmatFilenameAbsolute, normalize=True, adjustSettings=True, incremental=True, allowHardlink=False, workers=TEXTURE_COPY_WORKERS, progress=None, skipKeys=()):
+        stats = TextureCopyStats()
+        matBaseName = os.path.basename(mhmatFilenameAbsolute)
+        matLoc = os.path.dirname(mhmatFilenameAbsolute)
+        (matBase, matExt) = os.path.splitext(matBaseName)
+
+        newSettings = dict()
+        copies = dict()
+
+        for keyObj in MHMAT_KEYS:
+            if isinstance(keyObj, MHMATFileKey) and not keyObj.blendMaterial and keyObj.keyName in self.settings and keyObj.keyName != "litsphereTexture" and keyObj.keyName not in skipKeys:
+                key = keyObj.keyName
+                if DEBUG: print(key)
+                origLoc = self.settings[key]
+                if DEBUG: print(origLoc)
+                if origLoc:
+                    origLoc = os.path.abspath(origLoc)
+                    # Reading the header fails right here for a missing texture, before anything is copied
+                    info = IMAGE_INFO_CACHE.get(origLoc)
+                    (dummy, texExt) = os.path.splitext(origLoc)
+                    if not normalize:
+                        baseName = os.path.basename(origLoc)
+                    else:
+                        if info is not None and not info.matchesExtension(texExt):
+                            # Name the copy after what the file really is, not what it was called
+                            texExt = info.extension
+                        baseName = normalizedTextureName(matBase, key, texExt)
+                    destLoc = os.path.abspath(os.path.join(matLoc, baseName))
+                    if origLoc != destLoc:
+                        # If several keys end up at the same destination, the last one wins
+                        copies[destLoc] = origLoc
+                    else:
+                        print("Source and destination is same file, skipping texture copy for this entry")
+                    newSettings[key] = baseName
+
+        total = len(copies)
+        done = 0
+        if progress:
+            progress(done, total)
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = dict()
+            for destLoc in copies.keys():
+                origLoc = copies[destLoc]
+                future = executor.submit(copyTextureFile, origLoc, destLoc, incremental=incremental, allowHardlink=allowHardlink)
+                futures[future] = (origLoc, destLoc)
+            for future in as_completed(futures):
+                (origLoc, destLoc) = futures[future]
+                # Raises the exception of a failed copy. The remaining copies are still finished
+                # when leaving the executor, but the settings are left untouched.
+                (action, size) = future.result()
+                stats.add(action, size)
+                if action == SKIPPED:
+                    print("Destination is unchanged, skipping copy from " + origLoc + " to " + destLoc)
+                else:
+                    print (action + " from " + origLoc  + " to " + destLoc)
+                done += 1
+                if progress:
+                    progress(done, total)
+
+        if adjustSettings:
+            self.settings.update(newSettings)
+
+        print("Texture copy: " + str(stats))
+        return stats
+
+    # copy the blend file of blendMaterial next to mhmatFilenameAbsolute, named after it like the
+    # ones written by the export (mymat.mat.blend), and point blendMaterial at the copy. Returns
+    # (action, size) as copyTextureFile does, or None if there is no blend material.
+    #
+    def copyBlendMaterial(self, mhmatFilenameAbsolute, adjustSettings=True, incremental=True, allowHardlink=False):
+        value = self.settings.get("blendMaterial")
+        if not value:
+            return None
+        (origLoc, dirName, assetName) = (part.strip() for part in str(value).rsplit('/', 2))
+        origLoc = os.path.abspath(origLoc)
+        (matBase, matExt) = os.path.splitext(os.path.basename(mhmatFilenameAbsolute))
+        baseName = matBase + ".mat.blend"
+        destLoc = os.path.abspath(os.path.join(os.path.dirname(mhmatFilenameAbsolute), baseName))
+        if origLoc == destLoc:
+            print("Source and destination is same file, skipping blend material copy")
+            (action, size) = (SKIPPED, os.stat(origLoc).st_size)
+        else:
+            (action, size) = copyTextureFile(origLoc, destLoc, incremental=incremental, allowHardlink=allowHardlink)
+            if action == SKIPPED:
+                print("Destination is unchanged, skipping copy from " + origLoc + " to " + destLoc)
+            else:
+                print(action + " from " + origLoc + " to " + destLoc)
+        if adjustSettings:
+            self.settings["blendMaterial"] = baseName + "/" + dirName + "/" + assetName
+        return (action, size)
+
+    # return the channel holding the map of key, if the maps of PACKED_MAP_CHANNELS are packed into
+    # the channels of one image, otherwise None
+    #
+    def packedMapChannel(self, key):
+        if not key in PACKED_MAP_CHANNELS:
+            return None
+        paths = [self.settings.get(packedKey) for packedKey in PACKED_MAP_CHANNELS.keys()]
+        if not paths[0] or paths.count(paths[0]) != len(paths):
+            return None
+        return PACKED_MAP_CHANNELS[key]
+
+    # put all textures into a content addressed TextureStore, and point the settings at the stored
+    # files with paths relative to the mhmat file. A texture already in the store is not copied
+    # again. progress works as for copyTextures. Returns a TextureCopyStats.
+    #
+    @instrumented("store textures")
+    def storeTextures(self, mhmatFilenameAbsolute, store, adjustSettings=True, workers=TEXTURE_COPY_WORKERS, progress=None):
+        stats = TextureCopyStats()
+        matLoc = os.path.dirname(os.path.abspath(mhmatFilenameAbsolute))
+
+        sources = dict()
+        for keyObj in MHMAT_KEYS:
+            key = keyObj.keyName
+            if isinstance(keyObj, MHMATFileKey) and not keyObj.blendMaterial and key != "litsphereTexture" and self.settings.get(key):
+                sources[key] = os.path.abspath(self.settings[key])
+
+        total = len(sources)
+        done = 0
+        if progress:
+            progress(done, total)
+
+        newSettings = dict()
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = dict()
+            for key in sources.keys():
+                futures[executor.submit(store.add, sources[key])] = key
+            for future in as_completed(futures):
+                key = futures[future]
+                (blobPath, action, size) = future.result()
+                stats.add(action, size)
+                print("Stored " + sources[key] + " as " + blobPath + " (" + action + ")")
+                # MakeHuman wants forward slashes, also on windows
+                newSettings[key] = os.path.relpath(blobPath, matLoc).replace(os.sep, "/")
+                done += 1
+                if progress:
+                    progress(done, total)
+
+        if adjustSettings:
+            self.settings.update(newSettings)
+
+        print("Texture store: " + str(stats))
+        return stats
+
+    # the file is replaced in one step, readers never see a partly written material. Concurrent
+    # writers of the same file should hold an atomicwrite.FileLock around the whole export.
+    #
+    @instrumented("write mhmat")
+    def writeFile(self, fileName):
+        with atomicWriter(fileName, 'w') as f:
+            f.writelines(self.serializedLines())
+
+    def _parseFile(self, fileName):
+
+        full = os.path.abspath(fileName)
+        location = os.path.dirname(full)
+        with open(fileName, 'r', errors='ignore') as f:
+            for line in f:
+                parsedLine = line.strip()
+                if parsedLine and not parsedLine.startswith("#") and not parsedLine.startswith("/"):
+                    (key, rawValue) = splitLine(parsedLine)
+                    if key is not None:
+                        keyLower = key.lower()
+                        value = None
+
+                        keyObj = MHMAT_NAME_TO_KEY.get(keyLower)
+                        if keyObj is not None:
+                            keyCorrectCase = keyObj.keyName
+                            if key != keyCorrectCase:
+                                print("Autofixing case: " + key + " -> " + keyCorrectCase)
+                                key = keyCorrectCase
+                            if isinstance(keyObj, MHMATFileKey):
+                                value = keyObj.parseValue(rawValue, location)
+                            else:
+                                value = keyObj.parseValue(rawValue)
+                        else:
+                            if key not in ["shader", "shaderConfig"]: print("Not a valid key: " + key)
+                        #
+                        # handle multiple occurences of tag (create a comma-separated entry)
+                        #
+                        if key == 'tag':
+                            if self.settings[key]:
+                                self.settings[key] += ", " + value
+                            else:
+                                self.settings[key] = value
+                        elif key == 'shaderParam':
+                            if value[0] == "litsphereTexture":
+                                match = _LITSPHERE_PATH.match(value[1])
+                                if match:
+                                    self.settings["litsphereTexture"] = match.group(1)
+                                    if DEBUG: print (self.settings["litsphereTexture"])
+                        else:
+                            self.settings[key] = value
+                    else:
+                        if parsedLine.startswith("shader"):
+                            # TODO: check for shaderConfig, shader 
+                            pass
+                        else:
+                            print("no match")
+                            print(parsedLine)
+            if INSTRUMENTATION.enabled:
+                INSTRUMENTATION.count("bytes parsed", os.fstat(f.fileno()).st_size)
+        if DEBUG: print(self)
+
+    def serializedLines(self):
+        """Generate the lines of the MHMAT file, each one ending with a newline"""
+        settings = self.settings
+
+        yield "# This is a material file for MakeHuman, produced by MakeSkin\n"
+
+        for keyGroup in MHMAT_KEY_GROUPS:
+            yield "\n// " + keyGroup + "\n\n"
+            for keyObj in MHMAT_GROUP_TO_KEYS[keyGroup]:
+                keyName = keyObj.keyName
+                value = settings[keyName]
+                if value is not None:
+                    if keyName == "tag":
+                        for elem in value.split(","):
+                            yield "tag " + elem.strip() + "\n"
+                    else:
+                        yield keyName + " " + keyObj.asString(value) + "\n"
+
+        yield "\n"
+        yield "// Shader properties (only affects how things look in MakeHuman)\n\n"
+
+        if self.litSphere:
+            yield "shader shaders/glsl/litsphere\n"
+            yield "shaderParam litsphereTexture litspheres/" + str(self.litSphere) + ".png\n"
+        for key in self.shaderConfig.keys():
+            yield "shaderConfig " + key + " " + str(self.shaderConfig[key]) + "\n"
+
+        yield "\n"
+        yield "// The following settings would also have been valid, but do currently not have a value\n//\n"
+        for keyObj in MHMAT_NAME_TO_KEY.values():
+            key = keyObj.keyName
+            if settings.get(key) is None:
+                yield "// " + key + "\n"
+
+    def __str__(self):
+        return "".join(self.serializedLines())
@@ -5,6 +5,21 @@ import bpy
 import bpy.types
 from bpy.types import ShaderNodeBsdfPrincipled, ShaderNodeTexImage, ShaderNodeNormalMap, ShaderNodeBump, ShaderNodeNormalMap, ShaderNodeDisplacement, ShaderNodeMixRGB
 import pprint, os
+from .imageregistry import IMAGE_REGISTRY
+from .instrumentation import INSTRUMENTATION
+from .imageinfo import IMAGE_INFO_CACHE
+from .proxies import PROXY_CACHE, SOURCE_PATH_PROPERTY, PROXY_PROPERTY, sourcePathOfNode
+
+# The colorspace of the image of each texture node. The nodes are named after the MHMAT key of
+# their texture.
+TEXTURE_NODE_COLORSPACES = dict()
+TEXTURE_NODE_COLORSPACES["diffuseTexture"] = "sRGB"
+TEXTURE_NODE_COLORSPACES["transmissionmapTexture"] = "Non-Color"
+TEXTURE_NODE_COLORSPACES["roughnessmapTexture"] = "Non-Color"
+TEXTURE_NODE_COLORSPACES["metallicmapTexture"] = "Non-Color"
+TEXTURE_NODE_COLORSPACES["bumpmapTexture"] = "Non-Color"
+TEXTURE_NODE_COLORSPACES["normalmapTexture"] = "Non-Color"
+TEXTURE_NODE_COLORSPACES["displacementmapTexture"] = "sRGB"
 
 _coords = dict()
 _coords["diffuseTexture"] = [-500.0, 300.0]
@@ -35,13 +50,60 @@ _coords["castShadows"] = [500.0, -150.0]
 _coords["receiveShadows"] = [500.0, -250.0]
 _coords["litsphereTexture"] = [500.0, -350.0]
 
+# check a texture file from its (cached) header, returning (path, None) or (None, reason)
+#
+def _checkImageFile(path):
+    try:
+        info = IMAGE_INFO_CACHE.get(path)
+    except OSError:
+        return (None, path + " is not a file")
+    if info is not None and (info.width == 0 or info.height == 0):
+        return (None, path + " has no pixels")
+    return (path, None)
+
+# float images are already linear, and blender picks a linear colorspace for them by itself.
+# Returns None if the colorspace should be left alone.
+#
+def _colorspaceForFile(path, colorspace):
+    if colorspace != "sRGB":
+        return colorspace
+    try:
+        info = IMAGE_INFO_CACHE.get(path)
+    except OSError:
+        return colorspace
+    if info is not None and info.isFloat:
+        return None
+    return colorspace
+
 
 class NodeHelper:
 
-    def __init__(self, obj):
+    # material defaults to the first material of the object. imagePathCache is an optional dict
+    # which can be shared between helpers, so that an image used by several materials only has
+    # its file path resolved and checked once.
+    #
+    def __init__(self, obj, material=None, imagePathCache=None):
         self.obj = obj
-        self._material = obj.data.materials[0]
+        if material is None:
+            material = obj.data.materials[0]
+        self._material = material
         self._nodetree = self._material.node_tree
+        self._imagePathCache = imagePathCache
+
+        # When set, image texture nodes get deferred images, which are not read until needed
+        self.deferImageLoading = False
+
+        # When set, image texture nodes get downscaled proxies fitting within this size
+        self.proxySize = None
+
+        # Lookup indexes over the node tree, built in one pass on first use. They are
+        # invalidated by every node or link created through this class. Code which changes
+        # the tree behind our back must call invalidateIndex().
+        self._indexValid = False
+        self._nodesByName = dict()
+        self._firstNodeByType = dict()
+        self._firstNodeByClass = dict()
+        self._linkedFromNode = dict()
 
         self._principledNode = self.findFirstNodeByClass(ShaderNodeBsdfPrincipled)
         self._diffuseTextureNode = None
@@ -49,23 +111,54 @@ class NodeHelper:
         self._bumpmapTextureNode = None
         self._outputNode = self.findFirstNodeByType('OUTPUT_MATERIAL')
 
-    def findNodeByName(self, nodeName):
+    def invalidateIndex(self):
+        self._indexValid = False
+
+    def _buildIndex(self):
+        self._nodesByName = dict()
+        self._firstNodeByType = dict()
+        self._firstNodeByClass = dict()
+        self._linkedFromNode = dict()
         for node in self._nodetree.nodes:
-            if node.name == nodeName:
-                return node
-        return None
+            self._nodesByName[node.name] = node
+            if not node.type in self._firstNodeByType:
+                self._firstNodeByType[node.type] = node
+        for link in self._nodetree.links:
+            # If several links end at the same socket, the last one wins
+            self._linkedFromNode[(link.to_node.name, link.to_socket.name)] = link.from_node
+        self._indexValid = True
+
+    def _newNode(self, nodeType):
+        self._indexValid = False
+        INSTRUMENTATION.count("nodes created")
+        return self._nodetree.nodes.new(nodeType)
+
+    def _newLink(self, fromSocket, toSocket):
+        self._indexValid = False
+        INSTRUMENTATION.count("links created")
+        return self._nodetree.links.new(fromSocket, toSocket)
+
+    def findNodeByName(self, nodeName):
+        if not self._indexValid:
+            self._buildIndex()
+        return self._nodesByName.get(nodeName)
 
     def findFirstNodeByType(self, typeName):
-        for node in self._nodetree.nodes:
-            if node.type == typeName:
-                return node
-        return None
+        if not self._indexValid:
+            self._buildIndex()
+        return self._firstNodeByType.get(typeName)
 
     def findFirstNodeByClass(self, typeClass):
-        for node in self._nodetree.nodes:
-            if isinstance(node, typeClass):
-                return node
-        return None
+        if not self._indexValid:
+            self._buildIndex()
+        if not typeClass in self._firstNodeByClass:
+            found = None
+            for node in self._nodetree.nodes:
+                if isinstance(node, typeClass):
+                    found = node
+                    break
+            self._firstNodeByClass[typeClass] = found
+        return self._firstNodeByClass[typeClass]
 
     def findNodeSocketDefaultValue(self, nodeName, socketName):
         node = self.findNodeByName(nodeName)
@@ -92,36 +185,55 @@ class NodeHelper:
     def findNodeLinkedToSocket(self, nodeLinkedTo, nameOfSocket):
         if not nodeLinkedTo:
             return None
-        sourceSideOfLink = None
-        for link in self._nodetree.links:
-            if link.to_node == nodeLinkedTo:
-                socketLinkedTo = link.to_socket
-                if socketLinkedTo.name == nameOfSocket:
-                    sourceSideOfLink = link.from_node
-        return sourceSideOfLink
+        if not self._indexValid:
+            self._buildIndex()
+        return self._linkedFromNode.get((nodeLinkedTo.name, nameOfSocket))
 
     def findNodeLinkedToPrincipled(self, principledSocketName):
         return self.findNodeLinkedToSocket(self._principledNode, principledSocketName)
 
     def _createImageTextureNode(self, imagePathAbsolute=None, coordinatesName=None, colorspace="sRGB"):
         global _coords
-        newTextureNode = self._nodetree.nodes.new("ShaderNodeTexImage")
+        newTextureNode = self._newNode("ShaderNodeTexImage")
         if coordinatesName:
             newTextureNode.location = _coords[coordinatesName]
         if imagePathAbsolute:
-            imageFileName = os.path.basename(imagePathAbsolute)
-            if imageFileName in bpy.data.images:
-                print("image existed: " + imagePathAbsolute)
-                image = bpy.data.images[imageFileName]
-            else:
-                image = bpy.data.images.load(imagePathAbsolute)
-            image.colorspace_settings.name = colorspace
-            newTextureNode.image = image
+            self.setTextureImage(newTextureNode, imagePathAbsolute, colorspace)
         return newTextureNode
 
+    # give an image texture node the image of a file, as a proxy or deferred if so configured
+    #
+    def setTextureImage(self, textureNode, imagePathAbsolute, colorspace="sRGB"):
+        imagePath = imagePathAbsolute
+        if self.proxySize:
+            imagePath = PROXY_CACHE.getProxyPath(imagePathAbsolute, self.proxySize)
+        image = IMAGE_REGISTRY.getImage(imagePath, deferred=self.deferImageLoading)
+        if imagePath != imagePathAbsolute:
+            image[PROXY_PROPERTY] = True
+            textureNode[SOURCE_PATH_PROPERTY] = imagePathAbsolute
+        colorspace = _colorspaceForFile(imagePathAbsolute, colorspace)
+        # Changing the colorspace throws away the image buffer, so only touch it if it differs
+        if colorspace and image.colorspace_settings.name != colorspace:
+            image.colorspace_settings.name = colorspace
+        textureNode.image = image
+
+    # link the color of a texture node to a socket, or only one channel of it for packed maps
+    #
+    def _linkChannel(self, textureNode, toSocket, channel=None):
+        if channel is None:
+            self._newLink(textureNode.outputs["Color"], toSocket)
+            return
+        if bpy.app.version >= (3, 3, 0):
+            separateNode = self._newNode("ShaderNodeSeparateColor")
+        else:
+            separateNode = self._newNode("ShaderNodeSeparateRGB")
+        separateNode.location = (textureNode.location[0] + 300.0, textureNode.location[1])
+        self._newLink(textureNode.outputs["Color"], separateNode.inputs[0])
+        self._newLink(separateNode.outputs[channel], toSocket)
+
     # create MakeHuman Nodeframe
     def createMHNodeFrame(self, name):
-        frame_node = self._nodetree.nodes.new("NodeFrame")
+        frame_node = self._newNode("NodeFrame")
         frame_node.label = name
         frame_node.name = name
         return frame_node
@@ -132,11 +244,11 @@ class NodeHelper:
         # print ("Dummynode " + name + " " + str(value))
         node = None
         if type(value) is bool:
-            node = self._nodetree.nodes.new("ShaderNodeValue")
+            node = self._newNode("ShaderNodeValue")
             node.outputs["Value"].default_value = float(value)
 
         if type(value) is str:
-            node = self._nodetree.nodes.new("ShaderNodeAttribute")
+            node = self._newNode("ShaderNodeAttribute")
             node.attribute_name = value
 
         if node:
@@ -158,10 +270,10 @@ class NodeHelper:
         bm.location = _coords["bumpMapDuo"]
 
         if linkToPrincipled and self._principledNode:
-            self._nodetree.links.new(bm.outputs["Normal"], self._principledNode.inputs["Normal"])
-            self._nodetree.links.new(bmt.outputs["Color"], bm.inputs["Height"])
-            self._nodetree.links.new(nm.outputs["Normal"], bm.inputs["Normal"])
-            self._nodetree.links.new(nmt.outputs["Color"], nm.inputs["Color"])
+            self._newLink(bm.outputs["Normal"], self._principledNode.inputs["Normal"])
+            self._newLink(bmt.outputs["Color"], bm.inputs["Height"])
+            self._newLink(nm.outputs["Normal"], bm.inputs["Normal"])
+            self._newLink(nmt.outputs["Color"], nm.inputs["Color"])
 
     def createOnlyBump(self, bumpImagePathAbsolute=None, linkToPrincipled=True):
         global _coords
@@ -170,13 +282,11 @@ class NodeHelper:
         bm.location = _coords["bumpMapSolo"]
 
     def _createBump(self, bumpImagePathAbsolute=None, linkToPrincipled=True):
-        bumpmapTextureNode = self._createImageTextureNode(bumpImagePathAbsolute)
-        if bumpImagePathAbsolute:
-            bumpmapTextureNode.image.colorspace_settings.name = "Non-Color"
-        bumpmapNode = self._nodetree.nodes.new("ShaderNodeBump")
+        bumpmapTextureNode = self._createImageTextureNode(bumpImagePathAbsolute, colorspace="Non-Color")
+        bumpmapNode = self._newNode("ShaderNodeBump")
         if linkToPrincipled and self._principledNode:
-            self._nodetree.links.new(bumpmapNode.outputs["Normal"], self._principledNode.inputs["Normal"])
-            self._nodetree.links.new(bumpmapTextureNode.outputs["Color"], bumpmapNode.inputs["Height"])
+            self._newLink(bumpmapNode.outputs["Normal"], self._principledNode.inputs["Normal"])
+            self._newLink(bumpmapTextureNode.outputs["Color"], bumpmapNode.inputs["Height"])
         bumpmapTextureNode.name = "bumpmapTexture"
         bumpmapTextureNode.label = "Bumpmap Texture"
         bumpmapNode.name = "bumpmap"
@@ -184,13 +294,11 @@ class NodeHelper:
         return (bumpmapTextureNode, bumpmapNode)
 
     def _createNormal(self, normalImagePathAbsolute=None, linkToPrincipled=True):
-        normalmapTextureNode = self._createImageTextureNode(normalImagePathAbsolute)
-        if normalImagePathAbsolute:
-            normalmapTextureNode.image.colorspace_settings.name = "Non-Color"
-        normalmapNode = self._nodetree.nodes.new("ShaderNodeNormalMap")
+        normalmapTextureNode = self._createImageTextureNode(normalImagePathAbsolute, colorspace="Non-Color")
+        normalmapNode = self._newNode("ShaderNodeNormalMap")
         if linkToPrincipled and self._principledNode:
-            self._nodetree.links.new(normalmapNode.outputs["Normal"], self._principledNode.inputs["Normal"])
-            self._nodetree.links.new(normalmapTextureNode.outputs["Color"], normalmapNode.inputs["Color"])
+            self._newLink(normalmapNode.outputs["Normal"], self._principledNode.inputs["Normal"])
+            self._newLink(normalmapTextureNode.outputs["Color"], normalmapNode.inputs["Color"])
         normalmapTextureNode.name = "normalmapTexture"
         normalmapTextureNode.label = "Normalmap Texture"
         normalmapNode.name = "normalmap"
@@ -208,15 +316,24 @@ class NodeHelper:
     def _extractImageFilePath(self, textureNode):
         if not textureNode:
             return (None, "WARNING: to test a None node for filename")
+        if textureNode.image and self._imagePathCache is not None:
+            key = (textureNode.image.name, textureNode.image.filepath, textureNode.image.filepath_raw, sourcePathOfNode(textureNode))
+            if not key in self._imagePathCache:
+                self._imagePathCache[key] = self._extractImageFilePathUncached(textureNode)
+            return self._imagePathCache[key]
+        return self._extractImageFilePathUncached(textureNode)
+
+    def _extractImageFilePathUncached(self, textureNode):
+        sourcePath = sourcePathOfNode(textureNode)
+        if sourcePath:
+            # A proxy, the material refers to the full resolution texture
+            return _checkImageFile(sourcePath)
         if textureNode.image:
             if textureNode.image.filepath or textureNode.image.filepath_raw:
                 if textureNode.image.filepath:
-                    path = bpy.path.abspath(textureNode.image.filepath)
-                    if os.path.isfile(path):
-                        return (path, None)
-                    return (None, path + " is not a file")
+                    return _checkImageFile(bpy.path.abspath(textureNode.image.filepath))
                 else:
-                    return (bpy.path.abspath(textureNode.image.filepath_raw), None) #  file test?!
+                    return _checkImageFile(bpy.path.abspath(textureNode.image.filepath_raw))
             else:
                 return (None, "Found image texture with an image property, but the image had an empty file path.")
         else:
@@ -236,7 +353,7 @@ class NodeHelper:
         diffuseTextureNode.name = "diffuseTexture"
         diffuseTextureNode.label = "Diffuse Texture"
 
-        diffuseIntensityNode = self._nodetree.nodes.new("ShaderNodeMixRGB")
+        diffuseIntensityNode = self._newNode("ShaderNodeMixRGB")
         diffuseIntensityNode.name = "diffuseIntensity"
         diffuseIntensityNode.label = "diffuse intensity"
         diffuseIntensityNode.location = _coords["diffuseIntensity"]
@@ -244,9 +361,9 @@ class NodeHelper:
         diffuseIntensityNode.inputs['Color1'].default_value = [1.0, 1.0, 1.0, 1.0]
 
         if linkToPrincipled and self._principledNode:
-            self._nodetree.links.new(diffuseTextureNode.outputs["Color"], diffuseIntensityNode.inputs['Color2'])
-            self._nodetree.links.new(diffuseIntensityNode.outputs["Color"], self._principledNode.inputs['Base Color'])
-            self._nodetree.links.new(diffuseTextureNode.outputs["Alpha"], self._principledNode.inputs["Alpha"])
+            self._newLink(diffuseTextureNode.outputs["Color"], diffuseIntensityNode.inputs['Color2'])
+            self._newLink(diffuseIntensityNode.outputs["Color"], self._principledNode.inputs['Base Color'])
+            self._newLink(diffuseTextureNode.outputs["Alpha"], self._principledNode.inputs["Alpha"])
 
         return diffuseTextureNode
 
@@ -261,7 +378,7 @@ class NodeHelper:
     def createTransmissionTextureNode(self, imagePathAbsolute=None, linkToPrincipled=True):
         transmissionTextureNode = self._createImageTextureNode(imagePathAbsolute, "transmissionTexture", colorspace="Non-Color")
         if linkToPrincipled and self._principledNode:
-            self._nodetree.links.new(transmissionTextureNode.outputs["Color"], self._principledNode.inputs["Transmission"])
+            self._newLink(transmissionTextureNode.outputs["Color"], self._principledNode.inputs["Transmission"])
         transmissionTextureNode.name = "transmissionmapTexture"
         transmissionTextureNode.label = "Transmissionmap Texture"
         return transmissionTextureNode
@@ -274,10 +391,10 @@ class NodeHelper:
 
     ##### ROUGHNESS #####
 
-    def createRoughnessTextureNode(self, imagePathAbsolute=None, linkToPrincipled=True):
+    def createRoughnessTextureNode(self, imagePathAbsolute=None, linkToPrincipled=True, channel=None):
         roughnessTextureNode = self._createImageTextureNode(imagePathAbsolute, "roughnessTexture", colorspace="Non-Color")
         if linkToPrincipled and self._principledNode:
-            self._nodetree.links.new(roughnessTextureNode.outputs["Color"], self._principledNode.inputs["Roughness"])
+            self._linkChannel(roughnessTextureNode, self._principledNode.inputs["Roughness"], channel)
         roughnessTextureNode.name = "roughnessmapTexture"
         roughnessTextureNode.label = "Roughnessmap Texture"
         return roughnessTextureNode
@@ -290,10 +407,10 @@ class NodeHelper:
 
     ##### METALLIC #####
 
-    def createMetallicTextureNode(self, imagePathAbsolute=None, linkToPrincipled=True):
+    def createMetallicTextureNode(self, imagePathAbsolute=None, linkToPrincipled=True, channel=None):
         metallicTextureNode = self._createImageTextureNode(imagePathAbsolute, "metallicTexture", colorspace="Non-Color")
         if linkToPrincipled and self._principledNode:
-            self._nodetree.links.new(metallicTextureNode.outputs["Color"], self._principledNode.inputs["Metallic"])
+            self._linkChannel(metallicTextureNode, self._principledNode.inputs["Metallic"], channel)
         metallicTextureNode.name = "metallicmapTexture"
         metallicTextureNode.label = "Metallicmap Texture"
         return metallicTextureNode
@@ -336,12 +453,12 @@ class NodeHelper:
 
     def createDisplacementTextureNode(self, imagePathAbsolute=None):
         global _coords
-        displacementNode = self._nodetree.nodes.new("ShaderNodeDisplacement")
+        displacementNode = self._newNode("ShaderNodeDisplacement")
         displacementNode.location = _coords["displacement"]
         displacementTextureNode = self._createImageTextureNode(imagePathAbsolute, "displacementTexture")
         displacementTextureNode.location = _coords["displacementTexture"]
-        self._nodetree.links.new(displacementNode.outputs["Displacement"], self._outputNode.inputs["Displacement"])
-        self._nodetree.links.new(displacementTextureNode.outputs["Color"], displacementNode.inputs["Height"])
+        self._newLink(displacementNode.outputs["Displacement"], self._outputNode.inputs["Displacement"])
+        self._newLink(displacementTextureNode.outputs["Color"], displacementNode.inputs["Height"])
         displacementTextureNode.name = "displacementmapTexture"
         displacementTextureNode.label = "Displacementmap Texture"
         displacementNode.name = "displacementmap"
@@ -6,16 +6,22 @@
 from .creatematerial import MHS_OT_CreateMaterialOperator
 from .importmaterial import MHS_OT_ImportMaterialOperator
 from .writematerial import MHS_OT_WriteMaterialOperator
+from .writeallmaterials import MHS_OT_WriteAllMaterialsOperator
+from .collecttexturegarbage import MHS_OT_CollectTextureGarbageOperator
 
 OPERATOR_CLASSES = [
     MHS_OT_CreateMaterialOperator,
     MHS_OT_ImportMaterialOperator,
-    MHS_OT_WriteMaterialOperator
+    MHS_OT_WriteMaterialOperator,
+    MHS_OT_WriteAllMaterialsOperator,
+    MHS_OT_CollectTextureGarbageOperator
 ]
 
 __all__ = [
     "MHS_OT_CreateMaterialOperator",
     "MHS_OT_ImportMaterialOperator",
     "MHS_OT_WriteMaterialOperator",
+    "MHS_OT_WriteAllMaterialsOperator",
+    "MHS_OT_CollectTextureGarbageOperator",
     "OPERATOR_CLASSES"
 ]
@@ -0,0 +1,49 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import bpy, os
+from bpy.props import StringProperty
+from ..texturestore import TextureStore
+from ..batch import findMaterialFiles
+
+#  remove the textures from the shared texture store which none of the materials in a library
+#  directory refers to
+#
+class MHS_OT_CollectTextureGarbageOperator(bpy.types.Operator):
+    """Remove textures from the shared texture store which no material in the chosen directory uses. All materials using the store must be below that directory"""
+    bl_idname = "makeskin.collect_texture_garbage"
+    bl_label = "Remove unused stored textures"
+    bl_options = {'REGISTER'}
+
+    directory: StringProperty(
+            name="Directory",
+            description="Directory containing all materials which use the texture store",
+            maxlen=1024,
+            subtype='DIR_PATH',
+            )
+
+    @classmethod
+    def poll(self, context):
+        return bool(context.scene.MhMsTextureStoreDir)
+
+    def invoke(self, context, event):
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+    def execute(self, context):
+
+        dirAbsolute = bpy.path.abspath(self.directory)
+        if not os.path.isdir(dirAbsolute):
+            self.report({'ERROR'}, dirAbsolute + " is not a directory")
+            return {'FINISHED'}
+
+        materialFiles = findMaterialFiles(dirAbsolute)
+        if not materialFiles:
+            # Everything would count as unused, which is more likely a wrong directory
+            self.report({'ERROR'}, "There are no material files below " + dirAbsolute)
+            return {'FINISHED'}
+
+        store = TextureStore(bpy.path.abspath(context.scene.MhMsTextureStoreDir))
+        (removed, freed) = store.collectGarbage(materialFiles)
+        self.report({'INFO'}, "%d unused textures removed from the store, %.1f MB freed" % (removed, freed / 1048576.0))
+        return {'FINISHED'}
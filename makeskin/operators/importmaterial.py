@@ -2,19 +2,37 @@
 # -*- coding: utf-8 -*-
 
 import bpy
-import os
+import os, time
+from collections import deque
 from bpy_extras.io_utils import ImportHelper
 from bpy.props import BoolProperty, StringProperty, EnumProperty, IntProperty, CollectionProperty, FloatProperty
 from ..utils import *
 from ..material import MHMat
+from ..imageregistry import IMAGE_REGISTRY
+from ..importqueue import ImportQueue
+from ..instrumentation import INSTRUMENTATION, Instrumentation
 
+# Seconds between two chunks of node building, and how long a chunk may take. Whatever is left
+# of the interval goes to the UI, so that large imports do not freeze blender.
+CHUNK_INTERVAL = 0.02
+CHUNK_SECONDS = 0.05
+
+#  Import one or more MHMAT files. A single file is imported onto the active object (or, with
+#  all_selected, onto every selected object), several files onto the selected objects with the
+#  same name (without extension). The files are read on
+#  a worker thread, the materials are built from a timer in small chunks, with a progress bar
+#  and Esc to cancel.
+#
 class MHS_OT_ImportMaterialOperator(bpy.types.Operator, ImportHelper):
-    """Import MHMAT"""
+    """Import MHMAT files onto the active object. Select several files to import each onto the selected object of the same name"""
     bl_idname = "makeskin.import_material"
     bl_label = "Import material"
     bl_options = {'REGISTER','UNDO'}
 
     filter_glob: StringProperty(default='*.mhmat', options={'HIDDEN'})
+    files: CollectionProperty(type=bpy.types.OperatorFileListElement, options={'HIDDEN', 'SKIP_SAVE'})
+    directory: StringProperty(subtype='DIR_PATH', options={'HIDDEN', 'SKIP_SAVE'})
+    all_selected: BoolProperty(name="All selected objects", description="Import a single file onto all selected objects, not only onto the active one. With 'replace' on, this replaces the materials of all of them", default=False)
 
     @classmethod
     def poll(self, context):
@@ -24,25 +42,175 @@ class MHS_OT_ImportMaterialOperator(bpy.types.Operator, ImportHelper):
             return True
         return False
 
+    def _fileNames(self):
+        fileNames = [os.path.join(self.directory, f.name) for f in self.files if f.name]
+        if not fileNames:
+            fileNames = [self.filepath]
+        return fileNames
+
+    def _targetObjects(self, context):
+        objects = [context.active_object]
+        for obj in context.selected_objects:
+            if obj.type == 'MESH' and obj not in objects and hasattr(obj, "MhObjectType"):
+                objects.append(obj)
+        return objects
+
+    def _pairFilesWithObjects(self, context, fileNames):
+        # (file name, object name) pairs, and the files no object was found for
+        objects = self._targetObjects(context)
+        if len(fileNames) == 1:
+            if not self.all_selected:
+                objects = [context.active_object]
+            return ([(fileNames[0], obj.name) for obj in objects], [])
+        byName = dict()
+        for obj in objects:
+            byName[obj.name] = obj
+        jobs = []
+        unmatched = []
+        for fileName in fileNames:
+            obj = byName.get(os.path.splitext(os.path.basename(fileName))[0])
+            if obj is None:
+                unmatched.append(fileName)
+            else:
+                jobs.append((fileName, obj.name))
+        return (jobs, unmatched)
+
     def execute(self, context):
-        obj = context.active_object
         scn = context.scene
 
+        (jobs, unmatched) = self._pairFilesWithObjects(context, self._fileNames())
+        self._errors = [os.path.basename(fileName) + ": no selected object has this name" for fileName in unmatched]
+        if not jobs:
+            self.report({'ERROR'}, self._errors[0] if self._errors else "Nothing to import")
+            return {'CANCELLED'}
+
+        self._jobs = jobs
+        self._imported = 0
+        self._processed = 0
+        self._pending = deque()
+        self._timer = None
+        # The timings of this import. Recording is only switched on while a step runs, see
+        # Instrumentation.recording, the worker records its reads here directly.
+        self._trace = Instrumentation()
+        self._trace.enabled = scn.MhMsInstrument
+        # Library materials are often imported onto many objects, so the queue takes the parsed
+        # file from the cache when it has not changed since it was last read
+        self._queue = ImportQueue([fileName for (fileName, objName) in jobs], materialClass=MHMat, instrumentation=self._trace)
+
+        if bpy.app.background or context.window is None:
+            # Nothing to keep responsive, so read and build everything right away
+            self._recorded("read materials", self._queue.run)
+            self._step(context, None)
+            return self._finish(context)
+
+        self._queue.start()
+        wm = context.window_manager
+        wm.progress_begin(0, len(jobs))
+        self._timer = wm.event_timer_add(CHUNK_INTERVAL, window=context.window)
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if event.type == 'ESC':
+            self._queue.cancel()
+            return self._finish(context)
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+
+        try:
+            self._step(context, time.perf_counter() + CHUNK_SECONDS)
+        except Exception:
+            self._queue.cancel()
+            self._finish(context)
+            raise
+        if self._queue.done() and not self._pending:
+            return self._finish(context)
+        context.window_manager.progress_update(self._processed)
+        context.workspace.status_text_set("Importing materials: %d of %d, Esc to cancel" % (self._imported, len(self._jobs)))
+        return {'PASS_THROUGH'}
+
+    def _recorded(self, name, function, *args):
+        # Run function, recording it into the timings of this import if they are on
+        if not self._trace.enabled:
+            return function(*args)
+        with INSTRUMENTATION.recording(self._trace, name):
+            return function(*args)
+
+    def _step(self, context, deadline):
+        # Build materials until deadline (a time.perf_counter(), or None for all of them)
+        self._recorded("import step", self._buildMaterials, context, deadline)
+
+    def _buildMaterials(self, context, deadline):
+        self._pending.extend(self._queue.takeReady())
+        while self._pending and (deadline is None or time.perf_counter() < deadline):
+            (index, fileName, mhmat, error) = self._pending.popleft()
+            self._processed += 1
+            if not error:
+                error = self._importOne(context.scene, mhmat, self._jobs[index][1])
+            if error:
+                self._errors.append(os.path.basename(fileName) + ": " + error)
+            else:
+                self._imported += 1
+
+    def _importOne(self, scn, mhmat, objName):
+        # Returns an error message, or None
+        obj = bpy.data.objects.get(objName)
+        if obj is None:
+            return objName + " no longer exists"
+
         if hasMaterial(obj):
             if not scn.MhMsOverwrite:
-                self.report({'ERROR'}, "A material for this object already exists, change 'replace' option in common settings to overwrite material")
-                return {'FINISHED'}
-            else:
-                while len(obj.data.materials) > 0:
-                    obj.data.materials.pop(index=0)
+                return "a material for " + objName + " already exists, change 'replace' option in common settings to overwrite material"
+            while len(obj.data.materials) > 0:
+                obj.data.materials.pop(index=0)
 
-        mhmat = MHMat(fileName=self.filepath)
         mhmat.assignAsNodesMaterialForObj(scn, obj, True)
-        
+
         ##- Load Blend -##
         path = mhmat.settings["blendMaterial"]
         if path:
-            blendMatLoad(path)
+            blendMatLoad(path, obj)
+        return None
+
+    def cancel(self, context):
+        # Blender aborted the modal, for example because another file is loaded
+        self._queue.cancel()
+        self._cleanup(context)
+
+    def _cleanup(self, context):
+        if self._timer is not None:
+            wm = context.window_manager
+            wm.event_timer_remove(self._timer)
+            wm.progress_end()
+            if context.workspace is not None:
+                context.workspace.status_text_set(None)
+            self._timer = None
+        self._trace.enabled = False
+
+    def _finish(self, context):
+        scn = context.scene
+        self._cleanup(context)
+        if scn.MhMsDeferImages:
+            IMAGE_REGISTRY.startPreloading()
+        writeSceneTrace(scn, self._trace)
+
+        for error in self._errors:
+            print(error)
 
-        self.report({'INFO'}, "Material imported")
+        if self._queue.cancelled:
+            message = "Import cancelled, %d of %d materials imported" % (self._imported, len(self._jobs))
+        elif len(self._jobs) > 1:
+            message = "%d materials imported" % self._imported
+        else:
+            message = "Material imported"
+        if self._errors and not self._imported:
+            self.report({'ERROR'}, self._errors[0])
+        elif self._errors:
+            self.report({'WARNING'}, "%s, %d problems (see console): %s" % (message, len(self._errors), self._errors[0]))
+        else:
+            self.report({'INFO'}, message)
+        summary = instrumentationSummary(scn, self._trace)
+        if summary:
+            self.report({'INFO'}, summary)
+        # Also when cancelled, so that what was imported so far is one undo step
         return {'FINISHED'}
@@ -0,0 +1,85 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import bpy, os
+from bpy.props import StringProperty
+from ..material import extractMaterials
+from ..utils import instrumentedRun, instrumentationSummary
+
+#  write every material on every selected object to a directory, one MHMAT file per material,
+#  named after the material
+#
+class MHS_OT_WriteAllMaterialsOperator(bpy.types.Operator):
+    """Write the materials of all selected objects to MHMAT files in a directory"""
+    bl_idname = "makeskin.write_all_materials"
+    bl_label = "Write all materials"
+    bl_options = {'REGISTER'}
+
+    directory: StringProperty(
+            name="Directory",
+            description="Directory to write the material files to",
+            maxlen=1024,
+            subtype='DIR_PATH',
+            )
+
+    @classmethod
+    def poll(self, context):
+        return len(context.selected_objects) > 0
+
+    def invoke(self, context, event):
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+    def execute(self, context):
+
+        dirAbsolute = bpy.path.abspath(self.directory)
+        if not os.path.isdir(dirAbsolute):
+            self.report({'ERROR'}, dirAbsolute + " is not a directory")
+            return {'FINISHED'}
+
+        with instrumentedRun(context.scene, "write all", directory=dirAbsolute):
+            result = self._writeAll(context, dirAbsolute)
+        summary = instrumentationSummary(context.scene)
+        if summary:
+            self.report({'INFO'}, summary)
+        return result
+
+    def _writeAll(self, context, dirAbsolute):
+
+        extracted = extractMaterials(context.selected_objects)
+        if not extracted:
+            self.report({'ERROR'}, "None of the selected objects has a material")
+            return {'FINISHED'}
+
+        errors = []
+        written = 0
+        wm = context.window_manager
+        wm.progress_begin(0, len(extracted))
+        try:
+            for (index, (obj, material, mhmat, err)) in enumerate(extracted):
+                wm.progress_update(index)
+                if err:
+                    errors.append(material.name + ": " + err)
+                    continue
+
+                validation = mhmat.validateTextures()
+                if not validation.ok:
+                    errors.extend([material.name + ": " + str(issue) for issue in validation.errors])
+                    continue
+
+                fnAbsolute = os.path.join(dirAbsolute, bpy.path.clean_name(material.name) + ".mhmat")
+                errtext = mhmat.writeMHmat(obj, fnAbsolute, workers=context.scene.MhMsCopyWorkers, name=material.name)
+                if errtext:
+                    errors.append(material.name + ": " + errtext)
+                written += 1
+        finally:
+            wm.progress_end()
+
+        for error in errors:
+            print(error)
+
+        if errors:
+            self.report({'WARNING'}, "%d material files were written, %d problems (see console): %s" % (written, len(errors), errors[0]))
+        else:
+            self.report({'INFO'}, "%d material files were written" % written)
+        return {'FINISHED'}
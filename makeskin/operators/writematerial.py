@@ -5,7 +5,7 @@ import bpy
 from bpy_extras.io_utils import ExportHelper
 from bpy.props import BoolProperty, StringProperty, EnumProperty, IntProperty, CollectionProperty, FloatProperty
 from ..material import MHMat
-from ..utils import hasMaterial, blendMatSave
+from ..utils import hasMaterial, instrumentedRun, instrumentationSummary
 
 #  create a predefined name of the material (not untitled) from the material name itself
 #
@@ -56,18 +56,43 @@ class MHS_OT_WriteMaterialOperator(bpy.types.Operator, ExportHelper):
             self.report({'ERROR'}, "Object does not have a material")
             return {'FINISHED'}
 
+        # Texture nodes showing proxies are written with their full resolution textures, see sourcePathOfNode
         mhmat = MHMat(obj)
 
-        checkImg = mhmat.checkAllTexturesAreSaved()
-        if checkImg:
-            self.report({'ERROR'}, checkImg)
+        validation = mhmat.validateTextures()
+        if not validation.ok:
+            self.report({'ERROR'}, "; ".join([str(issue) for issue in validation.errors]))
             return {'FINISHED'}
+        for issue in validation.warnings:
+            self.report({'WARNING'}, str(issue))
 
-        errtext = mhmat.writeMHmat(obj, fnAbsolute)
+        wm = context.window_manager
+
+        def progress(done, total):
+            if total > 0:
+                wm.progress_update(int(100 * done / total))
+
+        wm.progress_begin(0, 100)
+        try:
+            with instrumentedRun(context.scene, "write", file=fnAbsolute):
+                errtext = mhmat.writeMHmat(obj, fnAbsolute, workers=context.scene.MhMsCopyWorkers, progress=progress)
+        finally:
+            wm.progress_end()
         if errtext:
             self.report({'ERROR'}, errtext)
         else:
-            self.report({'INFO'}, "A material file was written")
+            written = "The material file was unchanged" if mhmat.fileUnchanged else "A material file was written"
+            if mhmat.skinTone:
+                written += ", skin tone " + str(mhmat.skinTone)
+                if obj.MhMsUseLit and obj.MhMsLitsphere != mhmat.skinTone.litsphere:
+                    self.report({'INFO'}, "The skin tone suggests litsphere " + mhmat.skinTone.litsphere + " instead of " + obj.MhMsLitsphere)
+            if mhmat.textureCopyStats:
+                self.report({'INFO'}, written + ", " + str(mhmat.textureCopyStats))
+            else:
+                self.report({'INFO'}, written)
+        summary = instrumentationSummary(context.scene)
+        if summary:
+            self.report({'INFO'}, summary)
 
         # debug
         print(mhmat)
@@ -0,0 +1,57 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Moving whole pixel buffers between image files and numpy arrays, using blender to decode and
+# encode the files. The arrays are in the layout of imageops: (height, width, channels), float32.
+
+import bpy
+import numpy as np
+from .imageops import allocatePixels, toRGBA, fitSize
+from .instrumentation import INSTRUMENTATION, instrumented
+
+# blender file_format -> file extension
+FILE_FORMAT_EXTENSIONS = {'PNG': '.png', 'JPEG': '.jpg', 'TARGA': '.tga', 'OPEN_EXR': '.exr'}
+
+def fileFormatForExtension(ext):
+    """The blender file_format to write a file with this extension in, PNG if there is no good match"""
+    ext = ext.lower()
+    if ext == ".jpeg":
+        return 'JPEG'
+    for fileFormat in FILE_FORMAT_EXTENSIONS.keys():
+        if FILE_FORMAT_EXTENSIONS[fileFormat] == ext:
+            return fileFormat
+    return 'PNG'
+
+@instrumented("decode pixels")
+def loadPixels(path, maxSize=None):
+    """
+    Decode an image file, returning (pixels, isFloat). With maxSize, larger images are scaled down
+    by blender before the pixels are fetched, so the full size buffer never reaches python.
+    """
+    image = bpy.data.images.load(path, check_existing=False)
+    try:
+        (width, height) = image.size
+        if maxSize and (width > maxSize or height > maxSize):
+            (width, height) = fitSize(width, height, maxSize)
+            image.scale(width, height)
+        isFloat = image.is_float
+        pixels = allocatePixels(height, width, image.channels)
+        # foreach_get fills a flat view of the buffer, no intermediate python list is created
+        image.pixels.foreach_get(pixels.reshape(-1))
+        INSTRUMENTATION.count("images decoded")
+    finally:
+        bpy.data.images.remove(image)
+    return (pixels, isFloat)
+
+@instrumented("encode pixels")
+def savePixels(pixels, path, fileFormat='PNG', isFloat=False):
+    """Encode pixels to path, in the given blender file_format"""
+    (height, width, channels) = pixels.shape
+    image = bpy.data.images.new("makeskin_pixels", width=width, height=height, alpha=True, float_buffer=isFloat)
+    try:
+        image.pixels.foreach_set(np.ascontiguousarray(toRGBA(pixels), dtype=np.float32).reshape(-1))
+        image.filepath_raw = path
+        image.file_format = fileFormat
+        image.save()
+    finally:
+        bpy.data.images.remove(image)
@@ -0,0 +1,116 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Downscaled proxy textures for fast viewport work. A proxy is generated once per source file
+# content and size, and stored in a cache directory which is kept below a total size by throwing
+# away the least recently used proxies. The texture nodes point at the proxies, while the original
+# file path is kept in a custom property on each texture node, so that writing a material still
+# refers to the full resolution texture. The path is kept on the node rather than on the image,
+# because identical textures in different folders share one proxy image.
+
+import os, tempfile
+from .imageops import fitSize, resize
+from .pixelio import loadPixels, savePixels
+from .texturecopy import fileHash
+
+# Custom property on texture nodes showing a proxy, holding the absolute path of the full
+# resolution texture
+SOURCE_PATH_PROPERTY = "makeskinSourcePath"
+
+# Custom property marking proxy images
+PROXY_PROPERTY = "makeskinProxy"
+
+PROXY_SIZES = [512, 1024, 2048]
+DEFAULT_CACHE_LIMIT = 1024 * 1024 * 1024
+
+def defaultCacheDir():
+    return os.path.join(tempfile.gettempdir(), "makeskin_proxies")
+
+class ProxyCache:
+
+    def __init__(self, cacheDir=None, limitBytes=DEFAULT_CACHE_LIMIT):
+        self.cacheDir = cacheDir
+        self.limitBytes = limitBytes
+        self._hashes = dict()
+        self._smallEnough = set()
+
+    def _directory(self):
+        cacheDir = self.cacheDir or defaultCacheDir()
+        os.makedirs(cacheDir, exist_ok=True)
+        return cacheDir
+
+    def _sourceHash(self, sourcePath):
+        # Hashing an 8K texture is not free, so remember the hash for as long as the file is unchanged
+        stat = os.stat(sourcePath)
+        key = (sourcePath, stat.st_mtime_ns, stat.st_size)
+        if not key in self._hashes:
+            self._hashes[key] = fileHash(sourcePath)
+        return self._hashes[key]
+
+    def getProxyPath(self, sourcePath, maxSize, method="lanczos"):
+        """
+        Return the path of a proxy of sourcePath fitting within maxSize, generating it if needed.
+        If the source already fits, sourcePath itself is returned.
+        """
+        sourcePath = os.path.abspath(sourcePath)
+        (dummy, ext) = os.path.splitext(sourcePath)
+        isFloat = ext.lower() in [".exr", ".hdr"]
+        proxyName = "%s_%d%s" % (self._sourceHash(sourcePath)[:24], maxSize, ".exr" if isFloat else ".png")
+        if proxyName in self._smallEnough:
+            return sourcePath
+        proxyPath = os.path.join(self._directory(), proxyName)
+
+        if os.path.isfile(proxyPath):
+            # Mark as recently used
+            os.utime(proxyPath)
+            return proxyPath
+
+        if not self._generate(sourcePath, proxyPath, maxSize, method, isFloat):
+            self._smallEnough.add(proxyName)
+            return sourcePath
+        self.evict(keep=proxyPath)
+        return proxyPath
+
+    def _generate(self, sourcePath, proxyPath, maxSize, method, isFloat):
+        (pixels, dummy) = loadPixels(sourcePath)
+        (height, width, channels) = pixels.shape
+        (proxyWidth, proxyHeight) = fitSize(width, height, maxSize)
+        if (proxyWidth, proxyHeight) == (width, height):
+            return False
+        pixels = resize(pixels, proxyWidth, proxyHeight, method)
+        savePixels(pixels, proxyPath, 'OPEN_EXR' if isFloat else 'PNG', isFloat)
+        print("Created proxy texture " + proxyPath + " for " + sourcePath)
+        return True
+
+    def evict(self, keep=None):
+        """Remove least recently used proxies until the cache is within its size limit"""
+        cacheDir = self._directory()
+        entries = []
+        total = 0
+        for fileName in os.listdir(cacheDir):
+            path = os.path.join(cacheDir, fileName)
+            if os.path.isfile(path):
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        entries.sort()
+        for (mtime, size, path) in entries:
+            if total <= self.limitBytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.unlink(path)
+                total -= size
+            except OSError:
+                pass
+
+def sourcePathOfNode(textureNode):
+    """The full resolution path for a texture node showing a proxy, or None if it does not"""
+    # The node keeps its path when the artist puts another image in it, which is then not a proxy
+    if textureNode.image is None or not textureNode.image.get(PROXY_PROPERTY):
+        return None
+    return textureNode.get(SOURCE_PATH_PROPERTY)
+
+# The cache used when creating texture nodes
+PROXY_CACHE = ProxyCache()
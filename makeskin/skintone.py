@@ -0,0 +1,102 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Skin tone statistics of a diffuse texture, for materials with autoBlendSkin: the average color
+# of the skin, a histogram of its lightness and the litsphere which matches it best. Transparent
+# pixels (outside the UV islands) are masked out by the alpha channel. Everything is numpy
+# reductions over a strided view of the pixels, so no copy of the full buffer is made. This module
+# does not use bpy.
+
+import math
+import numpy as np
+from .imageops import LUMA
+
+# Number of pixels looked at, at most. Skin tone does not need more than a 512x512 sample.
+MAX_SAMPLES = 512 * 512
+
+HISTOGRAM_BINS = 16
+
+# Pixels with less alpha than this are not part of the skin
+ALPHA_THRESHOLD = 0.5
+
+# Typical sRGB albedo of the skins the skin litspheres were made for (see extraproperties._litspheres)
+LITSPHERE_TONES = dict()
+LITSPHERE_TONES["lit_caucasian"] = (0.87, 0.68, 0.58)
+LITSPHERE_TONES["lit_asian"] = (0.83, 0.64, 0.48)
+LITSPHERE_TONES["lit_african"] = (0.42, 0.27, 0.19)
+
+# Used when the texture is not close to any of the tones above
+DEFAULT_LITSPHERE = "lit_standard_skin"
+MAX_TONE_DISTANCE = 0.25
+
+class SkinToneStats:
+
+    def __init__(self, averageColor, lightness, histogram, coverage, litsphere):
+        self.averageColor = averageColor
+        self.lightness = lightness
+        self.histogram = histogram
+        self.coverage = coverage
+        self.litsphere = litsphere
+
+    def asDict(self):
+        return {"averageColor": self.averageColor, "lightness": self.lightness, "histogram": self.histogram, "coverage": self.coverage, "litsphere": self.litsphere}
+
+    def asSettings(self):
+        """The statistics as MHMAT settings, so that MakeHuman does not have to compute them"""
+        settings = dict()
+        settings["skinToneColor"] = list(self.averageColor)
+        settings["skinToneLightness"] = self.lightness
+        settings["skinToneHistogram"] = " ".join(["%.4f" % fraction for fraction in self.histogram])
+        settings["skinToneCoverage"] = self.coverage
+        settings["skinToneLitsphere"] = self.litsphere
+        return settings
+
+    def __str__(self):
+        return "average color %.3f %.3f %.3f, lightness %.3f, %.0f%% coverage, recommended litsphere %s" % (self.averageColor[0], self.averageColor[1], self.averageColor[2], self.lightness, self.coverage * 100.0, self.litsphere)
+
+def _linearToSrgb(rgb):
+    return np.where(rgb <= 0.0031308, rgb * 12.92, 1.055 * np.power(np.clip(rgb, 0.0031308, None), 1.0 / 2.4) - 0.055)
+
+def recommendLitsphere(averageColor):
+    """The name of the skin litsphere closest to an average sRGB skin color"""
+    best = DEFAULT_LITSPHERE
+    bestDistance = MAX_TONE_DISTANCE
+    for name in LITSPHERE_TONES.keys():
+        distance = math.sqrt(sum([(a - b) ** 2 for (a, b) in zip(averageColor, LITSPHERE_TONES[name])]))
+        if distance < bestDistance:
+            best = name
+            bestDistance = distance
+    return best
+
+def skinToneStats(pixels, isLinear=False, maxSamples=MAX_SAMPLES):
+    """
+    Compute SkinToneStats for pixels of shape (height, width, channels). isLinear is for float
+    textures, whose values are converted to sRGB before comparing them with the litsphere tones.
+    Returns None if no pixel is opaque.
+    """
+    (height, width, channels) = pixels.shape
+    stride = max(1, int(math.ceil(math.sqrt(float(height * width) / maxSamples))))
+    # A view, nothing is copied until the reductions below
+    sample = pixels[::stride, ::stride]
+    total = sample.shape[0] * sample.shape[1]
+
+    if channels == 4 or channels == 2:
+        mask = sample[:, :, channels - 1] >= ALPHA_THRESHOLD
+        rgb = sample[mask][:, :min(channels - 1, 3)]
+    else:
+        rgb = sample.reshape(-1, channels)
+    if rgb.shape[0] == 0:
+        return None
+    if rgb.shape[1] == 1:
+        rgb = np.repeat(rgb, 3, axis=1)
+    rgb = np.clip(rgb, 0.0, 1.0)
+    if isLinear:
+        rgb = _linearToSrgb(rgb)
+
+    average = rgb.mean(axis=0, dtype=np.float64)
+    lightness = rgb @ LUMA
+    (counts, dummy) = np.histogram(lightness, bins=HISTOGRAM_BINS, range=(0.0, 1.0))
+    histogram = (counts / float(rgb.shape[0])).tolist()
+
+    averageColor = [float(average[0]), float(average[1]), float(average[2])]
+    return SkinToneStats(averageColor, float(lightness.mean(dtype=np.float64)), histogram, rgb.shape[0] / float(total), recommendLitsphere(averageColor))
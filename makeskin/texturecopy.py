@@ -0,0 +1,171 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Incremental copying of texture files. A destination which already holds the same content
+# as the source is left alone, which avoids rewriting large textures every time a material
+# is saved. Copies are written under a temporary name and renamed into place, so that an
+# interrupted copy never leaves a truncated texture behind. This module is bpy-free.
+
+import hashlib, os, shutil, threading
+from .atomicwrite import tempPathFor, replaceFile
+from .instrumentation import INSTRUMENTATION, instrumented
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+COPIED = "copied"
+LINKED = "linked"
+SKIPPED = "skipped"
+
+class TextureCopyStats:
+
+    def __init__(self):
+        self.filesCopied = 0
+        self.filesLinked = 0
+        self.filesSkipped = 0
+        self.bytesCopied = 0
+        self.bytesSkipped = 0
+
+    def add(self, action, size):
+        if action == COPIED:
+            self.filesCopied += 1
+            self.bytesCopied += size
+        if action == LINKED:
+            self.filesLinked += 1
+            self.bytesSkipped += size
+        if action == SKIPPED:
+            self.filesSkipped += 1
+            self.bytesSkipped += size
+
+    def __str__(self):
+        return "%d textures copied (%.1f MB), %d linked, %d unchanged (%.1f MB skipped)" % (self.filesCopied, self.bytesCopied / 1048576.0, self.filesLinked, self.filesSkipped, self.bytesSkipped / 1048576.0)
+
+@instrumented("hash")
+def fileHash(path):
+    """Streaming sha256 of the file content, as a hex string"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        chunk = f.read(HASH_CHUNK_SIZE)
+        while chunk:
+            digest.update(chunk)
+            INSTRUMENTATION.count("bytes hashed", len(chunk))
+            chunk = f.read(HASH_CHUNK_SIZE)
+    return digest.hexdigest()
+
+def prefetchFiles(paths):
+    """
+    Read files into the OS cache, so that whoever reads them next does not have to wait for the
+    disk. Meant to run on a thread. Files which cannot be read are skipped.
+    """
+    for path in paths:
+        try:
+            with open(path, 'rb') as f:
+                if hasattr(os, "posix_fadvise"):
+                    os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+                else:
+                    while f.read(HASH_CHUNK_SIZE):
+                        pass
+        except OSError:
+            pass
+
+# (path, mtime, size) -> hash, shared by everyone hashing textures during a session
+_hashes = dict()
+_hashesLock = threading.Lock()
+
+def cachedFileHash(path):
+    """fileHash, remembered for as long as the file keeps its mtime and size"""
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    with _hashesLock:
+        contentHash = _hashes.get(key)
+    if contentHash is None:
+        contentHash = fileHash(path)
+        with _hashesLock:
+            _hashes[key] = contentHash
+    return contentHash
+
+def isSameContent(origLoc, destLoc, origStat=None):
+    """Check if destLoc exists and has the same content as origLoc. Size and mtime are compared first, the content is only hashed when they are inconclusive."""
+    if origStat is None:
+        origStat = os.stat(origLoc)
+    try:
+        destStat = os.stat(destLoc)
+    except FileNotFoundError:
+        return False
+    if origStat.st_dev == destStat.st_dev and origStat.st_ino == destStat.st_ino:
+        return True
+    if origStat.st_size != destStat.st_size:
+        return False
+    if origStat.st_mtime_ns == destStat.st_mtime_ns:
+        return True
+    if fileHash(origLoc) != fileHash(destLoc):
+        return False
+    # Same content, but the destination was touched. Align the mtime so that the next
+    # comparison can be decided without hashing.
+    os.utime(destLoc, ns=(destStat.st_atime_ns, origStat.st_mtime_ns))
+    return True
+
+def _copyFileRange(origLoc, destLoc, size):
+    # copy_file_range lets the kernel copy without going through user space, and lets
+    # file systems supporting it (btrfs, xfs, nfs 4.2...) share blocks instead of copying.
+    with open(origLoc, 'rb') as fsrc, open(destLoc, 'wb') as fdst:
+        remaining = size
+        while remaining > 0:
+            copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+            if copied == 0:
+                # The source is shorter than it was, or the file system gave up. Either way the
+                # copy is incomplete, and the caller falls back to a plain copy.
+                raise OSError("copy_file_range stopped with %d of %d bytes left to copy" % (remaining, size))
+            remaining -= copied
+
+@instrumented("copy texture")
+def copyTextureFile(origLoc, destLoc, incremental=True, allowHardlink=False):
+    """
+    Copy origLoc to destLoc, returning one of COPIED, LINKED or SKIPPED together with the size
+    of the file. With incremental, an existing destination with the same content is kept. With
+    allowHardlink, the destination is hard linked to the source if they are on the same file system.
+    """
+    origStat = os.stat(origLoc)
+    size = origStat.st_size
+
+    if incremental and isSameContent(origLoc, destLoc, origStat):
+        INSTRUMENTATION.count("textures unchanged")
+        return (SKIPPED, size)
+
+    destDir = os.path.dirname(os.path.abspath(destLoc))
+    sameDevice = os.stat(destDir).st_dev == origStat.st_dev
+
+    # The rename replaces the directory entry, so an existing destination which is itself a hard
+    # link to another file is never written through
+    tempLoc = tempPathFor(destLoc)
+    try:
+        if allowHardlink and sameDevice:
+            try:
+                os.link(origLoc, tempLoc)
+                linked = True
+            except OSError:
+                linked = False
+            if linked:
+                # Nothing new was written, so there is nothing to flush either
+                replaceFile(tempLoc, destLoc, sync=False)
+                INSTRUMENTATION.count("textures linked")
+                return (LINKED, size)
+
+        copied = False
+        if sameDevice and hasattr(os, "copy_file_range"):
+            try:
+                _copyFileRange(origLoc, tempLoc, size)
+                copied = True
+            except OSError:
+                copied = False
+        if not copied:
+            shutil.copyfile(origLoc, tempLoc)
+
+        # Keep the mtime of the source, so that a later incremental copy can skip without hashing
+        os.utime(tempLoc, ns=(origStat.st_atime_ns, origStat.st_mtime_ns))
+        replaceFile(tempLoc, destLoc)
+        INSTRUMENTATION.count("bytes copied", size)
+    finally:
+        if os.path.lexists(tempLoc):
+            os.unlink(tempLoc)
+    return (COPIED, size)
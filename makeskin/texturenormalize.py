@@ -0,0 +1,145 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Turns the textures of a material into repository ready files while it is written: textures
+# larger than a size limit are scaled down by powers of two, textures can be converted to another
+# file format, and the roughness, metallic and ambient occlusion maps can be packed into the
+# channels of one image. The pixel work is done with numpy on whole buffers (see imageops), only
+# decoding and encoding the files is left to blender.
+
+import os
+from .imageops import powerOfTwoFactor, boxDownsample, packChannels
+from .imageinfo import IMAGE_INFO_CACHE
+from .pixelio import loadPixels, savePixels, fileFormatForExtension, FILE_FORMAT_EXTENSIONS
+from .validation import TEXTURE_KEYS
+from .mhmatfile import PACKED_MAP_CHANNELS, normalizedTextureName
+from .atomicwrite import atomicPath
+from .exportstate import fileSignature
+from .instrumentation import instrumented
+
+# File formats textures can be converted to. KEEP writes the format of the source.
+FORMATS = ["KEEP", "PNG", "JPEG"]
+
+# Name suffix of the packed map: occlusion, roughness and metallic, in that order, as in glTF
+PACKED_MAP_SUFFIX = "orm"
+
+class TextureNormalizer:
+
+    def __init__(self, maxSize=0, fileFormat="KEEP", packMaps=False):
+        self.maxSize = maxSize
+        self.fileFormat = fileFormat
+        self.packMaps = packMaps
+
+    @property
+    def enabled(self):
+        return bool(self.maxSize) or self.fileFormat != "KEEP" or self.packMaps
+
+    def _targetFormat(self, sourcePath):
+        if self.fileFormat == "KEEP":
+            (dummy, ext) = os.path.splitext(sourcePath)
+            return fileFormatForExtension(ext)
+        return self.fileFormat
+
+    def _isFinal(self, sourcePath, targetFormat):
+        # A texture which is small enough and already in the target format is copied as it is
+        info = IMAGE_INFO_CACHE.get(sourcePath)
+        if info is None:
+            return False
+        if powerOfTwoFactor(info.width, info.height, self.maxSize) > 1:
+            return False
+        return info.matchesExtension(FILE_FORMAT_EXTENSIONS[targetFormat])
+
+    def _loadScaled(self, sourcePath):
+        (pixels, isFloat) = loadPixels(sourcePath)
+        (height, width, channels) = pixels.shape
+        return (boxDownsample(pixels, powerOfTwoFactor(width, height, self.maxSize)), isFloat)
+
+    @instrumented("normalize textures")
+    def normalize(self, mhmat, mhmatFilenameAbsolute, state=None):
+        """
+        Write the normalized textures of mhmat next to the mhmat file and point its settings at them.
+        Returns the keys which were written, which copyTextures should then skip. With an
+        ExportState, textures whose source and options are unchanged since the last export are
+        not processed again.
+        """
+        matLoc = os.path.dirname(mhmatFilenameAbsolute)
+        (matBase, matExt) = os.path.splitext(os.path.basename(mhmatFilenameAbsolute))
+        written = []
+
+        if self.packMaps and any(mhmat.settings.get(key) for key in PACKED_MAP_CHANNELS.keys()):
+            self._pack(mhmat, matLoc, matBase, state)
+            written.extend(PACKED_MAP_CHANNELS.keys())
+
+        for key in TEXTURE_KEYS:
+            if key in written or not mhmat.settings.get(key):
+                continue
+            sourcePath = os.path.abspath(mhmat.settings[key])
+            targetFormat = self._targetFormat(sourcePath)
+            if self._isFinal(sourcePath, targetFormat):
+                continue
+            baseName = normalizedTextureName(matBase, key, FILE_FORMAT_EXTENSIONS[targetFormat])
+            destLoc = os.path.join(matLoc, baseName)
+            inputs = (sourcePath, fileSignature(sourcePath), self.maxSize, targetFormat)
+            if state is not None and state.isUnchanged("texture " + key, inputs, destLoc):
+                print("Normalized texture is unchanged, skipping " + destLoc)
+            else:
+                (pixels, isFloat) = self._loadScaled(sourcePath)
+                with atomicPath(destLoc) as tempLoc:
+                    savePixels(pixels, tempLoc, targetFormat, isFloat and targetFormat == 'OPEN_EXR')
+                print("normalized " + sourcePath + " to " + destLoc + " (%dx%d)" % (pixels.shape[1], pixels.shape[0]))
+                if state is not None:
+                    state.remember("texture " + key, inputs, destLoc)
+            mhmat.settings[key] = baseName
+            written.append(key)
+
+        return written
+
+    def _pack(self, mhmat, matLoc, matBase, state=None):
+        defaults = [1.0, 0.5, 0.0]
+        if mhmat.settings.get("roughness") is not None:
+            defaults[1] = mhmat.settings["roughness"]
+        if mhmat.settings.get("metallic") is not None:
+            defaults[2] = mhmat.settings["metallic"]
+
+        targetFormat = 'PNG' if self.fileFormat == "KEEP" else self.fileFormat
+        baseName = matBase + '_' + PACKED_MAP_SUFFIX + FILE_FORMAT_EXTENSIONS[targetFormat]
+        destLoc = os.path.join(matLoc, baseName)
+
+        sources = []
+        for key in PACKED_MAP_CHANNELS.keys():
+            path = mhmat.settings.get(key)
+            if path:
+                path = os.path.abspath(path)
+                sources.append((key, path, fileSignature(path), mhmat.packedMapChannel(key)))
+        inputs = (tuple(sources), tuple(defaults), self.maxSize, targetFormat)
+        if state is not None and state.isUnchanged("packed", inputs, destLoc):
+            print("Packed texture is unchanged, skipping " + destLoc)
+            for key in PACKED_MAP_CHANNELS.keys():
+                mhmat.settings[key] = baseName
+            return
+
+        planes = [None, None, None]
+        loaded = dict()
+        for key in PACKED_MAP_CHANNELS.keys():
+            path = mhmat.settings.get(key)
+            if not path:
+                continue
+            path = os.path.abspath(path)
+            if not path in loaded:
+                (loaded[path], dummy) = self._loadScaled(path)
+            pixels = loaded[path]
+            # An already packed source has the map in its own channel, a plain map is greyscale
+            sourceChannel = mhmat.packedMapChannel(key) or 0
+            planes[PACKED_MAP_CHANNELS[key]] = pixels[:, :, min(sourceChannel, pixels.shape[2] - 1)]
+
+        width = max(plane.shape[1] for plane in planes if plane is not None)
+        height = max(plane.shape[0] for plane in planes if plane is not None)
+        packed = packChannels(planes, width, height, defaults)
+
+        with atomicPath(destLoc) as tempLoc:
+            savePixels(packed, tempLoc, targetFormat)
+        print("packed ambient occlusion, roughness and metallic maps into " + destLoc + " (%dx%d)" % (width, height))
+        if state is not None:
+            state.remember("packed", inputs, destLoc)
+        for key in PACKED_MAP_CHANNELS.keys():
+            mhmat.settings[key] = baseName
@@ -0,0 +1,110 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# A content addressed store for the textures of exported materials. Every texture is stored once,
+# named after the sha256 of its content (store/ab/ab12...ef.png), and materials refer to it with a
+# path relative to the .mhmat file. Many materials sharing a texture then share one file, and
+# exporting a material again only hashes its textures instead of copying them. Textures which are
+# no longer referenced by any material are removed by collectGarbage(). This module is bpy-free.
+
+import os, re, time
+from .texturecopy import copyTextureFile, cachedFileHash, SKIPPED
+from .atomicwrite import isTempPath
+from .imageinfo import IMAGE_INFO_CACHE
+from .keytypes import MHMATFileKey, splitLine
+from .mhmat_keys import MHMAT_NAME_TO_KEY
+
+# Where the store goes if none is configured, relative to the directory of the exported material
+DEFAULT_STORE_DIR = "textures"
+
+# Blobs younger than this are never collected, they might belong to a material being written
+GARBAGE_MIN_AGE = 3600
+
+_BLOB_NAME = re.compile(r'^[0-9a-f]{64}(\.[a-z0-9]+)?$')
+
+# Keys (lower case, as in MHMAT_NAME_TO_KEY) whose value is a path which might point into the store
+_FILE_KEYS = set([keyName for keyName in MHMAT_NAME_TO_KEY.keys() if isinstance(MHMAT_NAME_TO_KEY[keyName], MHMATFileKey) and not MHMAT_NAME_TO_KEY[keyName].blendMaterial])
+
+class TextureStore:
+
+    def __init__(self, rootDir):
+        self.rootDir = os.path.abspath(rootDir)
+
+    def blobPath(self, contentHash, ext):
+        return os.path.join(self.rootDir, contentHash[:2], contentHash + ext.lower())
+
+    def add(self, path):
+        """Put the file at path into the store. Returns (blobPath, action, size), action being one of the texturecopy actions."""
+        path = os.path.abspath(path)
+        (dummy, ext) = os.path.splitext(path)
+        info = IMAGE_INFO_CACHE.get(path)
+        if info is not None and not info.matchesExtension(ext):
+            ext = info.extension
+        # The hash is remembered for the session, re-exports then cost a stat per unchanged texture
+        blobPath = self.blobPath(cachedFileHash(path), ext)
+        if os.path.isfile(blobPath):
+            blobStat = os.stat(blobPath)
+            # Same name is same content, there is nothing to compare. Blobs hard linked by earlier
+            # versions may have been changed through their other name, so those are replaced.
+            if blobStat.st_nlink == 1:
+                return (blobPath, SKIPPED, blobStat.st_size)
+
+        os.makedirs(os.path.dirname(blobPath), exist_ok=True)
+        # The copy is renamed into place, so nobody ever sees a half written blob. Two writers
+        # racing for the same blob write the same content, whoever replaces last wins. Blobs are
+        # never hard links: saving the source in place would change the blob under its hash.
+        # copyTextureFile still shares blocks where the file system supports it.
+        (action, size) = copyTextureFile(path, blobPath, incremental=False)
+        return (blobPath, action, size)
+
+    def isBlob(self, path):
+        path = os.path.realpath(os.path.abspath(path))
+        return os.path.dirname(os.path.dirname(path)) == os.path.realpath(self.rootDir) and _BLOB_NAME.match(os.path.basename(path)) is not None
+
+    def referencedBlobs(self, materialFiles):
+        """Return the set of real paths of the blobs referenced by any of the given .mhmat files"""
+        referenced = set()
+        for materialFile in materialFiles:
+            location = os.path.dirname(os.path.abspath(materialFile))
+            with open(materialFile, 'r', errors='ignore') as f:
+                for line in f:
+                    (key, value) = splitLine(line.strip())
+                    if key and key.lower() in _FILE_KEYS and value:
+                        path = os.path.join(location, value.strip())
+                        if self.isBlob(path):
+                            referenced.add(os.path.realpath(path))
+        return referenced
+
+    def collectGarbage(self, materialFiles, dryRun=False, minAge=GARBAGE_MIN_AGE):
+        """
+        Remove all blobs which are not referenced by any of materialFiles, which should be every
+        material using the store. Returns (number of blobs removed, bytes freed).
+        """
+        referenced = self.referencedBlobs(materialFiles)
+        removed = 0
+        freed = 0
+        if not os.path.isdir(self.rootDir):
+            return (removed, freed)
+        now = time.time()
+        for prefix in sorted(os.listdir(self.rootDir)):
+            prefixDir = os.path.join(self.rootDir, prefix)
+            if not os.path.isdir(prefixDir):
+                continue
+            for fileName in os.listdir(prefixDir):
+                path = os.path.join(prefixDir, fileName)
+                if _BLOB_NAME.match(fileName):
+                    if os.path.realpath(path) in referenced:
+                        continue
+                elif not isTempPath(fileName):
+                    # Left behind by writers which died before renaming their copy into place
+                    continue
+                stat = os.stat(path)
+                # Copies keep the mtime of their source, the rename into the store sets the ctime
+                if now - max(stat.st_mtime, stat.st_ctime) < minAge:
+                    continue
+                if not dryRun:
+                    os.unlink(path)
+                print(("would remove " if dryRun else "removed ") + path)
+                removed += 1
+                freed += stat.st_size
+        return (removed, freed)
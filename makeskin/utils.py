@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 import bpy
+from .instrumentation import INSTRUMENTATION, instrumented
 
 _VERSION = (0,0,0)
 
@@ -19,10 +20,37 @@ def hasMaterial(obj):
     return len(obj.material_slots) > 0
 
 
-def createEmptyMaterial(obj, name):
+def instrumentedRun(scn, name, **args):
+    """
+    Record an operator run with INSTRUMENTATION if timings are enabled in the scene, and write
+    them to the timings file of the scene if one is set.
+    """
+    tracePath = bpy.path.abspath(scn.MhMsTraceFile) if scn.MhMsTraceFile else None
+    return INSTRUMENTATION.run(name, enabled=scn.MhMsInstrument, tracePath=tracePath, traceFormat=scn.MhMsTraceFormat, **args)
+
+
+def instrumentationSummary(scn, instrumentation=INSTRUMENTATION):
+    """The summary of the last instrumentedRun, for the operator report, or None if timings are off"""
+    if not scn.MhMsInstrument:
+        return None
+    return "Timings: " + instrumentation.summary()
+
+
+def writeSceneTrace(scn, instrumentation):
+    """Write what instrumentation recorded to the timings file of the scene, if timings are on and one is set"""
+    if scn.MhMsInstrument and scn.MhMsTraceFile:
+        instrumentation.writeTrace(bpy.path.abspath(scn.MhMsTraceFile), scn.MhMsTraceFormat)
+
+
+def newNodeMaterial(name):
     mat = bpy.data.materials.new(name)
     mat.use_nodes = True
     mat.blend_method = 'HASHED'
+    return mat
+
+
+def createEmptyMaterial(obj, name):
+    mat = newNodeMaterial(name)
     obj.data.materials.append(mat)
     return mat
 
@@ -38,20 +66,21 @@ def blendPath(path):
     return blendPath, dirName, assetName
 
 
-def blendMatSave(path, fake_user=False):
+@instrumented("save blend material")
+def blendMatSave(path, mat, fake_user=False):
     """
-    Save the second material on the active object to a blend file.
-    This writes into the file but will not overwrite it,
-    although it might overwrite something already in it.
+    Save a material (normally the second material of the object being
+    written) to a blend file. The blend file is written under a temporary
+    name and then replaces the previous one, so it is never seen half written.
     """
     import bpy
-    obj = bpy.context.active_object
-    mat = obj.material_slots[1].material
-    # May need to be more carfull with overwrites.
-    bpy.data.libraries.write(str(path), {mat}, fake_user=fake_user)
+    from .atomicwrite import atomicPath
+    with atomicPath(str(path)) as tempPath:
+        bpy.data.libraries.write(tempPath, {mat}, fake_user=fake_user)
     print('Wrote blend file into:', path)
 
 
+@instrumented("load blend material")
 def blendMatLoad(path, obj=None):
     """
     Load a material from a blend file determined by path, to a new material slot.
@@ -0,0 +1,159 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Validation of the texture references of a material. Every file key is checked in one pass:
+# the files are stat'ed once each, and their headers read (and cached) for size, channels and
+# bit depth. This module is bpy-free, so it can be run over whole directories of materials (see
+# batch.py).
+
+import os, stat
+from .mhmat_keys import MHMAT_KEYS
+from .keytypes import MHMATFileKey
+from .imageinfo import IMAGE_INFO_CACHE
+from .instrumentation import instrumented
+
+ERROR = "error"
+WARNING = "warning"
+
+# Keys which are not texture files: the litsphere is a name, the blend material a path into a blend file
+_NON_TEXTURE_KEYS = ["litsphereTexture", "blendMaterial"]
+
+TEXTURE_KEYS = [keyObj.keyName for keyObj in MHMAT_KEYS if isinstance(keyObj, MHMATFileKey) and keyObj.keyName not in _NON_TEXTURE_KEYS]
+
+# Maps which hold data rather than color are expected to be greyscale or RGB, never need alpha
+_SINGLE_VALUE_KEYS = ["bumpmapTexture", "displacementmapTexture", "roughnessmapTexture", "metallicmapTexture", "aomapTexture", "transmissionmapTexture", "transparencymapTexture", "specularmapTexture"]
+
+class ValidationIssue:
+
+    def __init__(self, severity, key, path, message):
+        self.severity = severity
+        self.key = key
+        self.path = path
+        self.message = message
+
+    def asDict(self):
+        return {"severity": self.severity, "key": self.key, "path": self.path, "message": self.message}
+
+    def __str__(self):
+        if self.key:
+            return self.key + ": " + self.message
+        return self.message
+
+class ValidationReport:
+
+    def __init__(self):
+        self.issues = []
+        # key -> ImageInfo for every texture which could be read
+        self.textures = dict()
+
+    def add(self, severity, key, path, message):
+        self.issues.append(ValidationIssue(severity, key, path, message))
+
+    @property
+    def errors(self):
+        return [issue for issue in self.issues if issue.severity == ERROR]
+
+    @property
+    def warnings(self):
+        return [issue for issue in self.issues if issue.severity == WARNING]
+
+    @property
+    def ok(self):
+        return len(self.errors) == 0
+
+    def asDict(self):
+        textures = dict()
+        for key in self.textures.keys():
+            info = self.textures[key]
+            textures[key] = {"format": info.format, "width": info.width, "height": info.height, "channels": info.channels, "bitDepth": info.bitDepth}
+        return {"ok": self.ok, "issues": [issue.asDict() for issue in self.issues], "textures": textures}
+
+    def __str__(self):
+        if not self.issues:
+            return "All textures are valid"
+        return "\n".join([issue.severity.upper() + " " + str(issue) for issue in self.issues])
+
+def _isFile(st):
+    return st is not None and stat.S_ISREG(st.st_mode)
+
+def _statAll(paths):
+    # One stat per distinct file, however many keys refer to it
+    stats = dict()
+    for path in paths:
+        if not path in stats:
+            try:
+                stats[path] = os.stat(path)
+            except OSError:
+                stats[path] = None
+    return stats
+
+@instrumented("validate")
+def validateSettings(settings, report=None):
+    """Validate all texture keys of a settings dict (as in MHMatFile.settings), returning a ValidationReport"""
+    if report is None:
+        report = ValidationReport()
+
+    texturePaths = dict()
+    for key in TEXTURE_KEYS:
+        path = settings.get(key)
+        if path:
+            texturePaths[key] = os.path.abspath(path)
+
+    blendPath = None
+    if settings.get("blendMaterial"):
+        # The value continues into the structure of the blend file: file.blend/materials/name
+        blendPath = os.path.abspath(str(settings["blendMaterial"]).rsplit('/', 2)[0])
+
+    allPaths = list(texturePaths.values())
+    if blendPath:
+        allPaths.append(blendPath)
+    stats = _statAll(allPaths)
+
+    if blendPath and not _isFile(stats[blendPath]):
+        report.add(ERROR, "blendMaterial", blendPath, blendPath + " is not a file")
+
+    infos = dict()
+    for key in texturePaths.keys():
+        path = texturePaths[key]
+        st = stats[path]
+        if not _isFile(st):
+            report.add(ERROR, key, path, path + " is not a file")
+            continue
+        if st.st_size == 0:
+            report.add(ERROR, key, path, path + " is empty")
+            continue
+        if not path in infos:
+            try:
+                infos[path] = IMAGE_INFO_CACHE.get(path)
+            except OSError as e:
+                infos[path] = None
+                report.add(ERROR, key, path, "could not read " + path + ": " + str(e))
+                continue
+        info = infos[path]
+        if info is None:
+            report.add(WARNING, key, path, "could not read the image header of " + path + ", the format is not recognized")
+            continue
+        report.textures[key] = info
+        if info.width == 0 or info.height == 0:
+            report.add(ERROR, key, path, "image has no pixels")
+        if key in _SINGLE_VALUE_KEYS and info.hasAlpha:
+            report.add(WARNING, key, path, "data map has an alpha channel, which will not be used")
+        if key == "normalmapTexture" and info.channels < 3:
+            report.add(ERROR, key, path, "normal map needs at least three channels, has %d" % info.channels)
+        if info.bitDepth > 8 and info.format in ["PNG", "TGA"] and key == "diffuseTexture":
+            report.add(WARNING, key, path, "diffuse texture has %d bits per channel, 8 is enough for color" % info.bitDepth)
+
+    # All maps of a material are sampled with the same UVs, differing sizes are usually a mistake
+    sizes = dict()
+    for key in report.textures.keys():
+        info = report.textures[key]
+        sizes.setdefault((info.width, info.height), []).append(key)
+    if len(sizes) > 1:
+        described = ["%s (%dx%d)" % (", ".join(keys), size[0], size[1]) for (size, keys) in sizes.items()]
+        report.add(WARNING, None, None, "textures have different resolutions: " + "; ".join(described))
+
+    return report
+
+def validateMaterial(mhmat, report=None):
+    """Validate the texture keys of an MHMatFile (or MHMat)"""
+    return validateSettings(mhmat.settings, report)